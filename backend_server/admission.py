@@ -0,0 +1,309 @@
+"""
+Admission Control Module
+Per-user limits and fair queueing for the expensive endpoints.
+
+Each pool (config.ADMISSION_POOLS: "llm" for /chat and the generators,
+"tts" for speech) admits a request in three steps:
+
+  1. the user's token bucket must have a token (else 429)
+  2. the user may hold at most ADMISSION_USER_CONCURRENCY running requests
+     and ADMISSION_USER_QUEUE waiting ones (else 429)
+  3. the pool may run at most its `concurrency` requests at once; the rest
+     wait, up to ADMISSION_QUEUE_MAX of them, for ADMISSION_QUEUE_TIMEOUT
+     seconds (else 503)
+
+Freed slots go to waiting users round-robin, one request per user per
+turn, so a user with many queued requests waits behind their own backlog
+rather than everyone else's. Rejections carry Retry-After, estimated from
+how long requests have recently held a slot.
+
+A slot is held until the response is closed, so streamed responses keep it
+for the whole stream. The LLM gateway still enforces its own upstream
+limits behind this (see llm_gateway.py).
+
+Pools live in one process. With several workers, set ADMISSION_SERVICE_URL
+so every worker admits through the shared admission_service.py; otherwise
+each limit applies per worker. If the service is unreachable, workers fall
+back to their local pools rather than refusing all traffic.
+"""
+
+import math
+import time
+import threading
+from collections import OrderedDict, deque
+from functools import wraps
+
+from flask import request, jsonify, make_response
+
+import config
+import metrics
+from http_client import get_session
+from rate_limit import TokenBucketLimiter
+
+# Weight of the newest sample in the mean slot hold time
+HOLD_SMOOTHING = 0.2
+MAX_RETRY_AFTER = 60
+
+
+class AdmissionError(Exception):
+    """Raised when a request is not admitted; maps to 429 or 503 + Retry-After"""
+
+    def __init__(self, message: str, status: int, retry_after: float):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = max(1, min(MAX_RETRY_AFTER, math.ceil(retry_after)))
+
+
+class _Waiter:
+    def __init__(self):
+        self.event = threading.Event()
+        self.granted = False
+
+
+class FairPool:
+    """
+    Concurrency ceiling with a per-user cap and a round-robin wait queue.
+    acquire() returns a release callable.
+    """
+
+    def __init__(self, name: str, concurrency: int):
+        self.name = name
+        self.concurrency = concurrency
+        self.limiter = TokenBucketLimiter(
+            rate=config.ADMISSION_USER_RATE_PER_MIN / 60.0,
+            capacity=config.ADMISSION_USER_BURST,
+        )
+        self._lock = threading.Lock()
+        self._running = 0
+        self._user_running = {}
+        self._waiting = OrderedDict()  # user -> deque of _Waiter, in turn order
+        self._queued = 0
+        self._hold_seconds = 1.0
+        self._stats = {"admitted": 0, "rateLimited": 0, "userLimited": 0, "rejected": 0, "timedOut": 0}
+
+    def _retry_after(self) -> float:
+        """Roughly when a slot should be free for a newcomer"""
+        return self._hold_seconds * (self._queued + 1) / max(1, self.concurrency)
+
+    def _grant(self, user: str) -> None:
+        self._running += 1
+        self._user_running[user] = self._user_running.get(user, 0) + 1
+        self._stats["admitted"] += 1
+
+    def _dispatch(self) -> None:
+        """Hand free slots to waiting users, one per user per turn"""
+        while self._running < self.concurrency and self._waiting:
+            for user, waiters in self._waiting.items():
+                if self._user_running.get(user, 0) < config.ADMISSION_USER_CONCURRENCY:
+                    break
+            else:
+                return  # everyone waiting is at their own cap
+            waiter = waiters.popleft()
+            self._queued -= 1
+            if waiters:
+                self._waiting.move_to_end(user)
+            else:
+                del self._waiting[user]
+            self._grant(user)
+            waiter.granted = True
+            waiter.event.set()
+
+    def acquire(self, user: str):
+        allowed, retry_after = self.limiter.consume(user)
+        if not allowed:
+            with self._lock:
+                self._stats["rateLimited"] += 1
+            raise AdmissionError("Too many requests. Please slow down.", 429, retry_after)
+
+        started = time.monotonic()
+        with self._lock:
+            running = self._user_running.get(user, 0)
+            if running < config.ADMISSION_USER_CONCURRENCY and self._running < self.concurrency:
+                # Anyone already waiting is blocked by their own cap, so
+                # taking the free slot doesn't jump a fair turn
+                self._grant(user)
+                return self._releaser(user, started)
+
+            waiters = self._waiting.get(user)
+            if waiters is not None and len(waiters) >= config.ADMISSION_USER_QUEUE:
+                self._stats["userLimited"] += 1
+                raise AdmissionError(
+                    "Too many requests in progress. Please wait for them to finish.",
+                    429,
+                    self._hold_seconds,
+                )
+            if self._queued >= config.ADMISSION_QUEUE_MAX:
+                self._stats["rejected"] += 1
+                raise AdmissionError("Server is busy. Please try again shortly.", 503, self._retry_after())
+
+            waiter = _Waiter()
+            self._waiting.setdefault(user, deque()).append(waiter)
+            self._queued += 1
+
+        waiter.event.wait(config.ADMISSION_QUEUE_TIMEOUT)
+        with self._lock:
+            if not waiter.granted:
+                waiters = self._waiting.get(user)
+                waiters.remove(waiter)
+                self._queued -= 1
+                if not waiters:
+                    del self._waiting[user]
+                self._stats["timedOut"] += 1
+                raise AdmissionError("Server is busy. Please try again shortly.", 503, self._retry_after())
+        ADMISSION_QUEUE_SECONDS.observe(time.monotonic() - started, pool=self.name)
+        return self._releaser(user, time.monotonic())
+
+    def _releaser(self, user: str, admitted_at: float):
+        released = [False]
+
+        def release():
+            with self._lock:
+                if released[0]:
+                    return
+                released[0] = True
+                held = time.monotonic() - admitted_at
+                self._hold_seconds += HOLD_SMOOTHING * (held - self._hold_seconds)
+                self._running -= 1
+                self._user_running[user] -= 1
+                if not self._user_running[user]:
+                    del self._user_running[user]
+                self._dispatch()
+
+        return release
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                **self._stats,
+                "running": self._running,
+                "queued": self._queued,
+                "waitingUsers": len(self._waiting),
+                "holdSeconds": round(self._hold_seconds, 3),
+            }
+
+
+class RemotePool:
+    """A pool held by the shared admission service; same acquire() contract"""
+
+    def __init__(self, base_url: str, name: str, fallback: FairPool):
+        self.base_url = base_url.rstrip("/")
+        self.name = name
+        self.fallback = fallback
+
+    def acquire(self, user: str):
+        try:
+            response = get_session().post(
+                f"{self.base_url}/acquire",
+                json={"pool": self.name, "user": user},
+                # The service may hold the request in its queue this long
+                timeout=(config.HTTP_CONNECT_TIMEOUT, config.ADMISSION_QUEUE_TIMEOUT + 5),
+            )
+            data = response.json()
+        except Exception as e:
+            print(f"Admission service unavailable, admitting locally: {e}")
+            return self.fallback.acquire(user)
+        if response.status_code != 200:
+            raise AdmissionError(
+                data.get("error", "Server is busy"), response.status_code, data.get("retryAfter", 1)
+            )
+        return self._releaser(data["lease"])
+
+    def _releaser(self, lease: str):
+        released = [False]
+
+        def release():
+            if released[0]:
+                return
+            released[0] = True
+            try:
+                get_session().post(
+                    f"{self.base_url}/release",
+                    json={"lease": lease},
+                    timeout=(config.HTTP_CONNECT_TIMEOUT, config.HTTP_READ_TIMEOUT),
+                )
+            except Exception as e:
+                # The service reclaims it after ADMISSION_LEASE_SECONDS
+                print(f"Failed to release admission lease {lease}: {e}")
+
+        return release
+
+
+_pools = {name: FairPool(name, spec["concurrency"]) for name, spec in config.ADMISSION_POOLS.items()}
+_remote_pools = {}
+
+
+def get_pool(name: str):
+    """The shared pool when ADMISSION_SERVICE_URL is set, else this process's"""
+    if config.ADMISSION_SERVICE_URL:
+        pool = _remote_pools.get(name)
+        if pool is None:
+            pool = _remote_pools[name] = RemotePool(
+                config.ADMISSION_SERVICE_URL, name, _pools[name]
+            )
+        return pool
+    return _pools[name]
+
+
+def get_stats() -> dict:
+    """Per-pool admitted/rejected counters, running and queued requests (this process)"""
+    return {name: pool.stats() for name, pool in _pools.items()}
+
+
+ADMISSION_QUEUE_SECONDS = metrics.Histogram(
+    "qwenify_admission_queue_seconds",
+    "Time admitted requests waited in the fair queue",
+    ["pool"],
+)
+
+_STAT_METRICS = [
+    ("admitted", "qwenify_admission_admitted_total", "counter", "Requests admitted"),
+    ("rateLimited", "qwenify_admission_rate_limited_total", "counter", "Requests over the user's rate"),
+    ("userLimited", "qwenify_admission_user_limited_total", "counter", "Requests over the user's queue"),
+    ("rejected", "qwenify_admission_rejected_total", "counter", "Requests rejected with a full queue"),
+    ("timedOut", "qwenify_admission_timed_out_total", "counter", "Requests that waited too long"),
+    ("running", "qwenify_admission_running", "gauge", "Requests holding a slot"),
+    ("queued", "qwenify_admission_queued", "gauge", "Requests waiting for a slot"),
+]
+
+
+def _collect_metrics() -> list:
+    stats = get_stats()
+    return [
+        (name, kind, help_text, [({"pool": p}, s[key]) for p, s in stats.items()])
+        for key, name, kind, help_text in _STAT_METRICS
+    ]
+
+
+metrics.register_collector(_collect_metrics)
+
+
+# --- FLASK INTEGRATION ---
+
+
+def admission_required(pool: str):
+    """
+    Decorator for routes behind token_required: admits the request into
+    `pool` for request.user_id and holds the slot until the response closes.
+    """
+
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            try:
+                release = get_pool(pool).acquire(request.user_id)
+            except AdmissionError as e:
+                response = jsonify({"error": str(e)})
+                response.headers["Retry-After"] = str(e.retry_after)
+                return response, e.status
+
+            try:
+                response = make_response(f(*args, **kwargs))
+            except BaseException:
+                release()
+                raise
+            response.call_on_close(release)
+            return response
+
+        return decorated
+
+    return decorator
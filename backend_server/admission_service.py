@@ -0,0 +1,108 @@
+"""
+Admission Service
+One process holding the admission pools for every backend worker.
+
+admission.FairPool keeps its counters, token buckets and wait queue in
+memory, so under `gunicorn -w 4` each worker would admit its own full
+share and every limit would apply four times over. With
+ADMISSION_SERVICE_URL set, admission_required asks this process instead:
+/acquire blocks in the shared fair queue and returns a lease, and the
+worker releases the lease when its response closes. Leases not released
+within ADMISSION_LEASE_SECONDS (the worker died) are reclaimed.
+
+Run exactly one per host, on loopback:
+
+    python admission_service.py
+    # or: gunicorn -w 1 --threads 64 -b 127.0.0.1:5101 admission_service:app
+
+Threads must cover every request that may be queued at once
+(ADMISSION_QUEUE_MAX per pool plus the running ones).
+
+POST /acquire {pool, user} -> {lease} | 429/503 {error, retryAfter}
+POST /release {lease}
+GET  /stats, GET /healthz
+"""
+
+import time
+import uuid
+import threading
+
+from flask import Flask, request, jsonify
+
+import config
+from admission import AdmissionError, FairPool
+
+_pools = {name: FairPool(name, spec["concurrency"]) for name, spec in config.ADMISSION_POOLS.items()}
+_leases = {}  # lease -> (release, expires_at)
+_leases_lock = threading.Lock()
+
+
+def _release(lease: str) -> bool:
+    with _leases_lock:
+        entry = _leases.pop(lease, None)
+    if entry is None:
+        return False
+    entry[0]()
+    return True
+
+
+def _reap() -> None:
+    """Release leases whose worker never came back for them"""
+    while True:
+        time.sleep(min(60, config.ADMISSION_LEASE_SECONDS))
+        now = time.monotonic()
+        with _leases_lock:
+            expired = [lease for lease, (_, expires_at) in _leases.items() if expires_at <= now]
+        for lease in expired:
+            if _release(lease):
+                print(f"Reclaimed expired admission lease {lease}")
+
+
+threading.Thread(target=_reap, name="admission-reaper", daemon=True).start()
+
+
+# --- HTTP API ---
+
+app = Flask(__name__)
+
+
+@app.route("/acquire", methods=["POST"])
+def acquire():
+    data = request.json or {}
+    pool = _pools.get(data.get("pool"))
+    user = data.get("user")
+    if pool is None or not user:
+        return jsonify({"error": "pool and user are required"}), 400
+    try:
+        release = pool.acquire(str(user))
+    except AdmissionError as e:
+        return jsonify({"error": str(e), "retryAfter": e.retry_after}), e.status
+
+    lease = uuid.uuid4().hex
+    with _leases_lock:
+        _leases[lease] = (release, time.monotonic() + config.ADMISSION_LEASE_SECONDS)
+    return jsonify({"lease": lease})
+
+
+@app.route("/release", methods=["POST"])
+def release():
+    data = request.json or {}
+    if not data.get("lease"):
+        return jsonify({"error": "lease is required"}), 400
+    return jsonify({"released": _release(data["lease"])})
+
+
+@app.route("/stats", methods=["GET"])
+def stats():
+    with _leases_lock:
+        leases = len(_leases)
+    return jsonify({"pools": {name: pool.stats() for name, pool in _pools.items()}, "leases": leases})
+
+
+@app.route("/healthz", methods=["GET"])
+def healthz():
+    return jsonify({"status": "ok"})
+
+
+if __name__ == "__main__":
+    app.run(host="127.0.0.1", port=config.ADMISSION_SERVICE_PORT, threaded=True)
@@ -0,0 +1,226 @@
+"""
+Analysis Jobs Module
+Background media analysis with results stored per (media URL, prompt).
+
+Video analysis can spend minutes waiting for Gemini to process a file. In
+async mode the request only records a job and returns its id; a small
+worker pool does the transfer, polling and generation, and clients poll
+the status endpoint with backoff. (No long-lived progress stream: it would
+tie up a request worker for the whole analysis.) Finished analyses are stored
+in `media_analyses`, so repeating a prompt about the same asset is served
+from the database without calling Gemini at all. Results are keyed on the
+URL that was actually analyzed (media_analysis.media_key), never on
+client-supplied asset ids, so one user cannot plant a result that is then
+served for another user's asset.
+
+Job status: queued -> running -> complete | failed. While running, `stage`
+reports transferring / processing / generating, and `updatedAt` doubles as
+a heartbeat: a running job that stops updating (its process died) is
+reported as failed. Queued jobs send no heartbeat; they are bounded by
+ANALYSIS_QUEUE_MAX instead, and one still waiting ANALYSIS_QUEUED_TIMEOUT
+after it was created is given up.
+"""
+
+import uuid
+import hashlib
+import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import config
+import media_analysis
+from mongodb import analysis_jobs_collection, media_analyses_collection
+
+ANALYSIS_MODEL = "gemini-3-flash-preview"
+
+# Seconds a client is told to wait when the queue is full
+QUEUE_FULL_RETRY_AFTER = 30
+
+_executor = ThreadPoolExecutor(
+    max_workers=config.ANALYSIS_WORKERS, thread_name_prefix="media-analysis"
+)
+# Jobs submitted to _executor that have not finished (queued or running)
+_pending = 0
+_pending_lock = threading.Lock()
+
+
+class QueueFull(Exception):
+    """Raised when the analysis queue is full; maps to 503"""
+
+
+def _now():
+    return datetime.datetime.utcnow()
+
+
+def _stale_after() -> datetime.timedelta:
+    # Generous: a single stage (e.g. generation) may not report in between
+    return datetime.timedelta(seconds=config.GEMINI_FILE_PROCESS_TIMEOUT)
+
+
+def _queued_after() -> datetime.timedelta:
+    return datetime.timedelta(seconds=config.ANALYSIS_QUEUED_TIMEOUT)
+
+
+def _live_filter() -> dict:
+    """Matches jobs that are still queued or running, and not abandoned"""
+    now = _now()
+    return {
+        "$or": [
+            {"status": "running", "updatedAt": {"$gt": now - _stale_after()}},
+            {"status": "queued", "createdAt": {"$gt": now - _queued_after()}},
+        ]
+    }
+
+
+# --- STORED RESULTS ---
+
+
+def result_key(media_url: str, prompt: str) -> str:
+    raw = "\n".join(
+        [media_analysis.media_key(media_url), ANALYSIS_MODEL, prompt.strip()]
+    )
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def get_result(key: str):
+    doc = media_analyses_collection.find_one({"_id": key}, {"analysis": 1})
+    return doc["analysis"] if doc else None
+
+
+def _store_result(key: str, media_url: str, prompt: str, analysis: str) -> None:
+    media_analyses_collection.update_one(
+        {"_id": key},
+        {
+            "$set": {
+                "mediaKey": media_analysis.media_key(media_url),
+                "prompt": prompt,
+                "model": ANALYSIS_MODEL,
+                "analysis": analysis,
+                "createdAt": _now(),
+            }
+        },
+        upsert=True,
+    )
+
+
+def analyze_now(media_url: str, media_type: str, prompt: str):
+    """
+    Synchronous analysis, served from storage when possible.
+    Returns: (analysis, cached)
+    """
+    key = result_key(media_url, prompt)
+    analysis = get_result(key)
+    if analysis is not None:
+        return analysis, True
+
+    analysis = media_analysis.analyze(ANALYSIS_MODEL, media_url, media_type, prompt)
+    _store_result(key, media_url, prompt, analysis)
+    return analysis, False
+
+
+# --- JOBS ---
+
+
+def describe(job: dict) -> dict:
+    """Client-facing view of a job"""
+    status = job["status"]
+    error = job.get("error")
+    if status == "running" and _now() - job["updatedAt"] > _stale_after():
+        status, error = "failed", "Analysis was interrupted"
+    elif status == "queued" and _now() - job["createdAt"] > _queued_after():
+        status, error = "failed", "Analysis waited too long in the queue"
+
+    view = {"jobId": job["_id"], "status": status, "stage": job.get("stage")}
+    if status == "complete":
+        view["analysis"] = job.get("analysis", "")
+    if status == "failed":
+        view["error"] = error
+    return view
+
+
+def submit(user_id: str, media_url: str, media_type: str, prompt: str) -> dict:
+    """
+    Queue an analysis, reusing this user's in-flight job for the same
+    (media, prompt) if there is one. Returns the job description, or
+    raises QueueFull.
+    """
+    global _pending
+    key = result_key(media_url, prompt)
+    existing = analysis_jobs_collection.find_one(
+        {"resultKey": key, "userId": user_id, **_live_filter()}
+    )
+    if existing:
+        return describe(existing)
+
+    with _pending_lock:
+        if _pending >= config.ANALYSIS_WORKERS + config.ANALYSIS_QUEUE_MAX:
+            raise QueueFull("Too many analyses in progress. Please try again shortly.")
+        _pending += 1
+
+    job = {
+        "_id": uuid.uuid4().hex,
+        "userId": user_id,
+        "resultKey": key,
+        "mediaType": media_type,
+        "status": "queued",
+        "stage": None,
+        "createdAt": _now(),
+        "updatedAt": _now(),
+    }
+    try:
+        analysis_jobs_collection.insert_one(job)
+        _executor.submit(_run, job["_id"], key, media_url, media_type, prompt)
+    except BaseException:
+        _done()
+        raise
+    return describe(job)
+
+
+def _done() -> None:
+    global _pending
+    with _pending_lock:
+        _pending -= 1
+
+
+def _update(job_id: str, fields: dict) -> None:
+    analysis_jobs_collection.update_one(
+        {"_id": job_id}, {"$set": {**fields, "updatedAt": _now()}}
+    )
+
+
+def _run(job_id: str, key: str, media_url: str, media_type: str, prompt: str) -> None:
+    try:
+        _analyze(job_id, key, media_url, media_type, prompt)
+    finally:
+        _done()
+
+
+def _analyze(job_id: str, key: str, media_url: str, media_type: str, prompt: str) -> None:
+    started = analysis_jobs_collection.update_one(
+        {"_id": job_id, "status": "queued", "createdAt": {"$gt": _now() - _queued_after()}},
+        {"$set": {"status": "running", "updatedAt": _now()}},
+    )
+    if started.matched_count == 0:
+        # Already reported as failed to the client; don't run it after all
+        _update(job_id, {"status": "failed", "error": "Analysis waited too long in the queue"})
+        return
+    try:
+        analysis = get_result(key)
+        if analysis is None:
+            analysis = media_analysis.analyze(
+                ANALYSIS_MODEL,
+                media_url,
+                media_type,
+                prompt,
+                on_stage=lambda stage: _update(job_id, {"stage": stage}),
+            )
+            _store_result(key, media_url, prompt, analysis)
+        _update(job_id, {"status": "complete", "stage": None, "analysis": analysis})
+    except Exception as e:
+        print(f"Error in analysis job {job_id}: {str(e)}")
+        _update(job_id, {"status": "failed", "error": str(e)})
+
+
+def get_job(job_id: str, user_id: str):
+    job = analysis_jobs_collection.find_one({"_id": job_id, "userId": user_id})
+    return describe(job) if job else None
@@ -1,22 +1,116 @@
 import bcrypt
 import jwt
+import time
+import hashlib
 import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from functools import wraps
 from flask import request, jsonify
-import requests
 import config
+import metrics
+from http_client import get_session, default_timeout
+from rate_limit import TokenBucketLimiter, client_ip
+from ttl_cache import TTLCache
+
+
+class AuthBusyError(Exception):
+    """Raised when the password hashing pool is saturated"""
+
+
+# bcrypt releases the GIL, so a small thread pool keeps hashing off the
+# request thread while capping how many cores auth can burn at once.
+_hash_executor = ThreadPoolExecutor(
+    max_workers=config.AUTH_HASH_WORKERS, thread_name_prefix="bcrypt"
+)
+_hash_slots = threading.BoundedSemaphore(
+    config.AUTH_HASH_WORKERS + config.AUTH_HASH_QUEUE
+)
+
+_ip_limiter = TokenBucketLimiter(
+    rate=config.AUTH_IP_RATE_PER_MIN / 60.0, capacity=config.AUTH_IP_BURST
+)
+_email_limiter = TokenBucketLimiter(
+    rate=config.AUTH_EMAIL_RATE_PER_MIN / 60.0, capacity=config.AUTH_EMAIL_BURST
+)
+
+
+def _run_in_hash_pool(fn, *args):
+    """
+    Run a bcrypt call on the bounded worker pool. The slot is held until
+    the job itself finishes or is cancelled, not just until we stop waiting,
+    so timed-out work can't pile up beyond the pool and queue size.
+    """
+    if not _hash_slots.acquire(blocking=False):
+        raise AuthBusyError("Too many concurrent authentication requests")
+    try:
+        future = _hash_executor.submit(fn, *args)
+    except BaseException:
+        _hash_slots.release()
+        raise
+    future.add_done_callback(lambda _: _hash_slots.release())
+    try:
+        return future.result(timeout=config.AUTH_HASH_TIMEOUT)
+    except FutureTimeoutError:
+        # Drop it if it hasn't started; a running hash keeps its slot
+        future.cancel()
+        raise AuthBusyError("Authentication timed out")
+
+
+def _hash_sync(password: str) -> str:
+    salt = bcrypt.gensalt(rounds=config.BCRYPT_ROUNDS)
+    return bcrypt.hashpw(password.encode('utf-8'), salt).decode('utf-8')
+
+
+def _verify_sync(password: str, hashed_password: str) -> bool:
+    return bcrypt.checkpw(password.encode('utf-8'), hashed_password.encode('utf-8'))
 
 
 def hash_password(password: str) -> str:
-    """Hash a password using bcrypt"""
-    salt = bcrypt.gensalt()
-    hashed = bcrypt.hashpw(password.encode('utf-8'), salt)
-    return hashed.decode('utf-8')
+    """Hash a password using bcrypt (runs on the hashing pool)"""
+    return _run_in_hash_pool(_hash_sync, password)
 
 
 def verify_password(password: str, hashed_password: str) -> bool:
-    """Verify a password against its hash"""
-    return bcrypt.checkpw(password.encode('utf-8'), hashed_password.encode('utf-8'))
+    """Verify a password against its hash (runs on the hashing pool)"""
+    if not hashed_password:
+        return False
+    return _run_in_hash_pool(_verify_sync, password, hashed_password)
+
+
+def password_needs_rehash(hashed_password: str) -> bool:
+    """Check if a stored hash was made with a different work factor"""
+    try:
+        # bcrypt hashes look like $2b$<cost>$<salt+hash>
+        rounds = int(hashed_password.split('$')[2])
+    except (IndexError, ValueError):
+        return False
+    return rounds != config.BCRYPT_ROUNDS
+
+
+def check_auth_rate_limit(email: str = None):
+    """
+    Token-bucket check per client IP and per email, done before any hashing.
+    Returns: None if allowed, otherwise a (response, status) tuple.
+    """
+    checks = [(_ip_limiter, f"ip:{client_ip(request)}")]
+    if email:
+        checks.append((_email_limiter, f"email:{email}"))
+
+    for limiter, key in checks:
+        allowed, retry_after = limiter.consume(key)
+        if not allowed:
+            response = jsonify({'error': 'Too many attempts. Please try again later.'})
+            response.headers['Retry-After'] = str(max(1, int(retry_after + 0.999)))
+            return response, 429
+    return None
+
+
+def auth_busy_response():
+    """Response for when the hashing pool is saturated"""
+    response = jsonify({'error': 'Server is busy. Please try again shortly.'})
+    response.headers['Retry-After'] = '2'
+    return response, 503
 
 
 def generate_token(user_id: str, email: str) -> str:
@@ -70,15 +164,105 @@ def token_required(f):
     return decorated
 
 
-def verify_google_token(token: str):
-    """Verify Google Access Token and get user info"""
-    try:
-        response = requests.get(
-            f"https://www.googleapis.com/oauth2/v1/userinfo?alt=json&access_token={token}"
+_google_token_cache = TTLCache(maxsize=4096)
+_google_jwks_client = None
+
+GOOGLE_USERINFO_URL = "https://www.googleapis.com/oauth2/v1/userinfo"
+GOOGLE_ISSUERS = ("accounts.google.com", "https://accounts.google.com")
+
+
+def _token_cache_key(token: str) -> str:
+    # Never keep raw bearer tokens in memory longer than the request
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+
+def _get_google_jwks_client():
+    """JWKS client that caches Google's signing keys between requests"""
+    global _google_jwks_client
+    if _google_jwks_client is None:
+        _google_jwks_client = jwt.PyJWKClient(
+            config.GOOGLE_JWKS_URL,
+            cache_jwk_set=True,
+            lifespan=config.GOOGLE_JWKS_CACHE_TTL,
         )
-        if response.status_code == 200:
-            return response.json()
-        return None
+    return _google_jwks_client
+
+
+def _looks_like_jwt(token: str) -> bool:
+    return token.count('.') == 2
+
+
+def _verify_google_id_token(token: str):
+    """
+    Verify a Google ID token offline against cached JWKS keys.
+    Returns: (user info in userinfo-endpoint shape, seconds until expiry)
+    """
+    signing_key = _get_google_jwks_client().get_signing_key_from_jwt(token)
+    claims = jwt.decode(
+        token,
+        signing_key.key,
+        algorithms=['RS256'],
+        audience=config.GOOGLE_CLIENT_ID,
+        options={'require': ['exp', 'iss', 'sub']},
+    )
+    if claims.get('iss') not in GOOGLE_ISSUERS:
+        raise jwt.InvalidIssuerError("Unexpected issuer")
+    if not claims.get('email_verified', False):
+        raise jwt.InvalidTokenError("Email not verified")
+
+    info = {
+        'id': claims['sub'],
+        'email': claims.get('email'),
+        'name': claims.get('name'),
+        'picture': claims.get('picture'),
+    }
+    return info, claims['exp'] - time.time()
+
+
+def _fetch_google_userinfo(token: str):
+    """Look up an access token via the userinfo endpoint over the pooled session"""
+    with metrics.outbound('google', 'userinfo'):
+        response = get_session().get(
+            GOOGLE_USERINFO_URL,
+            params={'alt': 'json'},
+            headers={'Authorization': f'Bearer {token}'},
+            timeout=default_timeout(),
+        )
+    if response.status_code == 200:
+        return response.json()
+    return None
+
+
+def verify_google_token(token: str, expires_in: int = None):
+    """
+    Verify a Google token and get user info.
+    Accepts either an ID token (verified offline when GOOGLE_CLIENT_ID is set)
+    or an OAuth access token (verified via userinfo). Successful results are
+    cached by token hash until the token expires.
+    """
+    cache_key = _token_cache_key(token)
+    cached = _google_token_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    try:
+        if (
+            config.GOOGLE_OFFLINE_ID_TOKEN
+            and config.GOOGLE_CLIENT_ID
+            and _looks_like_jwt(token)
+        ):
+            info, ttl = _verify_google_id_token(token)
+        else:
+            info = _fetch_google_userinfo(token)
+            ttl = config.GOOGLE_TOKEN_CACHE_TTL
+            if isinstance(expires_in, (int, float)) and expires_in > 0:
+                ttl = min(ttl, expires_in)
     except Exception as e:
         print(f"Token verification failed: {e}")
-        return None
\ No newline at end of file
+        return None
+
+    if not info or not info.get('email'):
+        return None
+
+    _google_token_cache.set(cache_key, info, min(ttl, config.GOOGLE_TOKEN_CACHE_TTL))
+    return info
@@ -1,24 +1,39 @@
 import json
-import datetime
-import os
 import time
-import tempfile
-import requests
+import datetime
 from flask import Flask, request, Response, stream_with_context, send_file, jsonify
 from flask_cors import CORS
-from openai import OpenAI
-from google import genai
+from werkzeug.middleware.proxy_fix import ProxyFix
+from compression import init_compression
+from conditional import make_etag, is_fresh, not_modified, with_etag
 from bson import ObjectId
 
 import config
-from database import collection
-from mongodb import projects_collection, users_collection, chats_collection
+import analysis_jobs
+import database
+import canvas_store
+import cloudinary_config
+import llm_gateway
+import text_edits
+import media_analysis
+import media_upload
+import metrics
+import profiling
+import warmup
+import workspace_store
+import writing_store
+from mongodb import projects_collection, users_collection, chats_collection, ensure_indexes
 from news_ingest import fetch_and_store_news, fetch_newsapi_data, clear_existing_news
 from pdf_ingest import ingest_local_pdfs
 from tts import generate_tts_audio
+from admission import admission_required
 from auth import (
     hash_password,
     verify_password,
+    password_needs_rehash,
+    check_auth_rate_limit,
+    auth_busy_response,
+    AuthBusyError,
     generate_token,
     verify_token,
     token_required,
@@ -31,21 +46,32 @@ from youtube_stats import (
     calculate_growth,
     generate_growth_graph,
     get_stats_history,
+    warm_up as warm_up_graphs,
 )
 
 # --- SERVER SETUP ---
 app = Flask(__name__)
+if config.TRUSTED_PROXY_COUNT:
+    app.wsgi_app = ProxyFix(
+        app.wsgi_app, x_for=config.TRUSTED_PROXY_COUNT, x_proto=config.TRUSTED_PROXY_COUNT
+    )
 CORS(app)
-
-print("Initializing NVIDIA Client...")
-nvidia_client = OpenAI(base_url=config.NVIDIA_BASE_URL, api_key=config.NVIDIA_API_KEY)
-
-print("Initializing Gemini Client...")
-try:
-    genai_client = genai.Client(api_key=config.GEMINI_API_KEY)
-except Exception as e:
-    print(f"Warning: Gemini Client failed to initialize: {e}")
-    genai_client = None
+init_compression(app)
+metrics.init_metrics(app)
+profiling.init_profiling(app)
+warmup.init_health(app)
+
+# Clients and heavy libraries load on first use; warm them in the background
+warmup.register("mongodb", ensure_indexes)
+warmup.register("chroma", database.warm_up)
+warmup.register("llm", llm_gateway.warm_up)
+warmup.register("gemini", media_analysis.warm_up, required=False)
+if config.MEDIA_UPLOAD_BACKEND == "cloudinary":
+    warmup.register("cloudinary", cloudinary_config.get_uploader, required=False)
+if config.YOUTUBE_API_KEY:
+    warmup.register("graphs", warm_up_graphs, required=False)
+if config.WARMUP_ON_START:
+    warmup.start()
 
 
 # --- API ROUTES ---
@@ -74,13 +100,20 @@ def register():
     if len(password) < 6:
         return jsonify({"error": "Password must be at least 6 characters"}), 400
 
+    limited = check_auth_rate_limit(email)
+    if limited:
+        return limited
+
     # Check if user already exists
     existing_user = users_collection.find_one({"email": email})
     if existing_user:
         return jsonify({"error": "Email already exists"}), 409
 
     # Create user
-    hashed_password = hash_password(password)
+    try:
+        hashed_password = hash_password(password)
+    except AuthBusyError:
+        return auth_busy_response()
     user = {
         "email": email,
         "password": hashed_password,
@@ -114,14 +147,27 @@ def login():
     if not email or not password:
         return jsonify({"error": "Email and password are required"}), 400
 
+    limited = check_auth_rate_limit(email)
+    if limited:
+        return limited
+
     # Find user
     user = users_collection.find_one({"email": email})
     if not user:
         return jsonify({"error": "Invalid email or password"}), 401
 
     # Verify password
-    if not verify_password(password, user["password"]):
-        return jsonify({"error": "Invalid email or password"}), 401
+    try:
+        if not verify_password(password, user["password"]):
+            return jsonify({"error": "Invalid email or password"}), 401
+
+        # Transparently upgrade hashes made with an old work factor
+        if password_needs_rehash(user["password"]):
+            users_collection.update_one(
+                {"_id": user["_id"]}, {"$set": {"password": hash_password(password)}}
+            )
+    except AuthBusyError:
+        return auth_busy_response()
 
     # Generate token
     user_id = str(user["_id"])
@@ -149,7 +195,11 @@ def google_login():
     if not token:
         return jsonify({"error": "Token is required"}), 400
 
-    id_info = verify_google_token(token)
+    limited = check_auth_rate_limit()
+    if limited:
+        return limited
+
+    id_info = verify_google_token(token, expires_in=data.get("expiresIn"))
     if not id_info:
         return jsonify({"error": "Invalid Google token"}), 401
 
@@ -441,6 +491,8 @@ def get_stats_history_route():
 
 
 @app.route("/tts", methods=["POST"])
+@token_required
+@admission_required("tts")
 def tts_endpoint():
     data = request.json
     text = data.get("text", "")
@@ -468,14 +520,21 @@ def update_news():
 
 
 @app.route("/chat", methods=["POST"])
+@token_required
+@admission_required("llm")
 def chat():
     data = request.json
     user_query = data.get("message", "")
     history = data.get("history", [])
 
     def generate():
+        started = time.perf_counter()
+
         # 1. RAG Search
-        results = collection.query(query_texts=[user_query], n_results=3)
+        with metrics.CHROMA_SECONDS.time(operation="query"):
+            results = database.get_collection().query(query_texts=[user_query], n_results=3)
+        retrieved = time.perf_counter()
+        metrics.CHAT_STAGE_SECONDS.observe(retrieved - started, stage="retrieval")
 
         context = "No context available."
         if results["documents"][0]:
@@ -513,45 +572,181 @@ def chat():
             messages_payload.append({"role": role, "content": msg["content"]})
 
         messages_payload.append({"role": "user", "content": f"QUESTION:\n{user_query}"})
+        prompted = time.perf_counter()
+        metrics.CHAT_STAGE_SECONDS.observe(prompted - retrieved, stage="prompt")
 
         # 4. Call NVIDIA (Stream)
-        completion = nvidia_client.chat.completions.create(
-            model=config.MODEL_NAME,
-            messages=messages_payload,
-            temperature=0.6,
-            top_p=0.7,
-            max_tokens=4096,
-            stream=True,
-        )
+        try:
+            completion = llm_gateway.stream(
+                "chat",
+                messages=messages_payload,
+                temperature=0.6,
+                top_p=0.7,
+                max_tokens=4096,
+            )
+        except llm_gateway.LLMBusyError as e:
+            yield f"data: {json.dumps({'type': 'error', 'content': str(e)})}\n\n"
+            yield "data: [DONE]\n\n"
+            return
 
         # 5. Stream Response
+        first_token = None
+        tokens = 0
         for chunk in completion:
             if not chunk.choices:
                 continue
 
             reasoning = getattr(chunk.choices[0].delta, "reasoning_content", None)
+            content = chunk.choices[0].delta.content
+            if reasoning or content:
+                tokens += 1
+                if first_token is None:
+                    first_token = time.perf_counter()
+                    metrics.CHAT_STAGE_SECONDS.observe(first_token - prompted, stage="ttft")
+
             if reasoning:
                 yield f"data: {json.dumps({'type': 'thought', 'content': reasoning})}\n\n"
 
-            content = chunk.choices[0].delta.content
             if content:
                 yield f"data: {json.dumps({'type': 'answer', 'content': content})}\n\n"
 
+        finished = time.perf_counter()
+        if first_token is not None:
+            generation = finished - first_token
+            metrics.CHAT_STAGE_SECONDS.observe(generation, stage="generation")
+            if generation > 0:
+                metrics.CHAT_TOKENS_PER_SECOND.observe(tokens / generation)
+        metrics.CHAT_STAGE_SECONDS.observe(finished - started, stage="total")
+
         yield "data: [DONE]\n\n"
 
     return Response(stream_with_context(generate()), mimetype="text/event-stream")
 
 
-@app.route("/generate-drawing", methods=["POST"])
-def generate_drawing():
-    """Generate Mermaid diagram from natural language prompt"""
-    data = request.json
-    prompt = data.get("prompt", "")
+MERMAID_STARTS = (
+    "flowchart",
+    "sequenceDiagram",
+    "classDiagram",
+    "stateDiagram",
+    "erDiagram",
+    "pie",
+    "gantt",
+    "graph",
+)
 
-    if not prompt:
-        return jsonify({"error": "Prompt is required"}), 400
+INVALID_MERMAID_ERROR = (
+    "AI did not generate valid Mermaid diagram. Please try a different prompt."
+)
+
+
+def _sse_event(payload: dict) -> str:
+    return f"data: {json.dumps(payload)}\n\n"
+
+
+def _llm_busy_response(error):
+    """Response for when the LLM gateway has no free upstream slot"""
+    response = jsonify({"error": str(error)})
+    response.headers["Retry-After"] = str(error.retry_after)
+    return response, 503
+
+
+def _strip_code_fence(text: str) -> str:
+    """Remove a Markdown code block wrapped around generated code"""
+    text = text.strip()
+    if text.startswith("```"):
+        lines = text.split("\n")
+        # Remove first and last lines if they're code block markers
+        if lines[0].startswith("```"):
+            lines = lines[1:]
+        if lines and lines[-1].strip() == "```":
+            lines = lines[:-1]
+        text = "\n".join(lines)
+    return text
+
+
+def _is_mermaid(code: str) -> bool:
+    return code.strip().startswith(MERMAID_STARTS)
+
+
+class _FenceFilter:
+    """
+    Drops Markdown code-fence lines from streamed text. Text is released
+    a whole line at a time, so a fence split across tokens is still caught.
+    """
+
+    def __init__(self):
+        self._line = ""
+
+    def feed(self, text: str) -> str:
+        self._line += text
+        lines = []
+        while "\n" in self._line:
+            line, self._line = self._line.split("\n", 1)
+            if not line.strip().startswith("```"):
+                lines.append(line + "\n")
+        return "".join(lines)
+
+    def flush(self) -> str:
+        line, self._line = self._line, ""
+        return "" if line.strip().startswith("```") else line
+
+
+def _relay_completion(completion, fence_filter=None):
+    """
+    Relay a streamed completion as /chat-style thought/answer events.
+    Returns (via `yield from`) the full answer text.
+    """
+    answer, thought = [], []
+    for chunk in completion:
+        if not chunk.choices:
+            continue
+
+        reasoning = getattr(chunk.choices[0].delta, "reasoning_content", None)
+        if reasoning:
+            thought.append(reasoning)
+            yield _sse_event({"type": "thought", "content": reasoning})
+
+        content = chunk.choices[0].delta.content
+        if content:
+            answer.append(content)
+            if fence_filter:
+                content = fence_filter.feed(content)
+            if content:
+                yield _sse_event({"type": "answer", "content": content})
+
+    if fence_filter:
+        tail = fence_filter.flush()
+        if tail:
+            yield _sse_event({"type": "answer", "content": tail})
+
+    # Thinking models may put everything in reasoning_content
+    return "".join(answer) or "".join(thought)
 
-    system_prompt = """You are a diagram generation assistant. Your ONLY job is to convert user descriptions into valid Mermaid diagram syntax.
+
+def _stream_generation(completion, finalize, fence_filter=None):
+    """
+    Relay a streamed completion, then emit `finalize(full_text)` (a result
+    or error event) and [DONE].
+    """
+    try:
+        text = yield from _relay_completion(completion, fence_filter)
+        yield _sse_event(finalize(text))
+    except Exception as e:
+        yield _sse_event({"type": "error", "content": str(e)})
+
+    yield "data: [DONE]\n\n"
+
+
+def _completion_text(completion):
+    """Text of a non-streamed completion, or None if it is empty"""
+    # Handle thinking models
+    message = completion.choices[0].message
+    if message.content is not None:
+        return message.content
+    return getattr(message, "reasoning_content", None)
+
+
+DRAWING_SYSTEM_PROMPT = """You are a diagram generation assistant. Your ONLY job is to convert user descriptions into valid Mermaid diagram syntax.
 
 CRITICAL RULES:
 1. Output ONLY the Mermaid code - no markdown code blocks, no explanations, no extra text
@@ -580,19 +775,50 @@ sequenceDiagram
 
 Remember: Output ONLY the Mermaid code, nothing else. Do NOT include any thinking or reasoning - just the diagram code."""
 
+
+@app.route("/generate-drawing", methods=["POST"])
+@token_required
+@admission_required("llm")
+def generate_drawing():
+    """
+    Generate Mermaid diagram from natural language prompt.
+    With "stream": true, responds with server-sent events instead.
+    """
+    data = request.json
+    prompt = data.get("prompt", "")
+    stream = bool(data.get("stream"))
+
+    if not prompt:
+        return jsonify({"error": "Prompt is required"}), 400
+
     try:
-        completion = nvidia_client.chat.completions.create(
-            model=config.MODEL_NAME,
+        request_llm = llm_gateway.stream if stream else llm_gateway.complete
+        completion = request_llm(
+            "drawing",
             messages=[
-                {"role": "system", "content": system_prompt},
+                {"role": "system", "content": DRAWING_SYSTEM_PROMPT},
                 {"role": "user", "content": f"Create a diagram for: {prompt}"},
             ],
             temperature=0.3,
             top_p=0.9,
             max_tokens=1024,
-            stream=False,
         )
 
+        if stream:
+
+            def finalize(text):
+                mermaid_code = _strip_code_fence(text)
+                if not _is_mermaid(mermaid_code):
+                    return {"type": "error", "content": INVALID_MERMAID_ERROR}
+                return {"type": "result", "mermaid": mermaid_code}
+
+            return Response(
+                stream_with_context(
+                    _stream_generation(completion, finalize, _FenceFilter())
+                ),
+                mimetype="text/event-stream",
+            )
+
         # Handle thinking models that may have None content
         message = completion.choices[0].message
         mermaid_code = message.content
@@ -609,49 +835,36 @@ Remember: Output ONLY the Mermaid code, nothing else. Do NOT include any thinkin
                     {"error": "AI returned empty response. Please try again."}
                 ), 500
 
-        mermaid_code = mermaid_code.strip()
-
         # Clean up any markdown code blocks if present
-        if mermaid_code.startswith("```"):
-            lines = mermaid_code.split("\n")
-            # Remove first and last lines if they're code block markers
-            if lines[0].startswith("```"):
-                lines = lines[1:]
-            if lines and lines[-1].strip() == "```":
-                lines = lines[:-1]
-            mermaid_code = "\n".join(lines)
+        mermaid_code = _strip_code_fence(mermaid_code)
 
         # Validate that we have something that looks like Mermaid code
-        valid_starts = [
-            "flowchart",
-            "sequenceDiagram",
-            "classDiagram",
-            "stateDiagram",
-            "erDiagram",
-            "pie",
-            "gantt",
-            "graph",
-        ]
-        if not any(mermaid_code.strip().startswith(start) for start in valid_starts):
-            return jsonify(
-                {
-                    "error": "AI did not generate valid Mermaid diagram. Please try a different prompt."
-                }
-            ), 500
+        if not _is_mermaid(mermaid_code):
+            return jsonify({"error": INVALID_MERMAID_ERROR}), 500
 
         return jsonify({"mermaid": mermaid_code})
 
+    except llm_gateway.LLMBusyError as e:
+        return _llm_busy_response(e)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
 @app.route("/generate-writing", methods=["POST"])
+@token_required
+@admission_required("llm")
 def generate_writing():
-    """Generate or edit text based on user prompt and context"""
+    """
+    Generate or edit text based on user prompt and context.
+    With "stream": true, responds with server-sent events instead.
+    Long full-document edits use anchored patches (see text_edits.py);
+    send "editMode": "rewrite" to force a full rewrite.
+    """
     data = request.json
     prompt = data.get("prompt", "")
     selected_text = data.get("selectedText", "")
     full_text = data.get("fullText", "")
+    stream = bool(data.get("stream"))
 
     if not prompt:
         return jsonify({"error": "Prompt is required"}), 400
@@ -664,6 +877,7 @@ CRITICAL RULES:
 2. Use markdown formatting (bold, italic, headers) where appropriate.
 3. If the user asks for code, provide just the code.
 """
+    base_instruction = system_instruction
 
     user_content = f"Instruction: {prompt}"
 
@@ -681,32 +895,102 @@ CRITICAL RULES:
         # Generating from scratch
         system_instruction += "\n4. Generate new text based on the instruction."
 
-    try:
-        completion = nvidia_client.chat.completions.create(
-            model=config.MODEL_NAME,
+    # Long documents are edited through anchored patches instead of a full
+    # rewrite, so output tokens scale with the change, not the document
+    patch_mode = (
+        bool(full_text)
+        and not selected_text
+        and data.get("editMode", "auto") != "rewrite"
+        and len(full_text) >= config.WRITING_PATCH_MIN_LENGTH
+    )
+
+    # Whole-document edits go to the stronger model tier
+    route = "writing_full" if full_text and not selected_text else "writing"
+
+    def complete(instructions, stream, route=route):
+        request_llm = llm_gateway.stream if stream else llm_gateway.complete
+        return request_llm(
+            route,
             messages=[
-                {"role": "system", "content": system_instruction},
+                {"role": "system", "content": instructions},
                 {"role": "user", "content": user_content},
             ],
             temperature=0.7,
             top_p=0.9,
             max_tokens=4096,  # Increased for full document handling
-            stream=False,
         )
 
-        # Handle thinking models
-        message = completion.choices[0].message
-        generated_text = message.content
+    def apply_patch(output):
+        """Updated document, or None when the edits do not apply"""
+        try:
+            return text_edits.apply_output(full_text, output or "")
+        except text_edits.EditError as e:
+            print(f"Writing patch failed, falling back to full rewrite: {e}")
+            return None
+
+    def patch_failed(error):
+        """Route for the rewrite after the patch call itself failed"""
+        if isinstance(error, llm_gateway.LLMBusyError):
+            raise error
+        print(f"Writing patch request failed, falling back to full rewrite: {error}")
+        # Every writing_full tier just failed; let the rewrite try the
+        # writing route's tiers too
+        return "writing"
+
+    if stream:
+
+        def generate():
+            try:
+                rewrite_route = route
+                if patch_mode:
+                    try:
+                        output = yield from _relay_completion(
+                            complete(base_instruction + text_edits.INSTRUCTIONS, True)
+                        )
+                        patched = apply_patch(output)
+                    except Exception as e:
+                        rewrite_route, patched = patch_failed(e), None
+                    if patched is not None:
+                        yield _sse_event({"type": "result", "text": patched, "editMode": "patch"})
+                        yield "data: [DONE]\n\n"
+                        return
+                    # Tell the client to discard what it has shown so far
+                    yield _sse_event({"type": "reset"})
+
+                text = yield from _relay_completion(
+                    complete(system_instruction, True, rewrite_route)
+                )
+                if text.strip():
+                    yield _sse_event({"type": "result", "text": text.strip(), "editMode": "rewrite"})
+                else:
+                    yield _sse_event({"type": "error", "content": "AI returned empty response"})
+            except Exception as e:
+                yield _sse_event({"type": "error", "content": str(e)})
+
+            yield "data: [DONE]\n\n"
+
+        return Response(stream_with_context(generate()), mimetype="text/event-stream")
 
+    try:
+        rewrite_route = route
+        if patch_mode:
+            try:
+                patched = apply_patch(
+                    _completion_text(complete(base_instruction + text_edits.INSTRUCTIONS, False))
+                )
+            except Exception as e:
+                rewrite_route, patched = patch_failed(e), None
+            if patched is not None:
+                return jsonify({"text": patched, "editMode": "patch"})
+
+        generated_text = _completion_text(complete(system_instruction, False, rewrite_route))
         if generated_text is None:
-            reasoning = getattr(message, "reasoning_content", None)
-            if reasoning:
-                generated_text = reasoning
-            else:
-                return jsonify({"error": "AI returned empty response"}), 500
+            return jsonify({"error": "AI returned empty response"}), 500
 
-        return jsonify({"text": generated_text.strip()})
+        return jsonify({"text": generated_text.strip(), "editMode": "rewrite"})
 
+    except llm_gateway.LLMBusyError as e:
+        return _llm_busy_response(e)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -726,61 +1010,43 @@ def analyze_media():
     if not config.GEMINI_API_KEY:
         return jsonify({"error": "Gemini API key not configured"}), 500
 
-    if not genai_client:
+    if not media_analysis.get_client():
         return jsonify(
             {"error": "Gemini Client not initialized. Please check your API key."}
         ), 500
 
-    temp_file_path = None
-    uploaded_file = None
-
     try:
-        # 1. Download media to temp file
-        response = requests.get(media_url)
-        if response.status_code != 200:
-            return jsonify({"error": "Failed to download media from URL"}), 400
-
-        suffix = ".mp4" if media_type == "video" else ".jpg"
-        with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
-            tmp.write(response.content)
-            temp_file_path = tmp.name
-
-        # 2. Upload to Gemini
-        uploaded_file = genai_client.files.upload(file=temp_file_path)
-
-        # 3. Wait if video
-        if media_type == "video":
-            while True:
-                file_obj = genai_client.files.get(name=uploaded_file.name)
-                if "ACTIVE" in str(file_obj.state):
-                    break
-                elif "FAILED" in str(file_obj.state):
-                    raise Exception("Gemini video processing failed")
-                time.sleep(5)
-
-        # 4. Generate content
-        analysis_response = genai_client.models.generate_content(
-            model="gemini-3-flash-preview", contents=[uploaded_file, prompt]
-        )
-
-        return jsonify({"analysis": analysis_response.text})
-
+        # Async mode: return a job id at once, analyze in the background
+        if data.get("mode") == "async":
+            key = analysis_jobs.result_key(media_url, prompt)
+            analysis = analysis_jobs.get_result(key)
+            if analysis is not None:
+                return jsonify({"analysis": analysis, "cached": True})
+            job = analysis_jobs.submit(request.user_id, media_url, media_type, prompt)
+            return jsonify(job), 202
+
+        analysis, cached = analysis_jobs.analyze_now(media_url, media_type, prompt)
+        return jsonify({"analysis": analysis, "cached": cached})
+
+    except analysis_jobs.QueueFull as e:
+        response = jsonify({"error": str(e)})
+        response.headers["Retry-After"] = str(analysis_jobs.QUEUE_FULL_RETRY_AFTER)
+        return response, 503
+    except media_analysis.MediaAnalysisError as e:
+        return jsonify({"error": str(e)}), e.status
     except Exception as e:
         print(f"Error in analyze_media: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
-    finally:
-        # 5. Cleanup
-        if temp_file_path and os.path.exists(temp_file_path):
-            try:
-                os.remove(temp_file_path)
-            except:
-                pass
-        if uploaded_file:
-            try:
-                genai_client.files.delete(name=uploaded_file.name)
-            except:
-                pass
+
+@app.route("/analyze-media/jobs/<job_id>", methods=["GET"])
+@token_required
+def get_analysis_job(job_id):
+    """Status of a background analysis job"""
+    job = analysis_jobs.get_job(job_id, request.user_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job)
 
 
 # --- PROJECT ROUTES ---
@@ -791,7 +1057,9 @@ def analyze_media():
 def get_projects():
     """Get all projects for the logged-in user"""
     projects = list(
-        projects_collection.find({"userId": request.user_id}).sort("created", -1)
+        projects_collection.find({"userId": request.user_id}, {"workspace": 0}).sort(
+            "created", -1
+        )
     )
     # Convert ObjectId to string for JSON serialization
     for project in projects:
@@ -826,7 +1094,7 @@ def update_project(project_id):
 
     # Check ownership
     project = projects_collection.find_one(
-        {"_id": ObjectId(project_id), "userId": request.user_id}
+        {"_id": ObjectId(project_id), "userId": request.user_id}, {"_id": 1}
     )
     if not project:
         return jsonify({"error": "Project not found or access denied"}), 404
@@ -840,7 +1108,9 @@ def update_project(project_id):
             {"_id": ObjectId(project_id)}, {"$set": update_data}
         )
 
-    project = projects_collection.find_one({"_id": ObjectId(project_id)})
+    project = projects_collection.find_one(
+        {"_id": ObjectId(project_id)}, {"workspace": 0}
+    )
     project["_id"] = str(project["_id"])
     return jsonify(project)
 
@@ -854,6 +1124,7 @@ def delete_project(project_id):
     )
 
     if result.deleted_count > 0:
+        workspace_store.delete_workspace(project_id)
         return jsonify({"status": "deleted"})
 
     return jsonify({"error": "Project not found or access denied"}), 404
@@ -865,72 +1136,231 @@ def delete_project(project_id):
 @app.route("/projects/<project_id>/workspace/canvas", methods=["GET"])
 def get_canvas(project_id):
     """Get canvas data for a project"""
-    project = projects_collection.find_one({"_id": ObjectId(project_id)})
-    if project:
-        workspace = project.get("workspace", {})
-        return jsonify({"canvas": workspace.get("canvas", "")})
-    return jsonify({"error": "Project not found"}), 404
+    if not workspace_store.ensure_project(project_id):
+        return jsonify({"error": "Project not found"}), 404
+
+    etag = make_etag("canvas", project_id, canvas_store.current_revision(project_id))
+    if is_fresh(etag):
+        return not_modified(etag)
+
+    canvas, revision = canvas_store.get_canvas(project_id)
+    response = jsonify({"canvas": canvas, "revision": revision})
+    return with_etag(response, make_etag("canvas", project_id, revision))
 
 
 @app.route("/projects/<project_id>/workspace/canvas", methods=["PUT"])
 def save_canvas(project_id):
-    """Save canvas data for a project"""
+    """Save the full canvas scene for a project"""
     data = request.json
     canvas_data = data.get("canvas", "")
 
-    projects_collection.update_one(
-        {"_id": ObjectId(project_id)}, {"$set": {"workspace.canvas": canvas_data}}
-    )
-    return jsonify({"status": "saved"})
+    if not workspace_store.ensure_project(project_id, write=True):
+        return jsonify({"error": "Project not found"}), 404
+    try:
+        revision = canvas_store.save_scene(project_id, canvas_data)
+    except canvas_store.InvalidScene as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"status": "saved", "revision": revision})
+
+
+@app.route("/projects/<project_id>/workspace/canvas", methods=["PATCH"])
+def patch_canvas(project_id):
+    """Save changed canvas elements on top of a known revision"""
+    data = request.json
+    base_revision = data.get("baseRevision")
+    elements = data.get("elements", [])
+    app_state = data.get("appState")
+
+    if not isinstance(base_revision, int) or not isinstance(elements, list):
+        return jsonify({"error": "baseRevision and elements are required"}), 400
+
+    if not workspace_store.ensure_project(project_id, write=True):
+        return jsonify({"error": "Project not found"}), 404
+
+    try:
+        revision = canvas_store.apply_delta(
+            project_id, base_revision, elements, app_state
+        )
+    except canvas_store.RevisionConflict as e:
+        return jsonify({"error": "Revision conflict", "revision": e.revision}), 409
+    except canvas_store.InvalidScene as e:
+        return jsonify({"error": str(e)}), 400
+
+    return jsonify({"status": "saved", "revision": revision})
 
 
 @app.route("/projects/<project_id>/workspace/writing", methods=["GET"])
 def get_writing(project_id):
-    """Get writing content for a project"""
-    project = projects_collection.find_one({"_id": ObjectId(project_id)})
-    if project:
-        workspace = project.get("workspace", {})
-        return jsonify({"writing": workspace.get("writing", "")})
-    return jsonify({"error": "Project not found"}), 404
+    """Get writing content for a project (latest, or ?revision=N)"""
+    revision = request.args.get("revision", type=int)
+
+    if not workspace_store.ensure_project(project_id):
+        return jsonify({"error": "Project not found"}), 404
+
+    if revision is None:
+        revision = writing_store.latest_revision(project_id)
+    etag = make_etag("writing", project_id, revision)
+    if is_fresh(etag):
+        return not_modified(etag)
+
+    writing, revision = writing_store.get_writing(project_id, revision)
+    if writing is None:
+        return jsonify({"error": "Revision not found"}), 404
+    return with_etag(jsonify({"writing": writing, "revision": revision}), etag)
 
 
 @app.route("/projects/<project_id>/workspace/writing", methods=["PUT"])
 def save_writing(project_id):
-    """Save writing content for a project"""
+    """Save the full writing content for a project"""
     data = request.json
     writing_content = data.get("writing", "")
 
-    projects_collection.update_one(
-        {"_id": ObjectId(project_id)}, {"$set": {"workspace.writing": writing_content}}
-    )
-    return jsonify({"status": "saved"})
+    if not workspace_store.ensure_project(project_id, write=True):
+        return jsonify({"error": "Project not found"}), 404
+    revision = writing_store.save_full(project_id, writing_content)
+    return jsonify({"status": "saved", "revision": revision})
+
+
+@app.route("/projects/<project_id>/workspace/writing", methods=["PATCH"])
+def patch_writing(project_id):
+    """Apply text patches on top of a known writing revision"""
+    data = request.json
+    base_revision = data.get("baseRevision")
+    ops = data.get("ops")
+    length = data.get("length")
+
+    if not isinstance(base_revision, int) or not isinstance(ops, list):
+        return jsonify({"error": "baseRevision and ops are required"}), 400
+
+    if not workspace_store.ensure_project(project_id, write=True):
+        return jsonify({"error": "Project not found"}), 404
+
+    try:
+        revision = writing_store.apply_patch(project_id, base_revision, ops, length)
+    except writing_store.RevisionConflict as e:
+        return jsonify({"error": "Revision conflict", "revision": e.revision}), 409
+    except writing_store.InvalidPatch as e:
+        return jsonify({"error": str(e)}), 422
+
+    return jsonify({"status": "saved", "revision": revision})
+
+
+@app.route("/projects/<project_id>/workspace/writing/revisions", methods=["GET"])
+def get_writing_revisions(project_id):
+    """List recent writing revisions for a project"""
+    limit = min(request.args.get("limit", 50, type=int), 200)
+
+    if not workspace_store.ensure_project(project_id):
+        return jsonify({"error": "Project not found"}), 404
+    return jsonify({"revisions": writing_store.list_revisions(project_id, limit)})
+
+
+CHAT_ROLES = ("user", "ai")
+
+
+def _build_chat_messages(items: list) -> list:
+    """
+    Normalize incoming chat messages and stamp them. Timestamps are kept
+    distinct within a batch since history is ordered and paged by them.
+    Raises ValueError if any item is malformed, so nothing is stored.
+    """
+    for item in items:
+        if not isinstance(item, dict):
+            raise ValueError("Each message must be an object")
+        if item.get("role") not in CHAT_ROLES:
+            raise ValueError(f"role must be one of: {', '.join(CHAT_ROLES)}")
+        if not isinstance(item.get("content", ""), str) or not isinstance(
+            item.get("thought", ""), str
+        ):
+            raise ValueError("content and thought must be strings")
+
+    now = datetime.datetime.now()
+    return [
+        {
+            "role": item.get("role"),
+            "content": item.get("content") or "",
+            "thought": item.get("thought", ""),
+            "timestamp": (now + datetime.timedelta(microseconds=i)).isoformat(),
+        }
+        for i, item in enumerate(items)
+    ]
+
+
+def _chat_title(content: str) -> str:
+    """Simple title generation from the first message"""
+    return content[:40] + ("..." if len(content) > 40 else "")
 
 
 @app.route("/projects/<project_id>/workspace/chat", methods=["GET"])
 def get_chat_history(project_id):
-    """Get chat history for a project"""
-    project = projects_collection.find_one({"_id": ObjectId(project_id)})
-    if project:
-        workspace = project.get("workspace", {})
-        return jsonify({"chatHistory": workspace.get("chatHistory", [])})
-    return jsonify({"error": "Project not found"}), 404
+    """Get a page of chat history for a project (?before=<cursor>&limit=N)"""
+    before = request.args.get("before")
+    limit = max(1, min(request.args.get("limit", 50, type=int), 200))
+
+    if not workspace_store.ensure_project(project_id):
+        return jsonify({"error": "Project not found"}), 404
+
+    chat_revision = workspace_store.get_revision(project_id, "chat")
+    etag = make_etag("chat", project_id, chat_revision, before, limit)
+    if is_fresh(etag):
+        return not_modified(etag)
+
+    try:
+        messages, next_cursor = workspace_store.get_chat_page(project_id, before, limit)
+    except workspace_store.InvalidCursor:
+        return jsonify({"error": "Invalid cursor"}), 400
+    response = jsonify({"chatHistory": messages, "nextCursor": next_cursor})
+    return with_etag(response, etag)
+
+
+@app.route(
+    "/projects/<project_id>/workspace/chat/<message_id>/thought", methods=["GET"]
+)
+def get_chat_message_thought(project_id, message_id):
+    """Get the reasoning text of a single project chat message"""
+    # Saved messages never change, so the id alone identifies the version
+    etag = make_etag("thought", project_id, message_id)
+    if is_fresh(etag):
+        return not_modified(etag)
+
+    thought = workspace_store.get_message_thought(project_id, message_id)
+    if thought is None:
+        return jsonify({"error": "Message not found"}), 404
+    return with_etag(jsonify({"thought": thought}), etag)
 
 
 @app.route("/projects/<project_id>/workspace/chat", methods=["POST"])
 def add_chat_message(project_id):
-    """Add a chat message to project history"""
+    """Add one chat message, or a batch, to project history"""
     data = request.json
-    message = {
-        "role": data.get("role"),
-        "content": data.get("content"),
-        "thought": data.get("thought", ""),
-        "timestamp": datetime.datetime.now().isoformat(),
-    }
+    if not isinstance(data, dict):
+        return jsonify({"error": "A message object is required"}), 400
+
+    if not workspace_store.ensure_project(project_id, write=True):
+        return jsonify({"error": "Project not found"}), 404
+
+    # Either a single message or {"messages": [...]} for a whole turn
+    if "messages" in data:
+        if not isinstance(data["messages"], list) or not data["messages"]:
+            return jsonify({"error": "messages must be a non-empty list"}), 400
+        try:
+            messages = _build_chat_messages(data["messages"])
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        ids = workspace_store.add_chat_messages(project_id, messages)
+        return jsonify(
+            {
+                "status": "added",
+                "messages": [{**m, "id": i} for m, i in zip(messages, ids)],
+            }
+        )
 
-    projects_collection.update_one(
-        {"_id": ObjectId(project_id)}, {"$push": {"workspace.chatHistory": message}}
-    )
-    return jsonify({"status": "added", "message": message})
+    try:
+        message = _build_chat_messages([data])[0]
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    message_id = workspace_store.add_chat_messages(project_id, [message])[0]
+    return jsonify({"status": "added", "message": {**message, "id": message_id}})
 
 
 @app.route("/projects/<project_id>/workspace/upload", methods=["POST"])
@@ -954,6 +1384,9 @@ def upload_media(project_id):
         limit = "100MB" if media_type == "video" else "10MB"
         return jsonify({"error": f"File too large. Max size is {limit}"}), 400
 
+    if not workspace_store.ensure_project(project_id, write=True):
+        return jsonify({"error": "Project not found"}), 404
+
     try:
         if media_type == "video":
             result = upload_video(file, folder=f"qwenify/{project_id}/videos")
@@ -968,38 +1401,138 @@ def upload_media(project_id):
             "uploadedAt": datetime.datetime.now().isoformat(),
         }
 
-        projects_collection.update_one(
-            {"_id": ObjectId(project_id)}, {"$push": {"workspace.media": media_entry}}
-        )
+        workspace_store.add_media(project_id, media_entry)
 
         return jsonify(media_entry), 201
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
+@app.route("/projects/<project_id>/workspace/uploads", methods=["POST"])
+def start_media_upload(project_id):
+    """Open a resumable chunked upload session"""
+    data = request.json
+
+    if not workspace_store.ensure_project(project_id, write=True):
+        return jsonify({"error": "Project not found"}), 404
+
+    try:
+        session = media_upload.start_upload(
+            project_id,
+            data.get("filename", ""),
+            data.get("size"),
+            data.get("type", "image"),
+        )
+    except media_upload.UploadError as e:
+        return jsonify({"error": str(e)}), e.status
+    return jsonify(session), 201
+
+
+@app.route("/projects/<project_id>/workspace/uploads/<upload_id>", methods=["GET"])
+def get_media_upload(project_id, upload_id):
+    """Upload progress, used by clients to resume after an interruption"""
+    session = media_upload.get_upload(project_id, upload_id)
+    if not session:
+        return jsonify({"error": "Upload not found"}), 404
+    return jsonify(session)
+
+
+@app.route("/projects/<project_id>/workspace/uploads/<upload_id>", methods=["PUT"])
+def put_media_upload_chunk(project_id, upload_id):
+    """Receive one chunk (raw body + Content-Range) and forward it"""
+    try:
+        session, media = media_upload.upload_chunk(
+            project_id,
+            upload_id,
+            request.headers.get("Content-Range"),
+            request.stream,
+        )
+    except media_upload.UploadError as e:
+        body = {"error": str(e)}
+        if e.received is not None:
+            body["received"] = e.received
+        return jsonify(body), e.status
+    except Exception as e:
+        return jsonify({"error": str(e)}), 502
+
+    if not media:
+        return jsonify(media_upload.describe(session)), 202
+    return jsonify(media), 201
+
+
 @app.route("/projects/<project_id>/workspace/media", methods=["GET"])
 def get_media(project_id):
     """Get all media for a project"""
-    project = projects_collection.find_one({"_id": ObjectId(project_id)})
-    if project:
-        workspace = project.get("workspace", {})
-        return jsonify({"media": workspace.get("media", [])})
-    return jsonify({"error": "Project not found"}), 404
+    if not workspace_store.ensure_project(project_id):
+        return jsonify({"error": "Project not found"}), 404
+
+    etag = make_etag("media", project_id, workspace_store.get_revision(project_id, "media"))
+    if is_fresh(etag):
+        return not_modified(etag)
+
+    return with_etag(jsonify({"media": workspace_store.get_media(project_id)}), etag)
 
 
 # --- STANDALONE CHAT ROUTES ---
 
 
+CHAT_SNIPPET_LENGTH = 80
+
+# Sidebar summary; messageCount/lastSnippet fall back to the messages array
+# for sessions written before those fields were maintained
+CHAT_SUMMARY_PROJECTION = {
+    "title": 1,
+    "updatedAt": 1,
+    "messageCount": {
+        "$ifNull": ["$messageCount", {"$size": {"$ifNull": ["$messages", []]}}]
+    },
+    "lastSnippet": {
+        "$ifNull": [
+            "$lastSnippet",
+            {
+                "$substrCP": [
+                    {"$ifNull": [{"$arrayElemAt": ["$messages.content", -1]}, ""]},
+                    0,
+                    CHAT_SNIPPET_LENGTH,
+                ]
+            },
+        ]
+    },
+}
+
+
 @app.route("/chats", methods=["GET"])
 @token_required
 def get_recent_chats():
-    """Get all standalone chat sessions for the user"""
+    """Get a page of chat session summaries (?before=<cursor>&limit=N)"""
+    limit = max(1, min(request.args.get("limit", 30, type=int), 100))
+    before = request.args.get("before")
+
+    query = {"userId": request.user_id}
+    if before:
+        # Cursor is "<updatedAt>_<id>" of the last session on the previous page
+        updated_at, _, last_id = before.rpartition("_")
+        if not updated_at or not ObjectId.is_valid(last_id):
+            return jsonify({"error": "Invalid cursor"}), 400
+        query["$or"] = [
+            {"updatedAt": {"$lt": updated_at}},
+            {"updatedAt": updated_at, "_id": {"$lt": ObjectId(last_id)}},
+        ]
+
     chats = list(
-        chats_collection.find({"userId": request.user_id}).sort("updatedAt", -1)
+        chats_collection.find(query, CHAT_SUMMARY_PROJECTION)
+        .sort([("updatedAt", -1), ("_id", -1)])
+        .limit(limit + 1)
     )
+
+    next_cursor = None
+    if len(chats) > limit:
+        chats = chats[:limit]
+        next_cursor = f"{chats[-1]['updatedAt']}_{chats[-1]['_id']}"
+
     for chat in chats:
         chat["_id"] = str(chat["_id"])
-    return jsonify(chats)
+    return jsonify({"chats": chats, "nextCursor": next_cursor})
 
 
 @app.route("/chats", methods=["POST"])
@@ -1013,6 +1546,8 @@ def create_chat_session():
         "userId": request.user_id,
         "title": title,
         "messages": [],
+        "messageCount": 0,
+        "lastSnippet": "",
         "createdAt": datetime.datetime.now().isoformat(),
         "updatedAt": datetime.datetime.now().isoformat(),
     }
@@ -1037,39 +1572,65 @@ def get_chat_session(chat_id):
     return jsonify(chat)
 
 
+@app.route("/chats/<chat_id>/messages", methods=["POST"])
+@token_required
+def append_chat_session_messages(chat_id):
+    """Append a batch of messages (e.g. a whole turn) to a chat session"""
+    data = request.json
+    items = data.get("messages") if isinstance(data, dict) else None
+    if not isinstance(items, list) or not items:
+        return jsonify({"error": "messages must be a non-empty list"}), 400
+
+    try:
+        messages = _build_chat_messages(items)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if not _append_chat_messages(chat_id, messages):
+        return jsonify({"error": "Chat session not found"}), 404
+    return jsonify({"status": "added", "messages": messages})
+
+
 @app.route("/chats/<chat_id>/message", methods=["POST"])
 @token_required
 def add_chat_session_message(chat_id):
     """Add a message to a standalone chat session"""
-    data = request.json
-    message = {
-        "role": data.get("role"),
-        "content": data.get("content"),
-        "thought": data.get("thought", ""),
-        "timestamp": datetime.datetime.now().isoformat(),
-    }
+    try:
+        message = _build_chat_messages([request.json])[0]
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if not _append_chat_messages(chat_id, [message]):
+        return jsonify({"error": "Chat session not found"}), 404
+    return jsonify({"status": "added", "message": message})
 
-    # Update title if it's the first user message
-    update_query = {
-        "$push": {"messages": message},
-        "$set": {"updatedAt": datetime.datetime.now().isoformat()},
-    }
 
-    chat = chats_collection.find_one(
-        {"_id": ObjectId(chat_id), "userId": request.user_id}
-    )
-    if chat and len(chat.get("messages", [])) == 0 and message["role"] == "user":
-        # Simple title generation from first message
-        title = message["content"][:40] + (
-            "..." if len(message["content"]) > 40 else ""
-        )
-        update_query["$set"]["title"] = title
+def _append_chat_messages(chat_id: str, messages: list) -> bool:
+    """
+    Single pipeline update: append, refresh counters and, when the chat is
+    still empty, title it after the first user message. No prior read.
+    Returns False if the chat does not exist for this user.
+    """
+    first_user = next((m for m in messages if m["role"] == "user"), None)
+    current_messages = {"$ifNull": ["$messages", []]}
 
-    chats_collection.update_one(
-        {"_id": ObjectId(chat_id), "userId": request.user_id}, update_query
-    )
+    update = {
+        "messages": {"$concatArrays": [current_messages, {"$literal": messages}]},
+        "updatedAt": messages[-1]["timestamp"],
+        "lastSnippet": {"$literal": messages[-1]["content"][:CHAT_SNIPPET_LENGTH]},
+    }
+    if first_user:
+        update["title"] = {
+            "$cond": [
+                {"$eq": [{"$size": current_messages}, 0]},
+                {"$literal": _chat_title(first_user["content"])},
+                "$title",
+            ]
+        }
 
-    return jsonify({"status": "added", "message": message})
+    result = chats_collection.update_one(
+        {"_id": ObjectId(chat_id), "userId": request.user_id},
+        [{"$set": update}, {"$set": {"messageCount": {"$size": "$messages"}}}],
+    )
+    return result.matched_count > 0
 
 
 @app.route("/chats/<chat_id>", methods=["DELETE"])
@@ -1108,4 +1669,4 @@ def rename_chat_session(chat_id):
 
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=config.PORT, debug=True)
+    app.run(host="0.0.0.0", port=config.PORT, debug=config.DEBUG)
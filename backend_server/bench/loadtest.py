@@ -0,0 +1,495 @@
+"""
+Load Test
+End-to-end benchmark of backend.py against local stand-ins.
+
+Starts, in order:
+  - a fake OpenAI-compatible SSE server (bench/fake_llm.py) with a fixed
+    time to first token and token rate
+  - an ephemeral mongod on a temp dbpath (or --mongo-uri, which must be a
+    throwaway server: the backend writes to its "qwenify" database)
+  - backend.py with DB_PATH in a temp dir and the fake edge_tts from
+    bench/stubs on its PYTHONPATH
+
+then drives a mix of chat, writing autosave (PATCH ops on the last
+revision, like the editor), project listing and TTS at each concurrency
+level and writes throughput, p50/p95/p99 latency and
+chat time to first token as JSON. With --baseline, a previous result file
+is compared against and the exit status is 1 if any scenario regressed by
+more than --max-regression.
+
+The first chat embeds a query with Chroma's default model, which is
+downloaded to ~/.cache/chroma once if it is not cached yet; a warm-up
+request runs before measuring.
+
+    cd backend_server
+    python bench/loadtest.py --levels 1,4,16 --duration 20 --output bench.json
+    python bench/loadtest.py --baseline bench.json
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import uuid
+import random
+import shutil
+import socket
+import argparse
+import tempfile
+import threading
+import subprocess
+
+import requests
+
+import fake_llm
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+
+DEFAULT_MIX = {"chat": 3, "autosave": 4, "projects": 2, "tts": 1}
+CHAT_QUESTIONS = [
+    "What is the latest news?",
+    "How do I cook pasta?",
+    "Give me three ideas for a video about city cycling.",
+    "Explain list comprehensions in Python.",
+]
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for(check, timeout: float, what: str) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if check():
+                return
+        except Exception:
+            pass
+        time.sleep(0.25)
+    raise RuntimeError(f"Timed out waiting for {what}")
+
+
+def percentile(values: list, pct: float):
+    """Nearest-rank percentile; None for no values"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+# --- STAND-INS ---
+
+
+class Stack:
+    """Fake LLM, ephemeral MongoDB and the backend, torn down on exit"""
+
+    def __init__(self, args):
+        self.args = args
+        self.workdir = tempfile.mkdtemp(prefix="qwenify-bench-")
+        self.processes = []
+        self.llm_server = None
+        self.log = None
+        self.base_url = None
+
+    def __enter__(self):
+        try:
+            self._start()
+        except BaseException:
+            self.__exit__(None, None, None)
+            raise
+        return self
+
+    def _start(self):
+        args = self.args
+
+        self.llm_server = fake_llm.serve(
+            free_port(), args.llm_latency, args.llm_tokens, args.llm_tokens_per_second
+        )
+        threading.Thread(target=self.llm_server.serve_forever, daemon=True).start()
+        llm_url = f"http://127.0.0.1:{self.llm_server.server_port}/v1"
+
+        mongo_uri = args.mongo_uri or self._start_mongod()
+
+        port = free_port()
+        env = dict(os.environ)
+        env.update(
+            {
+                "PORT": str(port),
+                "DEBUG": "false",
+                "NVIDIA_BASE_URL": llm_url,
+                "NVIDIA_API_KEY": "bench",
+                "MODEL_NAME": "fake-model",
+                "MONGODB_URI": mongo_uri,
+                "DB_PATH": os.path.join(self.workdir, "chroma"),
+                "JWT_SECRET_KEY": uuid.uuid4().hex,
+                "BCRYPT_ROUNDS": "4",
+                "FAKE_TTS_LATENCY": str(args.tts_latency),
+                # Every worker is the same user; measure capacity, not per-user limits
+                "ADMISSION_USER_RATE_PER_MIN": "1000000",
+                "ADMISSION_USER_BURST": "1000000",
+                "ADMISSION_USER_CONCURRENCY": "1000000",
+                "PYTHONPATH": os.pathsep.join(
+                    [os.path.join(BENCH_DIR, "stubs"), env.get("PYTHONPATH", "")]
+                ),
+            }
+        )
+        self.log = open(os.path.join(self.workdir, "backend.log"), "wb")
+        backend = subprocess.Popen(
+            [sys.executable, "backend.py"],
+            cwd=BACKEND_DIR,
+            env=env,
+            stdout=self.log,
+            stderr=subprocess.STDOUT,
+        )
+        self.processes.append(backend)
+        self.base_url = f"http://127.0.0.1:{port}"
+
+        def backend_up():
+            if backend.poll() is not None:
+                raise SystemExit(f"backend.py exited; see {self.log.name} (--keep-workdir)")
+            return requests.get(f"{self.base_url}/readyz", timeout=2).status_code == 200
+
+        wait_for(backend_up, args.startup_timeout, "backend.py")
+
+    def _start_mongod(self) -> str:
+        mongod = shutil.which("mongod")
+        if not mongod:
+            raise SystemExit("mongod not found: install MongoDB or pass --mongo-uri")
+        port = free_port()
+        dbpath = os.path.join(self.workdir, "mongo")
+        os.makedirs(dbpath)
+        self.processes.append(
+            subprocess.Popen(
+                [mongod, "--dbpath", dbpath, "--port", str(port), "--bind_ip", "127.0.0.1", "--quiet"],
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+            )
+        )
+
+        def mongod_up():
+            with socket.create_connection(("127.0.0.1", port), timeout=1):
+                return True
+
+        wait_for(mongod_up, 30, "mongod")
+        return f"mongodb://127.0.0.1:{port}"
+
+    def __exit__(self, *exc):
+        for process in reversed(self.processes):
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        if self.llm_server:
+            self.llm_server.shutdown()
+        if self.log:
+            self.log.close()
+        if self.args.keep_workdir:
+            print(f"Kept work dir {self.workdir}")
+        else:
+            shutil.rmtree(self.workdir, ignore_errors=True)
+
+
+# --- SCENARIOS ---
+# Each takes (session, base_url, context) and returns ttft (or None);
+# raising marks the request as failed.
+
+
+def scenario_chat(session, base_url, context):
+    started = time.perf_counter()
+    ttft = None
+    with session.post(
+        f"{base_url}/chat",
+        json={"message": random.choice(CHAT_QUESTIONS), "history": []},
+        headers=context["headers"],
+        stream=True,
+        timeout=120,
+    ) as response:
+        response.raise_for_status()
+        for line in response.iter_lines(decode_unicode=True):
+            if not line or not line.startswith("data: "):
+                continue
+            payload = line[len("data: "):]
+            if payload == "[DONE]":
+                break
+            event = json.loads(payload)
+            if event.get("type") == "error":
+                raise RuntimeError(event.get("content"))
+            if ttft is None and event.get("type") in ("thought", "answer"):
+                ttft = time.perf_counter() - started
+    if ttft is None:
+        raise RuntimeError("Chat stream had no tokens")
+    return ttft
+
+
+def _editor(session, base_url, context):
+    """
+    This worker's open document, like one WritingArea: its own project
+    (so workers do not conflict with each other), current text and revision
+    """
+    editor = context["editors"]
+    if not hasattr(editor, "url"):
+        response = session.post(
+            f"{base_url}/projects", json={"name": "Benchmark"}, headers=context["headers"], timeout=30
+        )
+        response.raise_for_status()
+        editor.url = f"{base_url}/projects/{response.json()['_id']}/workspace/writing"
+        response = session.put(
+            editor.url, json={"writing": context["document"]}, headers=context["headers"], timeout=30
+        )
+        response.raise_for_status()
+        editor.text, editor.revision = context["document"], response.json()["revision"]
+    return editor
+
+
+def scenario_autosave(session, base_url, context):
+    """A small in-place edit sent as PATCH ops, with WritingArea's fallback"""
+    editor = _editor(session, base_url, context)
+    insert = uuid.uuid4().hex[:8]
+    position = random.randrange(len(editor.text) - len(insert))
+    # The document is ASCII, so string indices are UTF-16 offsets
+    text = editor.text[:position] + insert + editor.text[position + len(insert):]
+    response = session.patch(
+        editor.url,
+        json={
+            "baseRevision": editor.revision,
+            "ops": [[position, len(insert), insert]],
+            "length": len(text),
+        },
+        headers=context["headers"],
+        timeout=30,
+    )
+    if response.status_code in (409, 422):
+        response = session.put(
+            editor.url, json={"writing": text}, headers=context["headers"], timeout=30
+        )
+    response.raise_for_status()
+    editor.text, editor.revision = text, response.json()["revision"]
+
+
+def scenario_projects(session, base_url, context):
+    response = session.get(f"{base_url}/projects", headers=context["headers"], timeout=30)
+    response.raise_for_status()
+
+
+def scenario_tts(session, base_url, context):
+    response = session.post(
+        f"{base_url}/tts",
+        json={"text": "Here is a short summary of today."},
+        headers=context["headers"],
+        timeout=60,
+    )
+    response.raise_for_status()
+    if not response.content:
+        raise RuntimeError("Empty audio")
+
+
+SCENARIOS = {
+    "chat": scenario_chat,
+    "autosave": scenario_autosave,
+    "projects": scenario_projects,
+    "tts": scenario_tts,
+}
+
+
+def setup_context(base_url: str) -> dict:
+    """Register a throwaway user; autosave workers open their own projects"""
+    email = f"bench-{uuid.uuid4().hex[:12]}@example.com"
+    response = requests.post(
+        f"{base_url}/auth/register",
+        json={"email": email, "password": "benchmark", "confirmPassword": "benchmark"},
+        timeout=30,
+    )
+    response.raise_for_status()
+    headers = {"Authorization": f"Bearer {response.json()['token']}"}
+    paragraph = "This paragraph stands in for a draft script being autosaved. " * 8
+    return {
+        "headers": headers,
+        "document": "\n\n".join([paragraph] * 10),
+        "editors": threading.local(),
+    }
+
+
+# --- DRIVER ---
+
+
+def run_level(base_url: str, context: dict, mix: dict, concurrency: int, duration: float) -> dict:
+    """Closed loop: `concurrency` workers issue requests back to back"""
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    samples = {name: [] for name in names}
+    lock = threading.Lock()
+    clock = {}
+
+    def start_clock():
+        clock["started"] = time.monotonic()
+        clock["stop_at"] = clock["started"] + duration
+
+    # Runs start_clock once every worker is set up, before any is released
+    ready = threading.Barrier(concurrency + 1, action=start_clock)
+
+    def worker():
+        session = requests.Session()
+        try:
+            if "autosave" in mix:
+                # Open the document before the clock starts, as an editor would
+                _editor(session, base_url, context)
+        finally:
+            ready.wait()
+        while time.monotonic() < clock["stop_at"]:
+            name = random.choices(names, weights)[0]
+            started = time.perf_counter()
+            ok, ttft = True, None
+            try:
+                ttft = SCENARIOS[name](session, base_url, context)
+            except Exception:
+                ok = False
+            elapsed = time.perf_counter() - started
+            with lock:
+                samples[name].append((elapsed, ttft, ok))
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    ready.wait()
+    for thread in threads:
+        thread.join()
+    wall = time.monotonic() - clock["started"]
+
+    scenarios = {}
+    for name, results in samples.items():
+        latencies = [elapsed for elapsed, _, ok in results if ok]
+        ttfts = [ttft for _, ttft, ok in results if ok and ttft is not None]
+        summary = {
+            "requests": len(results),
+            "errors": sum(1 for _, _, ok in results if not ok),
+            "throughput": len(latencies) / wall,
+            "latency": {f"p{p}": percentile(latencies, p) for p in (50, 95, 99)},
+        }
+        if ttfts:
+            summary["ttft"] = {f"p{p}": percentile(ttfts, p) for p in (50, 95, 99)}
+        scenarios[name] = summary
+
+    return {
+        "concurrency": concurrency,
+        "duration": wall,
+        "throughput": sum(s["throughput"] for s in scenarios.values()),
+        "errors": sum(s["errors"] for s in scenarios.values()),
+        "scenarios": scenarios,
+    }
+
+
+def find_regressions(baseline: dict, current: dict, tolerance: float) -> list:
+    """Slower p95 latency/TTFT or lower throughput than baseline beyond tolerance"""
+    problems = []
+    previous = {level["concurrency"]: level for level in baseline.get("levels", [])}
+    for level in current["levels"]:
+        base_level = previous.get(level["concurrency"])
+        if not base_level:
+            continue
+        for name, now in level["scenarios"].items():
+            before = base_level["scenarios"].get(name)
+            if not before:
+                continue
+            where = f"c={level['concurrency']} {name}"
+            for metric in ("latency", "ttft"):
+                old = before.get(metric, {}).get("p95")
+                new = now.get(metric, {}).get("p95")
+                if old and new and new > old * (1 + tolerance):
+                    problems.append(f"{where}: {metric} p95 {old:.3f}s -> {new:.3f}s")
+            if before["throughput"] and now["throughput"] < before["throughput"] * (1 - tolerance):
+                problems.append(
+                    f"{where}: throughput {before['throughput']:.2f}/s -> {now['throughput']:.2f}/s"
+                )
+            if now["errors"] > before["errors"]:
+                problems.append(f"{where}: errors {before['errors']} -> {now['errors']}")
+    return problems
+
+
+def parse_mix(value: str) -> dict:
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        if name not in SCENARIOS:
+            raise argparse.ArgumentTypeError(f"Unknown scenario: {name}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end load test with local stand-ins")
+    parser.add_argument("--levels", default="1,4,16", help="comma-separated concurrency levels")
+    parser.add_argument("--duration", type=float, default=20, help="seconds per level")
+    parser.add_argument(
+        "--mix",
+        type=parse_mix,
+        default=DEFAULT_MIX,
+        help="weights, e.g. chat=3,autosave=4,projects=2,tts=1",
+    )
+    parser.add_argument("--output", help="write results JSON here (default: stdout)")
+    parser.add_argument("--baseline", help="results JSON to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.2)
+    parser.add_argument("--mongo-uri", help="throwaway MongoDB instead of starting mongod")
+    parser.add_argument("--llm-latency", type=float, default=0.3)
+    parser.add_argument("--llm-tokens", type=int, default=64)
+    parser.add_argument("--llm-tokens-per-second", type=float, default=40.0)
+    parser.add_argument("--tts-latency", type=float, default=0.2)
+    parser.add_argument("--startup-timeout", type=float, default=120)
+    parser.add_argument("--keep-workdir", action="store_true")
+    args = parser.parse_args()
+
+    levels = [int(level) for level in args.levels.split(",")]
+    with Stack(args) as stack:
+        context = setup_context(stack.base_url)
+        # Warm-up: loads Chroma's embedding model and opens pools
+        for name in args.mix:
+            SCENARIOS[name](requests.Session(), stack.base_url, context)
+
+        results = {
+            "startedAt": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "config": {
+                "durationPerLevel": args.duration,
+                "mix": args.mix,
+                "llm": {
+                    "latency": args.llm_latency,
+                    "tokens": args.llm_tokens,
+                    "tokensPerSecond": args.llm_tokens_per_second,
+                },
+                "ttsLatency": args.tts_latency,
+            },
+            "levels": [],
+        }
+        for concurrency in levels:
+            print(f"Running concurrency {concurrency} for {args.duration}s...", file=sys.stderr)
+            level = run_level(stack.base_url, context, args.mix, concurrency, args.duration)
+            results["levels"].append(level)
+            print(
+                f"  {level['throughput']:.1f} req/s, {level['errors']} errors",
+                file=sys.stderr,
+            )
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        problems = find_regressions(baseline, results, args.max_regression)
+        for problem in problems:
+            print(f"REGRESSION {problem}", file=sys.stderr)
+        if problems:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,349 @@
+"""
+RAG Benchmark
+Retrieval latency, quality and footprint of the Chroma store as it grows.
+
+Builds a corpus in a temporary DB_PATH (the real store is never touched),
+in the document formats of news_ingest.py and pdf_ingest.py, and at each
+size checkpoint measures:
+  - ingest throughput (documents/second, batched upserts)
+  - query latency p50/p99 for single-text queries, as /chat issues them
+  - recall@k against labeled queries
+  - process RSS (current and peak) and on-disk size of DB_PATH
+
+The corpus is synthetic by default: each document describes a unique,
+made-up organisation, and every labeled query paraphrases one document,
+which is the expected hit. A seeded corpus can be given instead as JSONL
+(--corpus: {"id", "title", "text", "source"?, "date"?} per line, stored
+in the NewsAPI format) with labeled queries (--labels: {"query", "ids"}).
+
+--embedding hash swaps Chroma's default ONNX model for a cheap hashed
+bag-of-words embedding, to measure index scaling to very large sizes
+without the embedding cost (recall is then only indicative).
+
+    cd backend_server
+    python bench/rag_bench.py --sizes 1000,10000,100000 --output rag.json
+"""
+
+import os
+import re
+import sys
+import json
+import math
+import time
+import zlib
+import random
+import shutil
+import argparse
+import resource
+import tempfile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+TOPICS = [
+    "flood relief",
+    "metro rail",
+    "crop insurance",
+    "school meals",
+    "solar power",
+    "startup grants",
+    "heritage restoration",
+    "water supply",
+    "cricket academy",
+    "film festival",
+    "hospital beds",
+    "river cleanup",
+]
+PLACES = [
+    "Kolkata",
+    "Howrah",
+    "Siliguri",
+    "Durgapur",
+    "Asansol",
+    "Darjeeling",
+    "Delhi",
+    "Mumbai",
+    "Chennai",
+    "Bengaluru",
+    "Pune",
+    "Guwahati",
+]
+SYLLABLES = ["ka", "ri", "to", "mu", "sen", "va", "lo", "dra", "pi", "ne", "sha", "gor", "tu", "bel", "xi", "ram"]
+FILLER = (
+    "Officials said the work would be reviewed next quarter. Residents raised "
+    "questions at a public meeting, and a detailed report is expected soon."
+)
+
+
+def organisation(index: int) -> str:
+    """Unique made-up name per index"""
+    parts = []
+    index += len(SYLLABLES)  # at least two syllables
+    while index:
+        index, digit = divmod(index, len(SYLLABLES))
+        parts.append(SYLLABLES[digit])
+    return "".join(parts).capitalize() + " Trust"
+
+
+def synthetic_corpus(count: int, seed: int):
+    """Yields (id, document, metadata, query) in the ingest formats"""
+    from news_ingest import rss_document, newsapi_document
+    from pdf_ingest import pdf_document
+
+    rng = random.Random(seed)
+    for i in range(count):
+        org = organisation(i)
+        topic = rng.choice(TOPICS)
+        place = rng.choice(PLACES)
+        amount = rng.randint(2, 900)
+        date = f"2026-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+        title = f"{org} announces {amount} crore {topic} programme in {place}"
+        summary = f"The {org} will fund {topic} work across {place}. {FILLER}"
+        query = f"What is the {org} doing about {topic} in {place}?"
+
+        kind = i % 5
+        if kind < 2:
+            doc_id = f"news_bench_{i}"
+            document = rss_document(title, summary, date)
+            metadata = {"type": "news", "title": title, "date": date}
+        elif kind < 4:
+            doc_id = f"newsapi_bench_{i}"
+            article = {"source": "National News (India)", "title": title, "description": summary, "content": FILLER}
+            document = newsapi_document(article, date)
+            metadata = {"type": "news", "title": title, "date": date}
+        else:
+            rel_path = f"bench/report_{i // 20}.pdf"
+            doc_id = f"pdf_{rel_path}_p{i % 20}"
+            document = pdf_document(rel_path, i % 20 + 1, f"{title}. {summary}", date)
+            metadata = {"type": "pdf", "source": rel_path, "page": i % 20 + 1, "date": date}
+        yield doc_id, document, metadata, query
+
+
+def seeded_corpus(path: str):
+    from news_ingest import newsapi_document
+
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            date = record.get("date", "")
+            article = {
+                "source": record.get("source", "Seeded corpus"),
+                "title": record["title"],
+                "description": record.get("summary", ""),
+                "content": record["text"],
+            }
+            metadata = {"type": "news", "title": record["title"], "date": date}
+            yield record["id"], newsapi_document(article, date), metadata, None
+
+
+class HashEmbedding:
+    """Signed hashed bag of words, L2-normalized"""
+
+    def __init__(self, dimensions: int = 384):
+        self.dimensions = dimensions
+
+    def __call__(self, input):
+        embeddings = []
+        for text in input:
+            vector = [0.0] * self.dimensions
+            for word in re.findall(r"\w+", text.lower()):
+                h = zlib.crc32(word.encode("utf-8"))
+                vector[h % self.dimensions] += 1.0 if h & 0x80000000 else -1.0
+            norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+            embeddings.append([v / norm for v in vector])
+        return embeddings
+
+    @staticmethod
+    def name():
+        return "bench-hash"
+
+
+def percentile(values: list, pct: float):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(1, math.ceil(pct / 100 * len(ordered))) - 1]
+
+
+def rss_bytes():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+
+def peak_rss_bytes() -> int:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def dir_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def open_collection(embedding: str):
+    import database
+
+    if embedding == "default":
+        return database.get_local_collection()
+    # Same store and name, only the embedding differs
+    return database.get_client().get_or_create_collection(
+        name="news_storage", embedding_function=HashEmbedding()
+    )
+
+
+def ingest(collection, batch: list) -> None:
+    ids, documents, metadatas = zip(*batch)
+    collection.upsert(ids=list(ids), documents=list(documents), metadatas=list(metadatas))
+
+
+def measure_queries(collection, labeled: list, ks: list) -> dict:
+    latencies, hits = [], {k: 0 for k in ks}
+    for query, expected in labeled:
+        started = time.perf_counter()
+        results = collection.query(query_texts=[query], n_results=max(ks))
+        latencies.append(time.perf_counter() - started)
+        found = results["ids"][0]
+        for k in ks:
+            if expected & set(found[:k]):
+                hits[k] += 1
+    return {
+        "queries": len(labeled),
+        "latency": {"p50": percentile(latencies, 50), "p99": percentile(latencies, 99)},
+        "recall": {f"@{k}": hits[k] / len(labeled) if labeled else None for k in ks},
+    }
+
+
+def load_labels(path: str) -> list:
+    labeled = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                labeled.append((record["query"], set(record["ids"])))
+    return labeled
+
+
+def run(args, collection) -> dict:
+    sizes = sorted(int(size) for size in args.sizes.split(","))
+    ks = sorted(int(k) for k in args.k.split(","))
+    rng = random.Random(args.seed)
+
+    if args.corpus:
+        corpus = seeded_corpus(args.corpus)
+        fixed_labels = load_labels(args.labels) if args.labels else []
+    else:
+        corpus = synthetic_corpus(sizes[-1], args.seed)
+        fixed_labels = None
+
+    # Reservoir of labeled queries over everything ingested so far
+    reservoir, seen = [], 0
+    checkpoints = []
+    total, ingest_seconds = 0, 0.0
+    batch = []
+
+    def flush():
+        nonlocal ingest_seconds
+        started = time.perf_counter()
+        ingest(collection, batch)
+        ingest_seconds += time.perf_counter() - started
+        batch.clear()
+
+    for target in sizes:
+        start_count, start_seconds = total, ingest_seconds
+        for doc_id, document, metadata, query in corpus:
+            batch.append((doc_id, document, metadata))
+            total += 1
+            if query is not None:
+                seen += 1
+                if len(reservoir) < args.queries:
+                    reservoir.append((query, {doc_id}))
+                elif rng.random() < args.queries / seen:
+                    reservoir[rng.randrange(args.queries)] = (query, {doc_id})
+            if len(batch) >= args.batch_size:
+                flush()
+            if total >= target:
+                break
+        if batch:
+            flush()
+        if total == start_count:
+            break  # seeded corpus exhausted
+
+        added_seconds = ingest_seconds - start_seconds
+        checkpoint = {
+            "documents": collection.count(),
+            "ingest": {
+                "documents": total - start_count,
+                "seconds": added_seconds,
+                "throughput": (total - start_count) / added_seconds if added_seconds else None,
+            },
+            **measure_queries(collection, fixed_labels if fixed_labels is not None else reservoir, ks),
+            "memory": {"rssBytes": rss_bytes(), "peakRssBytes": peak_rss_bytes()},
+            "diskBytes": dir_size(os.environ["DB_PATH"]),
+        }
+        checkpoints.append(checkpoint)
+        print(
+            f"{checkpoint['documents']} docs: "
+            f"{checkpoint['ingest']['throughput'] or 0:.0f} docs/s ingest, "
+            f"p50 {checkpoint['latency']['p50'] or 0:.4f}s, "
+            f"recall {checkpoint['recall']}",
+            file=sys.stderr,
+        )
+
+    return {
+        "startedAt": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "config": {
+            "embedding": args.embedding,
+            "batchSize": args.batch_size,
+            "corpus": args.corpus or "synthetic",
+            "seed": args.seed,
+        },
+        "checkpoints": checkpoints,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="RAG store scale benchmark")
+    parser.add_argument("--sizes", default="1000,10000", help="comma-separated corpus sizes")
+    parser.add_argument("--queries", type=int, default=200, help="labeled queries per checkpoint")
+    parser.add_argument("--k", default="1,3,10", help="recall cut-offs (/chat uses 3)")
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--embedding", choices=["default", "hash"], default="default")
+    parser.add_argument("--corpus", help="seeded corpus JSONL instead of synthetic documents")
+    parser.add_argument("--labels", help="labeled queries JSONL for --corpus")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--db-path", help="build here instead of a temp dir (must not exist)")
+    parser.add_argument("--output", help="write results JSON here (default: stdout)")
+    args = parser.parse_args()
+
+    if args.db_path and os.path.exists(args.db_path):
+        parser.error("--db-path must not exist; it is built from scratch")
+    db_path = args.db_path or tempfile.mkdtemp(prefix="qwenify-rag-bench-")
+    # Must be set before config/database are imported
+    os.environ["DB_PATH"] = db_path
+    try:
+        results = run(args, open_collection(args.embedding))
+    finally:
+        if not args.db_path:
+            shutil.rmtree(db_path, ignore_errors=True)
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
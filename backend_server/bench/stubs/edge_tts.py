@@ -0,0 +1,26 @@
+"""
+Fake edge_tts for benchmarks.
+
+The load test puts bench/stubs first on the backend's PYTHONPATH so that
+tts.py synthesizes silence after FAKE_TTS_LATENCY seconds instead of
+calling Microsoft's service.
+"""
+
+import os
+import asyncio
+
+LATENCY = float(os.getenv("FAKE_TTS_LATENCY", 0.2))
+# Roughly one second of 32 kbit/s MP3 per 10 characters of text
+BYTES_PER_CHAR = 400
+
+
+class Communicate:
+    def __init__(self, text, voice, **kwargs):
+        self.text = text
+        self.voice = voice
+
+    async def stream(self):
+        await asyncio.sleep(LATENCY)
+        size = max(1, len(self.text)) * BYTES_PER_CHAR
+        for start in range(0, size, 4096):
+            yield {"type": "audio", "data": b"\x00" * min(4096, size - start)}
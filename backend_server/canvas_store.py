@@ -0,0 +1,289 @@
+"""
+Canvas Store Module
+Delta-based persistence for Excalidraw scenes.
+
+Each project has one `project_canvas` document holding:
+  - revision:          bumped on every accepted save (optimistic concurrency)
+  - snapshot:          compressed JSON map of {elementId: element}
+  - snapshotRevision:  revision the snapshot was taken at
+  - deltas:            [{revision, elements}] applied on top of the snapshot
+  - appState:          the small subset of Excalidraw app state we persist
+
+Deltas are folded into a fresh snapshot every CANVAS_COMPACT_EVERY saves.
+"""
+
+import gzip
+import json
+
+from bson import Binary
+from pymongo import ReturnDocument
+
+import config
+from mongodb import canvas_collection
+
+try:
+    import zstandard
+except ImportError:  # Optional, gzip is used when not installed
+    zstandard = None
+
+
+class RevisionConflict(Exception):
+    """Raised when a save is based on a stale canvas revision"""
+
+    def __init__(self, revision: int):
+        super().__init__(f"Canvas is at revision {revision}")
+        self.revision = revision
+
+
+class InvalidScene(Exception):
+    """Raised when a full-scene save is not an Excalidraw scene"""
+
+
+# --- SNAPSHOT ENCODING ---
+
+
+def _compress(elements: dict):
+    raw = json.dumps(elements, separators=(",", ":")).encode("utf-8")
+    if zstandard:
+        return Binary(zstandard.ZstdCompressor(level=6).compress(raw)), "zstd"
+    return Binary(gzip.compress(raw, compresslevel=6)), "gzip"
+
+
+def _decompress(blob: bytes, codec: str) -> dict:
+    if codec == "zstd":
+        if not zstandard:
+            raise RuntimeError("zstandard is required to read this canvas snapshot")
+        raw = zstandard.ZstdDecompressor().decompress(blob)
+    else:
+        raw = gzip.decompress(blob)
+    return json.loads(raw)
+
+
+# --- SCENE ASSEMBLY ---
+
+
+def _valid_element(element) -> bool:
+    """An element dict with a non-empty string id and a numeric version"""
+    if not isinstance(element, dict):
+        return False
+    element_id, version = element.get("id"), element.get("version", 0)
+    return (
+        isinstance(element_id, str)
+        and bool(element_id)
+        and isinstance(version, (int, float))
+        and not isinstance(version, bool)
+    )
+
+
+def validate_elements(elements) -> None:
+    """Raises InvalidScene unless `elements` is a list of valid elements"""
+    if not isinstance(elements, list):
+        raise InvalidScene("elements must be a list")
+    for element in elements:
+        if not _valid_element(element):
+            raise InvalidScene("Each element needs a string id and a numeric version")
+
+
+def _merge_elements(state: dict, elements: list) -> None:
+    """Apply changed elements, keeping whichever copy has the higher version"""
+    if not isinstance(elements, list):
+        return
+    for element in elements:
+        # Skip entries stored before deltas were validated
+        if not _valid_element(element):
+            continue
+        current = state.get(element["id"])
+        if current is None or element.get("version", 0) >= current.get("version", 0):
+            state[element["id"]] = element
+
+
+def _base_state(doc: dict):
+    """
+    Element map and app state at the doc's snapshot, including documents
+    still holding a legacy full-scene `canvas` string.
+    """
+    if doc.get("snapshot") is not None:
+        return _decompress(doc["snapshot"], doc.get("snapshotCodec", "gzip")), {}
+
+    legacy = doc.get("canvas")
+    if not legacy:
+        return {}, {}
+    try:
+        scene = json.loads(legacy) if isinstance(legacy, str) else legacy
+    except ValueError:
+        # Pre-Excalidraw canvases were base64 images; the editor starts fresh
+        return {}, {}
+    if not isinstance(scene, dict):
+        return {}, {}
+    state = {}
+    _merge_elements(state, scene.get("elements", []))
+    return state, scene.get("appState", {})
+
+
+def _materialize(doc: dict):
+    state, app_state = _base_state(doc)
+    for delta in doc.get("deltas", []):
+        _merge_elements(state, delta.get("elements", []))
+    return state, doc.get("appState") or app_state
+
+
+def _revision_filter(project_id: str, revision: int) -> dict:
+    if revision == 0:
+        # Documents written before revisions existed count as revision 0
+        return {
+            "projectId": project_id,
+            "$or": [{"revision": 0}, {"revision": {"$exists": False}}],
+        }
+    return {"projectId": project_id, "revision": revision}
+
+
+def current_revision(project_id: str) -> int:
+    doc = canvas_collection.find_one({"projectId": project_id}, {"revision": 1})
+    return doc.get("revision", 0) if doc else 0
+
+
+# --- PUBLIC API ---
+
+
+def get_canvas(project_id: str):
+    """Returns: (scene JSON string, or "" when empty, and its revision)"""
+    doc = canvas_collection.find_one({"projectId": project_id})
+    if not doc:
+        return "", 0
+
+    revision = doc.get("revision", 0)
+    state, app_state = _materialize(doc)
+    elements = [e for e in state.values() if not e.get("isDeleted")]
+    if not elements and not app_state:
+        return "", revision
+    return json.dumps({"elements": elements, "appState": app_state}), revision
+
+
+def apply_delta(project_id: str, base_revision: int, elements: list, app_state=None) -> int:
+    """
+    Append changed elements on top of `base_revision`.
+    Returns the new revision, or raises RevisionConflict / InvalidScene.
+    """
+    validate_elements(elements)
+    new_revision = base_revision + 1
+    update = {
+        "$set": {"revision": new_revision},
+        "$push": {"deltas": {"revision": new_revision, "elements": elements}},
+    }
+    if app_state is not None:
+        update["$set"]["appState"] = app_state
+
+    result = canvas_collection.update_one(
+        _revision_filter(project_id, base_revision), update, upsert=False
+    )
+    if result.matched_count == 0:
+        if base_revision == 0 and not canvas_collection.find_one(
+            {"projectId": project_id}, {"_id": 1}
+        ):
+            # First save for this project
+            if _create(project_id, elements, app_state):
+                return 1
+        raise RevisionConflict(current_revision(project_id))
+
+    if new_revision % config.CANVAS_COMPACT_EVERY == 0:
+        compact(project_id)
+    return new_revision
+
+
+def save_scene(project_id: str, scene) -> int:
+    """Replace the whole scene (full-save fallback). Returns the new revision."""
+    if isinstance(scene, str) and scene:
+        try:
+            parsed = json.loads(scene)
+        except ValueError:
+            # e.g. a pre-Excalidraw base64 image
+            raise InvalidScene("Canvas is not a JSON scene")
+    else:
+        parsed = scene or {}
+    if not isinstance(parsed, dict):
+        raise InvalidScene("Canvas must be a scene object")
+    validate_elements(parsed.get("elements", []))
+    state = {}
+    _merge_elements(state, parsed.get("elements", []))
+    snapshot, codec = _compress(state)
+
+    doc = canvas_collection.find_one_and_update(
+        {"projectId": project_id},
+        [
+            {
+                "$set": {
+                    "revision": {"$add": [{"$ifNull": ["$revision", 0]}, 1]},
+                    "snapshot": {"$literal": snapshot},
+                    "snapshotCodec": codec,
+                    "appState": {"$literal": parsed.get("appState", {})},
+                    "deltas": {"$literal": []},
+                }
+            },
+            {"$set": {"snapshotRevision": "$revision"}},
+            {"$unset": "canvas"},
+        ],
+        projection={"revision": 1},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    return doc["revision"]
+
+
+def _create(project_id: str, elements: list, app_state) -> bool:
+    state = {}
+    _merge_elements(state, elements)
+    snapshot, codec = _compress(state)
+    result = canvas_collection.update_one(
+        {"projectId": project_id},
+        {
+            "$setOnInsert": {
+                "revision": 1,
+                "snapshotRevision": 1,
+                "snapshot": snapshot,
+                "snapshotCodec": codec,
+                "appState": app_state or {},
+                "deltas": [],
+            }
+        },
+        upsert=True,
+    )
+    # False when a concurrent first save won the race
+    return result.upserted_id is not None
+
+
+def compact(project_id: str) -> bool:
+    """
+    Fold pending deltas into a new compressed snapshot. Skips quietly if
+    another save lands in the meantime; the next compaction picks it up.
+    """
+    doc = canvas_collection.find_one({"projectId": project_id})
+    if not doc or (not doc.get("deltas") and doc.get("snapshot") is not None):
+        return False
+
+    state, app_state = _materialize(doc)
+    # Deleted elements only need to survive as tombstones for version checks
+    for element_id, element in state.items():
+        if element.get("isDeleted"):
+            state[element_id] = {
+                "id": element_id,
+                "version": element.get("version", 0),
+                "isDeleted": True,
+            }
+    snapshot, codec = _compress(state)
+
+    revision = doc.get("revision", 0)
+    result = canvas_collection.update_one(
+        _revision_filter(project_id, revision),
+        {
+            "$set": {
+                "revision": revision,
+                "snapshot": snapshot,
+                "snapshotCodec": codec,
+                "snapshotRevision": revision,
+                "appState": app_state,
+                "deltas": [],
+            },
+            "$unset": {"canvas": ""},
+        },
+    )
+    return result.modified_count > 0
@@ -1,22 +1,39 @@
-import cloudinary
-import cloudinary.uploader
+import threading
 import config
+import metrics
+
+_uploader = None
+_uploader_lock = threading.Lock()
+
+
+def get_uploader():
+    """cloudinary.uploader, imported and configured on first use"""
+    global _uploader
+    if _uploader is None:
+        with _uploader_lock:
+            if _uploader is None:
+                import cloudinary
+                import cloudinary.uploader
+
+                # Configure Cloudinary
+                cloudinary.config(
+                    cloud_name=config.CLOUDINARY_CLOUD_NAME,
+                    api_key=config.CLOUDINARY_API_KEY,
+                    api_secret=config.CLOUDINARY_API_SECRET,
+                    secure=True
+                )
+                _uploader = cloudinary.uploader
+    return _uploader
 
-# Configure Cloudinary
-cloudinary.config(
-    cloud_name=config.CLOUDINARY_CLOUD_NAME,
-    api_key=config.CLOUDINARY_API_KEY,
-    api_secret=config.CLOUDINARY_API_SECRET,
-    secure=True
-)
 
 def upload_image(file, folder="qwenify/images"):
     """Upload image to Cloudinary (max 10MB)"""
-    result = cloudinary.uploader.upload(
-        file,
-        folder=folder,
-        resource_type="image"
-    )
+    with metrics.outbound("cloudinary", "upload"):
+        result = get_uploader().upload(
+            file,
+            folder=folder,
+            resource_type="image"
+        )
     return {
         "url": result["secure_url"],
         "public_id": result["public_id"]
@@ -24,11 +41,12 @@ def upload_image(file, folder="qwenify/images"):
 
 def upload_video(file, folder="qwenify/videos"):
     """Upload video to Cloudinary (max 100MB)"""
-    result = cloudinary.uploader.upload(
-        file,
-        folder=folder,
-        resource_type="video"
-    )
+    with metrics.outbound("cloudinary", "upload"):
+        result = get_uploader().upload(
+            file,
+            folder=folder,
+            resource_type="video"
+        )
     return {
         "url": result["secure_url"],
         "public_id": result["public_id"]
@@ -36,4 +54,23 @@ def upload_video(file, folder="qwenify/videos"):
 
 def delete_media(public_id, resource_type="image"):
     """Delete media from Cloudinary"""
-    return cloudinary.uploader.destroy(public_id, resource_type=resource_type)
+    with metrics.outbound("cloudinary", "destroy"):
+        return get_uploader().destroy(public_id, resource_type=resource_type)
+
+def upload_chunk(chunk, upload_id, start, total_size, filename, folder, resource_type):
+    """
+    Send one chunk of a large upload (Cloudinary chunked upload API).
+    Chunks of the same upload share `upload_id`; Cloudinary assembles them
+    and returns the final asset on the last one.
+    """
+    end = start + len(chunk) - 1
+    with metrics.outbound("cloudinary", "upload_chunk"):
+        return get_uploader().upload_large_part(
+            (filename, chunk),
+            folder=folder,
+            resource_type=resource_type,
+            http_headers={
+                "Content-Range": f"bytes {start}-{end}/{total_size}",
+                "X-Unique-Upload-Id": upload_id,
+            },
+        )
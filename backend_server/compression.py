@@ -0,0 +1,113 @@
+"""
+Compression Module
+Negotiated gzip / brotli compression for API responses.
+
+Regular responses are compressed after the view runs when they are large
+enough and of an allowed content type. Server-sent event streams are never
+buffered: each event is compressed and sync-flushed on its own (or passed
+through untouched when stream compression is disabled), so clients still
+see tokens as they are produced.
+"""
+
+import gzip
+import zlib
+
+from flask import request
+
+import config
+
+try:
+    import brotli
+except ImportError:  # Optional, gzip only when not installed
+    brotli = None
+
+EVENT_STREAM = "text/event-stream"
+
+
+def _choose_encoding(allow_brotli: bool = True):
+    """Best encoding the client accepts, or None"""
+    accepted = request.accept_encodings
+    if allow_brotli and brotli and accepted.quality("br") > 0:
+        return "br"
+    if accepted.quality("gzip") > 0:
+        return "gzip"
+    return None
+
+
+def _compress_body(data: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(data, quality=config.BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=config.COMPRESS_LEVEL)
+
+
+def _tag_etag(response, encoding: str) -> None:
+    """A strong ETag must differ per representation, so suffix the encoding"""
+    etag, weak = response.get_etag()
+    if etag:
+        response.set_etag(f"{etag}-{encoding}", weak=weak)
+
+
+def _gzip_stream(chunks):
+    """Compress an event stream chunk by chunk, flushing after each event"""
+    # wbits=31 selects the gzip container
+    compressor = zlib.compressobj(config.COMPRESS_LEVEL, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode("utf-8")
+        data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush(zlib.Z_FINISH)
+
+
+def _prepare_event_stream(response):
+    # Ask reverse proxies (nginx) not to buffer, and caches not to store
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"
+
+    if not config.COMPRESS_STREAMS:
+        return response
+
+    # Brotli has no convenient per-chunk flush in the python bindings
+    encoding = _choose_encoding(allow_brotli=False)
+    if encoding != "gzip":
+        return response
+
+    response.response = _gzip_stream(response.response)
+    response.headers["Content-Encoding"] = "gzip"
+    response.headers.pop("Content-Length", None)
+    response.vary.add("Accept-Encoding")
+    return response
+
+
+def compress_response(response):
+    """after_request hook"""
+    if response.status_code < 200 or response.status_code in (204, 304):
+        return response
+    if "Content-Encoding" in response.headers or response.direct_passthrough:
+        return response
+
+    if response.mimetype == EVENT_STREAM:
+        return _prepare_event_stream(response)
+
+    if response.is_streamed or response.mimetype not in config.COMPRESS_MIMETYPES:
+        return response
+
+    response.vary.add("Accept-Encoding")
+    data = response.get_data()
+    if len(data) < config.COMPRESS_MIN_SIZE:
+        return response
+
+    encoding = _choose_encoding()
+    if not encoding:
+        return response
+
+    response.set_data(_compress_body(data, encoding))
+    response.headers["Content-Encoding"] = encoding
+    _tag_etag(response, encoding)
+    return response
+
+
+def init_compression(app):
+    """Register response compression on a Flask app"""
+    app.after_request(compress_response)
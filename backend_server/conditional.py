@@ -0,0 +1,52 @@
+"""
+Conditional GET helpers: strong ETags derived from stored revision
+counters, so a matching If-None-Match is answered with 304 before any
+payload is loaded.
+"""
+
+import hashlib
+
+from flask import request, make_response
+
+# Encodings compression.py appends to ETags of compressed representations
+ENCODING_SUFFIXES = ("-gzip", "-br")
+
+
+def make_etag(*parts) -> str:
+    """Opaque ETag value for a resource version (component, id, revision, ...)"""
+    key = "|".join(str(p) for p in parts)
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:20]
+
+
+def _strip_encoding(tag: str) -> str:
+    for suffix in ENCODING_SUFFIXES:
+        if tag.endswith(suffix):
+            return tag[: -len(suffix)]
+    return tag
+
+
+def is_fresh(etag: str) -> bool:
+    """True when the client's If-None-Match already names this version"""
+    if_none_match = request.if_none_match
+    if not if_none_match:
+        return False
+    if if_none_match.star_tag:
+        return True
+    return any(
+        _strip_encoding(tag) == etag
+        for tag in if_none_match.as_set(include_weak=True)
+    )
+
+
+def not_modified(etag: str):
+    response = make_response("", 304)
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
+
+
+def with_etag(response, etag: str):
+    """Tag a full response; no-cache makes browsers revalidate every time"""
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
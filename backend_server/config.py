@@ -28,6 +28,8 @@ CLOUDINARY_API_SECRET = os.getenv("CLOUDINARY_API_SECRET")
 
 # Server
 PORT = int(os.getenv("PORT", 5000))
+# Flask debug mode (reloader + debugger); turn off for benchmarks/production
+DEBUG = os.getenv("DEBUG", "true").lower() == "true"
 
 # JWT
 JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY", "default-secret-change-me")
@@ -37,3 +39,203 @@ YOUTUBE_API_KEY = os.getenv("YOUTUBE_API_KEY")
 
 # Google OAuth
 GOOGLE_CLIENT_ID = os.getenv("GOOGLE_CLIENT_ID")
+
+# Password hashing
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 12))
+AUTH_HASH_WORKERS = int(os.getenv("AUTH_HASH_WORKERS", 2))
+AUTH_HASH_QUEUE = int(os.getenv("AUTH_HASH_QUEUE", 16))
+AUTH_HASH_TIMEOUT = float(os.getenv("AUTH_HASH_TIMEOUT", 10))
+
+# Auth rate limiting (token buckets, refill per minute)
+AUTH_IP_RATE_PER_MIN = float(os.getenv("AUTH_IP_RATE_PER_MIN", 20))
+AUTH_IP_BURST = float(os.getenv("AUTH_IP_BURST", 10))
+AUTH_EMAIL_RATE_PER_MIN = float(os.getenv("AUTH_EMAIL_RATE_PER_MIN", 5))
+AUTH_EMAIL_BURST = float(os.getenv("AUTH_EMAIL_BURST", 5))
+# Reverse proxies in front of the app that append to X-Forwarded-For.
+# 0 trusts no forwarding headers (the peer address is the client).
+TRUSTED_PROXY_COUNT = int(os.getenv("TRUSTED_PROXY_COUNT", 0))
+
+# Outbound HTTP
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", 3.05))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", 10))
+HTTP_POOL_CONNECTIONS = int(os.getenv("HTTP_POOL_CONNECTIONS", 10))
+HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", 20))
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", 1))
+
+# Google sign-in
+GOOGLE_TOKEN_CACHE_TTL = int(os.getenv("GOOGLE_TOKEN_CACHE_TTL", 3600))
+GOOGLE_JWKS_URL = os.getenv("GOOGLE_JWKS_URL", "https://www.googleapis.com/oauth2/v3/certs")
+GOOGLE_JWKS_CACHE_TTL = int(os.getenv("GOOGLE_JWKS_CACHE_TTL", 6 * 3600))
+GOOGLE_OFFLINE_ID_TOKEN = os.getenv("GOOGLE_OFFLINE_ID_TOKEN", "true").lower() == "true"
+
+# Canvas persistence
+CANVAS_COMPACT_EVERY = int(os.getenv("CANVAS_COMPACT_EVERY", 50))
+
+# Writing persistence
+WRITING_CHECKPOINT_EVERY = int(os.getenv("WRITING_CHECKPOINT_EVERY", 50))
+
+# Response compression
+COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", 1024))
+COMPRESS_LEVEL = int(os.getenv("COMPRESS_LEVEL", 6))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", 5))
+COMPRESS_STREAMS = os.getenv("COMPRESS_STREAMS", "true").lower() == "true"
+COMPRESS_MIMETYPES = {
+    "application/json",
+    "text/plain",
+    "text/html",
+    "text/css",
+    "application/javascript",
+    "image/svg+xml",
+}
+
+# Media uploads ("cloudinary", or "local" as a stand-in for tests/dev)
+MEDIA_UPLOAD_BACKEND = os.getenv("MEDIA_UPLOAD_BACKEND", "cloudinary")
+# Cloudinary needs every chunk but the last to be at least 5MB
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", 6 * 1024 * 1024))
+LOCAL_MEDIA_DIR = os.getenv("LOCAL_MEDIA_DIR", os.path.join(BASE_DIR, "local_media"))
+
+# Media analysis (Gemini Files API keeps uploads for 48 hours)
+GEMINI_FILE_CACHE_TTL = int(os.getenv("GEMINI_FILE_CACHE_TTL", 47 * 3600))
+GEMINI_FILE_CACHE_SIZE = int(os.getenv("GEMINI_FILE_CACHE_SIZE", 256))
+GEMINI_FILE_POLL_INTERVAL = float(os.getenv("GEMINI_FILE_POLL_INTERVAL", 2))
+GEMINI_FILE_PROCESS_TIMEOUT = int(os.getenv("GEMINI_FILE_PROCESS_TIMEOUT", 600))
+MEDIA_DOWNLOAD_CHUNK_SIZE = int(os.getenv("MEDIA_DOWNLOAD_CHUNK_SIZE", 1024 * 1024))
+
+# Background media analysis jobs
+ANALYSIS_WORKERS = int(os.getenv("ANALYSIS_WORKERS", 4))
+# Jobs allowed to wait for a worker (per process); beyond this, new jobs get 503
+ANALYSIS_QUEUE_MAX = int(os.getenv("ANALYSIS_QUEUE_MAX", 16))
+# A job still queued this long after it was created is given up as failed
+ANALYSIS_QUEUED_TIMEOUT = int(os.getenv("ANALYSIS_QUEUED_TIMEOUT", 3600))
+
+# Writing assistant: documents at least this long are edited via patches
+WRITING_PATCH_MIN_LENGTH = int(os.getenv("WRITING_PATCH_MIN_LENGTH", 2000))
+
+# LLM gateway (OpenAI-compatible NVIDIA endpoint)
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 32))
+# How long a request may wait for a free upstream slot before getting a 503
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", 5))
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", 5))
+LLM_POOL_MAX_CONNECTIONS = int(os.getenv("LLM_POOL_MAX_CONNECTIONS", 64))
+LLM_POOL_MAX_KEEPALIVE = int(os.getenv("LLM_POOL_MAX_KEEPALIVE", 32))
+LLM_KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", 60))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", 1))
+# Seconds before a duplicate request is raced against a slow non-streaming
+# call (0 disables hedging)
+LLM_HEDGE_AFTER = float(os.getenv("LLM_HEDGE_AFTER", 0))
+# Model tiers: an OpenAI-compatible endpoint and model each. Unset tiers
+# fall back to the main MODEL_NAME endpoint.
+LLM_TIERS = {
+    "large": {
+        "model": MODEL_NAME,
+        "base_url": NVIDIA_BASE_URL,
+        "api_key": NVIDIA_API_KEY,
+    },
+    "small": {
+        "model": os.getenv("SMALL_MODEL_NAME", MODEL_NAME),
+        "base_url": os.getenv("SMALL_MODEL_BASE_URL", NVIDIA_BASE_URL),
+        "api_key": os.getenv("SMALL_MODEL_API_KEY", NVIDIA_API_KEY),
+    },
+    "backup": {
+        "model": os.getenv("BACKUP_MODEL_NAME", MODEL_NAME),
+        "base_url": os.getenv("BACKUP_MODEL_BASE_URL", NVIDIA_BASE_URL),
+        "api_key": os.getenv("BACKUP_MODEL_API_KEY", NVIDIA_API_KEY),
+    },
+}
+# Per-route limits and model preference. "timeout" is the read timeout
+# (between tokens when streaming); "tiers" are tried in order, skipping
+# degraded ones.
+LLM_ROUTES = {
+    "chat": {"timeout": 120, "concurrency": 16, "tiers": ["large", "backup", "small"]},
+    # Selections, short rewrites and new text
+    "writing": {
+        "timeout": 90,
+        "concurrency": 8,
+        "hedge_after": LLM_HEDGE_AFTER,
+        "coalesce": True,
+        "tiers": ["small", "large", "backup"],
+    },
+    # Whole-document edits need the stronger model to keep patches exact
+    "writing_full": {
+        "timeout": 90,
+        "concurrency": 8,
+        "hedge_after": LLM_HEDGE_AFTER,
+        "coalesce": True,
+        "tiers": ["large", "backup"],
+    },
+    "drawing": {
+        "timeout": 45,
+        "concurrency": 8,
+        "hedge_after": LLM_HEDGE_AFTER,
+        "coalesce": True,
+        "tiers": ["small", "large", "backup"],
+    },
+}
+LLM_DEFAULT_ROUTE = {"timeout": 60, "concurrency": 8, "tiers": ["large", "backup"]}
+# A tier is degraded when, over the last LLM_HEALTH_WINDOW seconds (and at
+# least LLM_HEALTH_MIN_SAMPLES calls), its error rate or mean streaming
+# time-to-first-token exceeds these limits. It recovers once bad samples
+# age out of the window.
+LLM_HEALTH_WINDOW = int(os.getenv("LLM_HEALTH_WINDOW", 60))
+LLM_HEALTH_MIN_SAMPLES = int(os.getenv("LLM_HEALTH_MIN_SAMPLES", 5))
+LLM_FAILOVER_ERROR_RATE = float(os.getenv("LLM_FAILOVER_ERROR_RATE", 0.5))
+LLM_FAILOVER_TTFT = float(os.getenv("LLM_FAILOVER_TTFT", 8))
+# Identical requests on coalescing routes share results for this long, when
+# sampled at or below LLM_CACHE_MAX_TEMPERATURE
+LLM_RESULT_CACHE_TTL = int(os.getenv("LLM_RESULT_CACHE_TTL", 30))
+LLM_RESULT_CACHE_SIZE = int(os.getenv("LLM_RESULT_CACHE_SIZE", 256))
+LLM_CACHE_MAX_TEMPERATURE = float(os.getenv("LLM_CACHE_MAX_TEMPERATURE", 0.3))
+
+# Metrics (/metrics, Prometheus text format). When set, scrapers must send
+# "Authorization: Bearer <METRICS_TOKEN>".
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+# Per-request profiling: requests sent with "X-Profile-Token: <PROFILE_TOKEN>"
+# are profiled, plus a random PROFILE_SAMPLE_RATE fraction (0 disables)
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN")
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", 0))
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", 0.005))
+PROFILE_MAX_SECONDS = int(os.getenv("PROFILE_MAX_SECONDS", 300))
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", 200))
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(BASE_DIR, "profiles"))
+
+# Start-up: clients are created lazily and warmed in the background; /readyz
+# reports ready once required steps succeed (failed steps are retried)
+WARMUP_ON_START = os.getenv("WARMUP_ON_START", "true").lower() == "true"
+WARMUP_RETRY_INTERVAL = float(os.getenv("WARMUP_RETRY_INTERVAL", 5))
+
+# Shared retrieval service (retrieval_service.py). When RETRIEVAL_SERVICE_URL
+# is set, workers and ingest use it instead of opening Chroma themselves.
+RETRIEVAL_SERVICE_URL = os.getenv("RETRIEVAL_SERVICE_URL")
+RETRIEVAL_SERVICE_PORT = int(os.getenv("RETRIEVAL_SERVICE_PORT", 5100))
+# Requests arriving this close together are embedded/written in one call
+RETRIEVAL_BATCH_WINDOW = float(os.getenv("RETRIEVAL_BATCH_WINDOW", 0.005))
+RETRIEVAL_BATCH_MAX = int(os.getenv("RETRIEVAL_BATCH_MAX", 64))
+RETRIEVAL_QUERY_WORKERS = int(os.getenv("RETRIEVAL_QUERY_WORKERS", 2))
+RETRIEVAL_TIMEOUT = float(os.getenv("RETRIEVAL_TIMEOUT", 60))
+
+# Admission control for the expensive endpoints, per authenticated user:
+# a token bucket (requests per minute with a burst) and a cap on concurrent
+# requests, in front of a pool-wide ceiling. Requests over the ceiling wait
+# in a queue served round-robin across users; a full queue or a wait over
+# ADMISSION_QUEUE_TIMEOUT gets 503 + Retry-After, a user over their own
+# limits gets 429 + Retry-After.
+ADMISSION_USER_RATE_PER_MIN = float(os.getenv("ADMISSION_USER_RATE_PER_MIN", 30))
+ADMISSION_USER_BURST = float(os.getenv("ADMISSION_USER_BURST", 10))
+ADMISSION_USER_CONCURRENCY = int(os.getenv("ADMISSION_USER_CONCURRENCY", 2))
+# Requests one user may have waiting, on top of the ones running
+ADMISSION_USER_QUEUE = int(os.getenv("ADMISSION_USER_QUEUE", 4))
+ADMISSION_QUEUE_MAX = int(os.getenv("ADMISSION_QUEUE_MAX", 64))
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", 10))
+# Pool ceilings: LLM endpoints share the gateway's upstream capacity
+ADMISSION_POOLS = {
+    "llm": {"concurrency": int(os.getenv("ADMISSION_LLM_CONCURRENCY", LLM_MAX_CONCURRENCY))},
+    "tts": {"concurrency": int(os.getenv("ADMISSION_TTS_CONCURRENCY", 8))},
+}
+# Shared admission service (admission_service.py). Admission state is per
+# process: with several workers and no service, every limit above applies
+# per worker. When ADMISSION_SERVICE_URL is set, all workers share one set.
+ADMISSION_SERVICE_URL = os.getenv("ADMISSION_SERVICE_URL")
+ADMISSION_SERVICE_PORT = int(os.getenv("ADMISSION_SERVICE_PORT", 5101))
+# A slot whose worker never released it (crashed) is reclaimed after this
+ADMISSION_LEASE_SECONDS = float(os.getenv("ADMISSION_LEASE_SECONDS", 900))
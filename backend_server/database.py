@@ -1,10 +1,53 @@
-import chromadb
+import threading
 import config
 
-# Initialize Client
-print(f"Connecting to ChromaDB at {config.DB_PATH}...")
-chroma_client = chromadb.PersistentClient(path=config.DB_PATH)
+_client = None
+_collection = None
+_remote = None
+_lock = threading.Lock()
 
-# Get Collection
-# Using default embedding function (all-MiniLM-L6-v2 via ONNX)
-collection = chroma_client.get_or_create_collection(name="news_storage")
+
+def get_client():
+    """Chroma client, opened on first use (chromadb is slow to import)"""
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                import chromadb
+
+                print(f"Connecting to ChromaDB at {config.DB_PATH}...")
+                _client = chromadb.PersistentClient(path=config.DB_PATH)
+    return _client
+
+
+def get_local_collection():
+    """The news_storage collection, opened in this process"""
+    global _collection
+    if _collection is None:
+        client = get_client()
+        with _lock:
+            if _collection is None:
+                # Using default embedding function (all-MiniLM-L6-v2 via ONNX)
+                _collection = client.get_or_create_collection(name="news_storage")
+    return _collection
+
+
+def get_collection():
+    """
+    The news_storage collection: through the shared retrieval service when
+    RETRIEVAL_SERVICE_URL is set (one store and embedder for all workers),
+    otherwise opened in this process.
+    """
+    global _remote
+    if config.RETRIEVAL_SERVICE_URL:
+        if _remote is None:
+            from retrieval_client import RemoteCollection
+
+            _remote = RemoteCollection(config.RETRIEVAL_SERVICE_URL)
+        return _remote
+    return get_local_collection()
+
+
+def warm_up() -> None:
+    """Open the store and load the embedding model ahead of the first query"""
+    get_collection().query(query_texts=["warm-up"], n_results=1)
@@ -0,0 +1,726 @@
+"""
+LLM Gateway Module
+Single owner of the OpenAI-compatible (NVIDIA) client.
+
+Every completion goes through here so that upstream calls share one tuned
+keep-alive connection pool, get a per-route timeout, and are bounded by a
+global and a per-route concurrency limit. A request that cannot get a slot
+within LLM_QUEUE_TIMEOUT fails fast with LLMBusyError (503 + Retry-After)
+instead of piling up blocked threads behind a slow upstream. Time spent
+waiting for a slot is recorded per route (see get_stats).
+
+Non-streaming routes may enable hedging: if the first attempt has not
+answered after `hedge_after` seconds and a global slot is free, a
+duplicate is sent and whichever finishes first wins.
+
+Routes with "coalesce" enabled share work between identical requests
+(same route, model, messages and sampling params): concurrent duplicates
+ride along on one upstream call or stream, and results of low-temperature
+requests are replayed from a short-lived cache (LLM_RESULT_CACHE_TTL).
+
+Each route lists model tiers in order of preference (config.LLM_ROUTES,
+config.LLM_TIERS), so cheap tasks run on a smaller model. Every call feeds
+its tier's health: error rate and streaming time-to-first-token over a
+sliding window. Degraded tiers are skipped, and an upstream failure moves
+the request on to the next tier, so a slow or failing primary degrades
+into a fallback model rather than an outage.
+
+Route limits live in config.LLM_ROUTES.
+"""
+
+import json
+import time
+import hashlib
+import threading
+from collections import deque
+from concurrent.futures import (
+    Future,
+    ThreadPoolExecutor,
+    wait,
+    FIRST_COMPLETED,
+    TimeoutError as FutureTimeoutError,
+)
+
+import httpx
+from openai import OpenAI, APIStatusError
+
+import config
+import metrics
+from ttl_cache import TTLCache
+
+_http_client = None
+_clients = {}
+_client_lock = threading.Lock()
+
+_global_slots = threading.BoundedSemaphore(config.LLM_MAX_CONCURRENCY)
+_route_slots = {}
+_route_slots_lock = threading.Lock()
+
+_hedge_executor = ThreadPoolExecutor(
+    max_workers=config.LLM_MAX_CONCURRENCY * 2, thread_name_prefix="llm-hedge"
+)
+
+_stats = {}
+_stats_lock = threading.Lock()
+
+# Coalescing: in-flight requests by request_key, plus recent results
+_inflight = {}
+_broadcasts = {}
+_inflight_lock = threading.Lock()
+_results = TTLCache(maxsize=config.LLM_RESULT_CACHE_SIZE)
+
+
+class LLMBusyError(Exception):
+    """Raised when no upstream slot frees up within the queue timeout"""
+
+    def __init__(self, route: str, retry_after: int = 1):
+        super().__init__(f"Too many concurrent AI requests ({route}), please retry shortly")
+        self.route = route
+        self.retry_after = retry_after
+
+
+def _shared_http_client() -> httpx.Client:
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.Client(
+            limits=httpx.Limits(
+                max_connections=config.LLM_POOL_MAX_CONNECTIONS,
+                max_keepalive_connections=config.LLM_POOL_MAX_KEEPALIVE,
+                keepalive_expiry=config.LLM_KEEPALIVE_EXPIRY,
+            ),
+            timeout=httpx.Timeout(
+                config.LLM_DEFAULT_ROUTE["timeout"],
+                connect=config.LLM_CONNECT_TIMEOUT,
+            ),
+        )
+    return _http_client
+
+
+def get_client(tier: str = "large") -> OpenAI:
+    """Client for a model tier; tiers on the same endpoint share one client"""
+    spec = config.LLM_TIERS[tier]
+    key = (spec["base_url"], spec["api_key"])
+    client = _clients.get(key)
+    if client is None:
+        with _client_lock:
+            client = _clients.get(key)
+            if client is None:
+                print(f"Initializing LLM client for {spec['base_url']}...")
+                client = _clients[key] = OpenAI(
+                    base_url=spec["base_url"],
+                    api_key=spec["api_key"],
+                    max_retries=config.LLM_MAX_RETRIES,
+                    http_client=_shared_http_client(),
+                )
+    return client
+
+
+def warm_up() -> None:
+    """Create every tier's client (and the shared pool) ahead of the first call"""
+    for tier in config.LLM_TIERS:
+        get_client(tier)
+
+
+def _profile(route: str) -> dict:
+    return config.LLM_ROUTES.get(route, config.LLM_DEFAULT_ROUTE)
+
+
+def _timeout(route: str) -> httpx.Timeout:
+    return httpx.Timeout(_profile(route)["timeout"], connect=config.LLM_CONNECT_TIMEOUT)
+
+
+# --- STATS ---
+
+
+def _route_stats(route: str) -> dict:
+    stats = _stats.get(route)
+    if stats is None:
+        stats = _stats[route] = {
+            "requests": 0,
+            "rejected": 0,
+            "errors": 0,
+            "inFlight": 0,
+            "queueSeconds": 0.0,
+            "maxQueueSeconds": 0.0,
+            "hedged": 0,
+            "hedgeWins": 0,
+            "coalesced": 0,
+            "cacheHits": 0,
+            "failovers": 0,
+        }
+    return stats
+
+
+def _record(route: str, **changes) -> None:
+    with _stats_lock:
+        stats = _route_stats(route)
+        for key, value in changes.items():
+            if key == "maxQueueSeconds":
+                stats[key] = max(stats[key], value)
+            else:
+                stats[key] += value
+
+
+def get_stats() -> dict:
+    """
+    Per-route counters: requests, rejections, queue time, in-flight,
+    hedges, failovers, and requests served by coalescing or the result cache
+    """
+    with _stats_lock:
+        return {route: dict(stats) for route, stats in _stats.items()}
+
+
+LLM_QUEUE_SECONDS = metrics.Histogram(
+    "qwenify_llm_queue_seconds",
+    "Time LLM requests waited for an upstream slot",
+    ["route"],
+)
+
+_STAT_METRICS = [
+    ("requests", "qwenify_llm_requests_total", "counter", "LLM requests admitted"),
+    ("rejected", "qwenify_llm_rejected_total", "counter", "LLM requests rejected as busy"),
+    ("errors", "qwenify_llm_errors_total", "counter", "LLM requests that failed"),
+    ("inFlight", "qwenify_llm_in_flight", "gauge", "LLM requests holding a slot"),
+    ("hedged", "qwenify_llm_hedged_total", "counter", "Hedge requests sent"),
+    ("coalesced", "qwenify_llm_coalesced_total", "counter", "Requests served by another in-flight call"),
+    ("cacheHits", "qwenify_llm_cache_hits_total", "counter", "Requests served from the result cache"),
+    ("failovers", "qwenify_llm_failovers_total", "counter", "Requests moved to another tier"),
+]
+
+
+def _collect_metrics() -> list:
+    stats = get_stats()
+    families = [
+        (name, kind, help_text, [({"route": r}, s[key]) for r, s in stats.items()])
+        for key, name, kind, help_text in _STAT_METRICS
+    ]
+    health = get_tier_health()
+    families.append(
+        (
+            "qwenify_llm_tier_degraded",
+            "gauge",
+            "1 while a model tier is skipped as degraded",
+            [({"tier": t, "model": h["model"]}, int(h["degraded"])) for t, h in health.items()],
+        )
+    )
+    families.append(
+        (
+            "qwenify_llm_tier_error_rate",
+            "gauge",
+            "Model tier error rate over the health window",
+            [({"tier": t}, h["errorRate"]) for t, h in health.items()],
+        )
+    )
+    return families
+
+
+metrics.register_collector(_collect_metrics)
+
+
+# --- MODEL TIER HEALTH ---
+
+
+class _TierHealth:
+    """Sliding window of recent outcomes for one model tier"""
+
+    def __init__(self):
+        self._samples = deque()  # (time, ok, ttft or None)
+        self._lock = threading.Lock()
+
+    def _prune(self, now: float) -> None:
+        while self._samples and self._samples[0][0] < now - config.LLM_HEALTH_WINDOW:
+            self._samples.popleft()
+
+    def record(self, ok: bool, ttft: float = None) -> None:
+        now = time.monotonic()
+        with self._lock:
+            self._samples.append((now, ok, ttft))
+            self._prune(now)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            self._prune(time.monotonic())
+            samples = list(self._samples)
+        count = len(samples)
+        errors = sum(1 for _, ok, _ in samples if not ok)
+        ttfts = [ttft for _, _, ttft in samples if ttft is not None]
+        error_rate = errors / count if count else 0.0
+        ttft = sum(ttfts) / len(ttfts) if ttfts else None
+        degraded = count >= config.LLM_HEALTH_MIN_SAMPLES and (
+            error_rate >= config.LLM_FAILOVER_ERROR_RATE
+            or (ttft is not None and ttft > config.LLM_FAILOVER_TTFT)
+        )
+        return {"samples": count, "errorRate": error_rate, "ttft": ttft, "degraded": degraded}
+
+
+_health = {tier: _TierHealth() for tier in config.LLM_TIERS}
+
+
+def get_tier_health() -> dict:
+    """Per-tier model, sample count, error rate, mean TTFT and degraded flag"""
+    return {
+        tier: {"model": config.LLM_TIERS[tier]["model"], **health.snapshot()}
+        for tier, health in _health.items()
+    }
+
+
+def _candidates(route: str) -> list:
+    """Route's tiers in preference order, healthy ones first"""
+    seen, healthy, degraded = set(), [], []
+    for tier in _profile(route)["tiers"]:
+        spec = config.LLM_TIERS[tier]
+        target = (spec["base_url"], spec["model"])
+        if target in seen:
+            continue
+        seen.add(target)
+        (degraded if _health[tier].snapshot()["degraded"] else healthy).append(tier)
+    # Degraded tiers stay as a last resort rather than failing outright
+    return healthy + degraded
+
+
+def _is_upstream_failure(error: Exception) -> bool:
+    """Whether an error says something about the tier (vs. a bad request)"""
+    if isinstance(error, APIStatusError):
+        return error.status_code >= 500 or error.status_code == 429
+    return True
+
+
+# --- ADMISSION ---
+
+
+def _slots_for(route: str) -> threading.BoundedSemaphore:
+    with _route_slots_lock:
+        slots = _route_slots.get(route)
+        if slots is None:
+            slots = _route_slots[route] = threading.BoundedSemaphore(
+                _profile(route)["concurrency"]
+            )
+        return slots
+
+
+def _acquire(route: str):
+    """
+    Take a route slot and a global slot, waiting at most LLM_QUEUE_TIMEOUT
+    in total. Returns a release callable.
+    """
+    route_slots = _slots_for(route)
+    started = time.monotonic()
+    deadline = started + config.LLM_QUEUE_TIMEOUT
+
+    if not route_slots.acquire(timeout=config.LLM_QUEUE_TIMEOUT):
+        _record(route, rejected=1)
+        raise LLMBusyError(route)
+    if not _global_slots.acquire(timeout=max(0.0, deadline - time.monotonic())):
+        route_slots.release()
+        _record(route, rejected=1)
+        raise LLMBusyError(route)
+
+    queued = time.monotonic() - started
+    _record(route, requests=1, inFlight=1, queueSeconds=queued, maxQueueSeconds=queued)
+    LLM_QUEUE_SECONDS.observe(queued, route=route)
+
+    held = [True]
+    held_lock = threading.Lock()
+
+    def release():
+        with held_lock:
+            if not held[0]:
+                return
+            held[0] = False
+        _global_slots.release()
+        route_slots.release()
+        _record(route, inFlight=-1)
+
+    return release
+
+
+# --- COALESCING ---
+
+
+def request_key(route: str, params: dict) -> str:
+    """Identity of a request: route, model, normalized messages, sampling params"""
+    normalized = dict(params)
+    normalized["messages"] = [
+        {**m, "content": m["content"].strip()} if isinstance(m.get("content"), str) else m
+        for m in params.get("messages", [])
+    ]
+    raw = json.dumps([route, normalized], sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _cacheable(params: dict) -> bool:
+    """Only near-deterministic sampling is worth replaying to a later request"""
+    return params.get("temperature", 1.0) <= config.LLM_CACHE_MAX_TEMPERATURE
+
+
+class _Broadcast:
+    """
+    One upstream stream shared by every identical concurrent request.
+    A pump thread reads the upstream into a chunk buffer; subscribers
+    replay the buffer and then follow it live. If every subscriber goes
+    away the upstream is closed early.
+    """
+
+    def __init__(self, key: str, route: str, cacheable: bool):
+        self.key = key
+        self.route = route
+        self.cacheable = cacheable
+        self._chunks = []
+        self._done = False
+        self._error = None
+        self._abandoned = False
+        self._subscribers = 0
+        self._cond = threading.Condition()
+
+    def subscribe(self):
+        """A new subscription, or None if this broadcast can no longer serve one"""
+        with self._cond:
+            if self._abandoned or self._error is not None:
+                return None
+            self._subscribers += 1
+        return _Subscription(self)
+
+    def unsubscribe(self) -> None:
+        with self._cond:
+            self._subscribers -= 1
+            if self._subscribers == 0 and not self._done:
+                self._abandoned = True
+
+    def start(self, completion, release) -> None:
+        threading.Thread(
+            target=self._pump,
+            args=(completion, release),
+            name="llm-broadcast",
+            daemon=True,
+        ).start()
+
+    def fail(self, error: Exception) -> None:
+        with self._cond:
+            self._error = error
+            self._done = True
+            self._cond.notify_all()
+        self._forget()
+
+    def _forget(self) -> None:
+        with _inflight_lock:
+            if _broadcasts.get(self.key) is self:
+                del _broadcasts[self.key]
+
+    def _pump(self, completion, release) -> None:
+        try:
+            for chunk in completion:
+                with self._cond:
+                    if self._abandoned:
+                        break
+                    self._chunks.append(chunk)
+                    self._cond.notify_all()
+        except Exception as e:
+            _record(self.route, errors=1)
+            with self._cond:
+                self._error = e
+        finally:
+            try:
+                completion.close()
+            except Exception:
+                pass
+            release()
+            with self._cond:
+                self._done = True
+                self._cond.notify_all()
+            if self.cacheable and not self._abandoned and self._error is None:
+                _results.set(self.key, list(self._chunks), config.LLM_RESULT_CACHE_TTL)
+            self._forget()
+
+    def chunks(self):
+        index = 0
+        while True:
+            with self._cond:
+                while index >= len(self._chunks) and not self._done:
+                    self._cond.wait()
+                batch = self._chunks[index:]
+                index += len(batch)
+                finished, error = self._done, self._error
+            yield from batch
+            if finished:
+                if error is not None:
+                    raise error
+                return
+
+
+class _Subscription:
+    """One request's view of a broadcast; same contract as LLMStream"""
+
+    def __init__(self, broadcast: _Broadcast):
+        self._broadcast = broadcast
+        self._open = True
+
+    def __iter__(self):
+        try:
+            yield from self._broadcast.chunks()
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        if self._open:
+            self._open = False
+            self._broadcast.unsubscribe()
+
+    def __del__(self):
+        self.close()
+
+
+# --- COMPLETIONS ---
+
+
+def _create(route: str, params: dict, tier: str):
+    # The tier decides the model; callers only pass messages and sampling.
+    # For streams this times the wait for response headers.
+    with metrics.outbound("nvidia", f"{route}:{tier}"):
+        return get_client(tier).chat.completions.create(
+            timeout=_timeout(route), **{**params, "model": config.LLM_TIERS[tier]["model"]}
+        )
+
+
+def _hedged_create(route: str, params: dict, tier: str, hedge_after: float, calls: list):
+    """
+    `calls` collects the primary attempt's futures: a slow first call that
+    loses to its hedge keeps running upstream (a blocking HTTP call cannot
+    be interrupted), and the caller's slot must stay held until it ends.
+    """
+    first = _hedge_executor.submit(_create, route, params, tier)
+    calls.append(first)
+    try:
+        return first.result(timeout=hedge_after)
+    except FutureTimeoutError:
+        pass
+
+    # Only hedge with spare capacity; never make an overload worse
+    if not _global_slots.acquire(blocking=False):
+        return first.result()
+    _record(route, hedged=1)
+    second = _hedge_executor.submit(_create, route, params, tier)
+    second.add_done_callback(lambda _: _global_slots.release())
+
+    pending, error = {first, second}, None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                if future is second:
+                    _record(route, hedgeWins=1)
+                return future.result()
+            error = future.exception()
+    raise error
+
+
+def _with_failover(route: str, attempt):
+    """
+    Run `attempt(tier)` on the route's tiers in order until one succeeds.
+    Errors caused by the request itself (4xx) are raised at once.
+    """
+    error = None
+    for index, tier in enumerate(_candidates(route)):
+        if index:
+            _record(route, failovers=1)
+        try:
+            return attempt(tier)
+        except Exception as e:
+            _record(route, errors=1)
+            if not _is_upstream_failure(e):
+                raise
+            _health[tier].record(False)
+            print(f"LLM tier '{tier}' failed for {route}: {e}")
+            error = e
+    raise error
+
+
+def _release_after(calls: list, release) -> None:
+    """Call `release` once every future in `calls` has finished"""
+    running = [call for call in calls if not call.done()]
+    if not running:
+        release()
+        return
+    remaining = [len(running)]
+    lock = threading.Lock()
+
+    def finished(_):
+        with lock:
+            remaining[0] -= 1
+            last = remaining[0] == 0
+        if last:
+            release()
+
+    for call in running:
+        call.add_done_callback(finished)
+
+
+def _complete(route: str, params: dict):
+    hedge_after = _profile(route).get("hedge_after") or 0
+    calls = []
+
+    def attempt(tier):
+        if hedge_after > 0:
+            result = _hedged_create(route, params, tier, hedge_after, calls)
+        else:
+            result = _create(route, params, tier)
+        _health[tier].record(True)
+        return result
+
+    release = _acquire(route)
+    try:
+        return _with_failover(route, attempt)
+    finally:
+        # A primary call that lost to its hedge still occupies upstream
+        # capacity; its slot is given back when it returns
+        for call in calls:
+            call.cancel()  # only stops calls that have not started
+        _release_after(calls, release)
+
+
+def _open_stream(route: str, params: dict):
+    """Take a slot and start an upstream stream. Returns (completion, release)."""
+
+    def attempt(tier):
+        started = time.monotonic()
+        completion = _create(route, {**params, "stream": True}, tier)
+        return _TimedStream(completion, tier, started)
+
+    release = _acquire(route)
+    try:
+        return _with_failover(route, attempt), release
+    except Exception:
+        release()
+        raise
+
+
+class _TimedStream:
+    """Upstream stream that reports TTFT and failures to its tier's health"""
+
+    def __init__(self, completion, tier: str, started: float):
+        self._completion = completion
+        self._tier = tier
+        self._started = started
+
+    def __iter__(self):
+        first = True
+        try:
+            for chunk in self._completion:
+                if first:
+                    first = False
+                    _health[self._tier].record(True, time.monotonic() - self._started)
+                yield chunk
+        except Exception as e:
+            if _is_upstream_failure(e):
+                _health[self._tier].record(False)
+            raise
+
+    def close(self) -> None:
+        self._completion.close()
+
+
+def complete(route: str, **params):
+    """
+    Non-streaming chat completion for `route`. Identical concurrent
+    requests share one upstream call when the route coalesces.
+    """
+    if not _profile(route).get("coalesce"):
+        return _complete(route, params)
+
+    key = request_key(route, params)
+    cached = _results.get(key)
+    if cached is not None:
+        _record(route, cacheHits=1)
+        return cached
+
+    with _inflight_lock:
+        future = _inflight.get(key)
+        leader = future is None
+        if leader:
+            future = _inflight[key] = Future()
+    if not leader:
+        _record(route, coalesced=1)
+        return future.result()
+
+    try:
+        result = _complete(route, params)
+        if _cacheable(params):
+            _results.set(key, result, config.LLM_RESULT_CACHE_TTL)
+        future.set_result(result)
+        return result
+    except Exception as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with _inflight_lock:
+            _inflight.pop(key, None)
+
+
+def stream(route: str, **params):
+    """
+    Streaming chat completion for `route`. The slot is taken before this
+    returns (so LLMBusyError surfaces to the caller) and held until the
+    returned stream is exhausted or closed. Identical concurrent requests
+    share one upstream stream when the route coalesces.
+    """
+    if not _profile(route).get("coalesce"):
+        completion, release = _open_stream(route, params)
+        return LLMStream(route, completion, release)
+
+    key = request_key(route, params)
+    cached = _results.get(key)
+    if cached is not None:
+        _record(route, cacheHits=1)
+        return iter(cached)
+
+    with _inflight_lock:
+        broadcast = _broadcasts.get(key)
+        subscription = broadcast.subscribe() if broadcast else None
+        leader = subscription is None
+        if leader:
+            broadcast = _broadcasts[key] = _Broadcast(key, route, _cacheable(params))
+            subscription = broadcast.subscribe()
+    if not leader:
+        _record(route, coalesced=1)
+        return subscription
+
+    try:
+        completion, release = _open_stream(route, params)
+    except Exception as e:
+        # Requests that joined in the meantime see the same failure
+        broadcast.fail(e)
+        raise
+    broadcast.start(completion, release)
+    return subscription
+
+
+class LLMStream:
+    """Iterable of completion chunks that gives its slot back when done"""
+
+    def __init__(self, route: str, completion, release):
+        self.route = route
+        self._completion = completion
+        self._release = release
+
+    def __iter__(self):
+        try:
+            yield from self._completion
+        except Exception:
+            _record(self.route, errors=1)
+            raise
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        # Idempotent; also runs when the client disconnects mid-stream
+        if self._release is None:
+            return
+        release, self._release = self._release, None
+        try:
+            self._completion.close()
+        except Exception:
+            pass
+        release()
+
+    def __del__(self):
+        # A stream that was never iterated must not keep its slot
+        self.close()
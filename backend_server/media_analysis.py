@@ -0,0 +1,244 @@
+"""
+Media Analysis Module
+Gemini file handles for project media, reused across prompts.
+
+Media is streamed to a temp file in chunks (never held in memory) and
+uploaded to the Gemini Files API once. The resulting handle is cached by a
+hash of the URL it was fetched from, since the cache is shared by all users
+and a client-supplied publicId proves nothing about that URL. Follow-up
+prompts about the same asset reuse the handle and skip the download, upload
+and processing wait. Handles are deleted from Gemini when they are evicted
+from the cache; ones never evicted expire on Gemini's side after 48 hours.
+"""
+
+import os
+import time
+import hashlib
+import tempfile
+import datetime
+import threading
+from contextlib import contextmanager
+from urllib.parse import urlparse
+from urllib.request import url2pathname
+
+import config
+import metrics
+from http_client import get_session, default_timeout
+from media_upload import MAX_UPLOAD_SIZE
+from ttl_cache import TTLCache
+
+# Refresh a handle this long before Gemini expires it
+EXPIRY_MARGIN = 600
+
+_client = None
+_client_lock = threading.Lock()
+_key_locks = {}
+_key_locks_guard = threading.Lock()
+
+
+class MediaAnalysisError(Exception):
+    """Raised when media cannot be fetched or processed"""
+
+    def __init__(self, message: str, status: int = 500):
+        super().__init__(message)
+        self.status = status
+
+
+def _delete_remote(key, handle) -> None:
+    if _client:
+        with metrics.outbound("gemini", "files.delete"):
+            _client.files.delete(name=handle.name)
+
+
+_handles = TTLCache(maxsize=config.GEMINI_FILE_CACHE_SIZE, on_evict=_delete_remote)
+
+
+def get_client():
+    """
+    Gemini client, created on first use. Returns None when no API key is
+    configured or the client cannot be created (retried on the next call).
+    """
+    global _client
+    if _client is None and config.GEMINI_API_KEY:
+        with _client_lock:
+            if _client is None:
+                from google import genai
+
+                try:
+                    _client = genai.Client(api_key=config.GEMINI_API_KEY)
+                except Exception as e:
+                    print(f"Warning: Gemini Client failed to initialize: {e}")
+    return _client
+
+
+def warm_up() -> None:
+    if config.GEMINI_API_KEY and get_client() is None:
+        raise MediaAnalysisError("Gemini client could not be created")
+
+
+def media_key(media_url: str) -> str:
+    return "url:" + hashlib.sha256(media_url.encode("utf-8")).hexdigest()
+
+
+@contextmanager
+def _key_lock(key: str):
+    """
+    One upload per asset at a time; concurrent prompts wait and reuse it.
+    The lock is dropped once nobody holds or waits for it.
+    """
+    with _key_locks_guard:
+        entry = _key_locks.get(key)
+        if entry is None:
+            entry = _key_locks[key] = [threading.Lock(), 0]
+        entry[1] += 1
+    try:
+        with entry[0]:
+            yield
+    finally:
+        with _key_locks_guard:
+            entry[1] -= 1
+            if not entry[1]:
+                del _key_locks[key]
+
+
+# --- TRANSFER ---
+
+
+def _download(media_url: str, media_type: str):
+    """
+    Stream media to a temp file.
+    Returns: (temp path to clean up or None, path to upload)
+    """
+    suffix = ".mp4" if media_type == "video" else ".jpg"
+    limit = MAX_UPLOAD_SIZE.get(media_type, MAX_UPLOAD_SIZE["video"])
+
+    if media_url.startswith("file://") and config.MEDIA_UPLOAD_BACKEND == "local":
+        # Stand-in backend: the media is already on local disk
+        path = os.path.realpath(url2pathname(urlparse(media_url).path))
+        if os.path.dirname(path) != os.path.realpath(config.LOCAL_MEDIA_DIR):
+            raise MediaAnalysisError("Invalid media URL", 400)
+        return None, path
+
+    fd, path = tempfile.mkstemp(suffix=suffix)
+    try:
+        with metrics.outbound("media", "download"), os.fdopen(fd, "wb") as tmp, get_session().get(
+            media_url, stream=True, timeout=default_timeout()
+        ) as response:
+            if response.status_code != 200:
+                raise MediaAnalysisError("Failed to download media from URL", 400)
+            written = 0
+            for chunk in response.iter_content(config.MEDIA_DOWNLOAD_CHUNK_SIZE):
+                written += len(chunk)
+                if written > limit:
+                    raise MediaAnalysisError("Media is too large to analyze", 413)
+                tmp.write(chunk)
+    except Exception:
+        os.remove(path)
+        raise
+    return path, path
+
+
+def _wait_until_active(handle, on_stage=None):
+    deadline = time.monotonic() + config.GEMINI_FILE_PROCESS_TIMEOUT
+    while "ACTIVE" not in str(handle.state):
+        if "FAILED" in str(handle.state):
+            raise MediaAnalysisError("Gemini video processing failed")
+        if time.monotonic() > deadline:
+            raise MediaAnalysisError("Gemini video processing timed out", 504)
+        if on_stage:
+            on_stage("processing")
+        time.sleep(config.GEMINI_FILE_POLL_INTERVAL)
+        with metrics.outbound("gemini", "files.get"):
+            handle = get_client().files.get(name=handle.name)
+    return handle
+
+
+def _handle_ttl(handle) -> float:
+    """Cache TTL bounded by the handle's own expiration time"""
+    ttl = config.GEMINI_FILE_CACHE_TTL
+    expires = getattr(handle, "expiration_time", None)
+    if isinstance(expires, datetime.datetime):
+        if expires.tzinfo is None:
+            expires = expires.replace(tzinfo=datetime.timezone.utc)
+        remaining = (expires - datetime.datetime.now(datetime.timezone.utc)).total_seconds()
+        ttl = min(ttl, remaining - EXPIRY_MARGIN)
+    return ttl
+
+
+def _upload(media_url: str, media_type: str, on_stage=None):
+    if on_stage:
+        on_stage("transferring")
+    temp_path, path = _download(media_url, media_type)
+    try:
+        with metrics.outbound("gemini", "files.upload"):
+            handle = get_client().files.upload(file=path)
+    finally:
+        if temp_path and os.path.exists(temp_path):
+            os.remove(temp_path)
+    try:
+        return _wait_until_active(handle, on_stage)
+    except Exception:
+        try:
+            _delete_remote(None, handle)
+        except Exception:
+            pass
+        raise
+
+
+# --- PUBLIC API ---
+
+
+def get_file_handle(media_url: str, media_type: str, on_stage=None):
+    """
+    Active Gemini file handle for a media asset, uploading it if needed.
+    `on_stage(stage)` is called as the transfer progresses.
+    Returns: (handle, reused)
+    """
+    key = media_key(media_url)
+    handle = _handles.get(key)
+    if handle is not None:
+        return handle, True
+
+    with _key_lock(key):
+        handle = _handles.get(key)
+        if handle is not None:
+            return handle, True
+        handle = _upload(media_url, media_type, on_stage)
+        _handles.set(key, handle, _handle_ttl(handle))
+        return handle, False
+
+
+def forget(media_url: str) -> None:
+    """Drop a cached handle and delete the remote file"""
+    key = media_key(media_url)
+    handle = _handles.pop(key)
+    if handle is not None:
+        try:
+            _delete_remote(key, handle)
+        except Exception:
+            pass
+
+
+def analyze(
+    model: str,
+    media_url: str,
+    media_type: str,
+    prompt: str,
+    on_stage=None,
+) -> str:
+    """Run a prompt against a media asset; returns the response text"""
+    handle, reused = get_file_handle(media_url, media_type, on_stage)
+    if on_stage:
+        on_stage("generating")
+    try:
+        with metrics.outbound("gemini", "generate_content"):
+            response = get_client().models.generate_content(model=model, contents=[handle, prompt])
+    except Exception:
+        if not reused:
+            raise
+        # The cached handle may have been removed on Gemini's side
+        forget(media_url)
+        handle, _ = get_file_handle(media_url, media_type, on_stage)
+        with metrics.outbound("gemini", "generate_content"):
+            response = get_client().models.generate_content(model=model, contents=[handle, prompt])
+    return response.text
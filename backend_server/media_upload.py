@@ -0,0 +1,220 @@
+"""
+Media Upload Module
+Resumable, chunked media uploads.
+
+The client opens an upload session, then PUTs the file in chunks of
+UPLOAD_CHUNK_SIZE with a Content-Range header. Each chunk is forwarded
+straight to the storage backend, so server memory per upload is bounded
+by one chunk. An interrupted upload resumes from the session's
+`received` offset instead of starting over. A completed session keeps its
+media entry, so a retried final chunk (after a lost response) gets the same
+entry back instead of an error.
+
+Backends:
+  - cloudinary: Cloudinary's chunked (large) upload API
+  - local:      writes to LOCAL_MEDIA_DIR, a stand-in for tests and dev
+"""
+
+import os
+import re
+import uuid
+import datetime
+
+import config
+import workspace_store
+from mongodb import upload_sessions_collection
+
+MAX_UPLOAD_SIZE = {"video": 100 * 1024 * 1024, "image": 10 * 1024 * 1024}
+
+_CONTENT_RANGE = re.compile(r"^bytes (\d+)-(\d+)/(\d+)$")
+
+
+class UploadError(Exception):
+    """Client-side problem with an upload request"""
+
+    def __init__(self, message: str, status: int = 400, received: int = None):
+        super().__init__(message)
+        self.status = status
+        self.received = received
+
+
+# --- BACKENDS ---
+
+
+class CloudinaryChunkBackend:
+    # Cloudinary rejects non-final chunks smaller than this
+    min_chunk_size = 5 * 1024 * 1024
+
+    def write_chunk(self, session: dict, start: int, chunk: bytes):
+        from cloudinary_config import upload_chunk
+
+        result = upload_chunk(
+            chunk,
+            upload_id=session["_id"],
+            start=start,
+            total_size=session["totalSize"],
+            filename=session["filename"],
+            folder=session["folder"],
+            resource_type=session["mediaType"],
+        )
+        if start + len(chunk) < session["totalSize"]:
+            return None
+        return {"url": result["secure_url"], "public_id": result["public_id"]}
+
+
+class LocalChunkBackend:
+    min_chunk_size = 1
+
+    def _path(self, session: dict) -> str:
+        return os.path.join(config.LOCAL_MEDIA_DIR, session["_id"])
+
+    def write_chunk(self, session: dict, start: int, chunk: bytes):
+        os.makedirs(config.LOCAL_MEDIA_DIR, exist_ok=True)
+        path = self._path(session)
+        with open(path, "r+b" if os.path.exists(path) else "wb") as f:
+            f.seek(start)
+            f.write(chunk)
+        if start + len(chunk) < session["totalSize"]:
+            return None
+        return {
+            "url": f"file://{os.path.abspath(path)}",
+            "public_id": f"{session['folder']}/{session['_id']}",
+        }
+
+
+def get_backend():
+    if config.MEDIA_UPLOAD_BACKEND == "local":
+        return LocalChunkBackend()
+    return CloudinaryChunkBackend()
+
+
+# --- SESSIONS ---
+
+
+def describe(session: dict) -> dict:
+    """Client-facing view of an upload session"""
+    view = {
+        "uploadId": session["_id"],
+        "received": session["received"],
+        "totalSize": session["totalSize"],
+        "chunkSize": config.UPLOAD_CHUNK_SIZE,
+        "status": session["status"],
+    }
+    if session.get("media"):
+        view["media"] = session["media"]
+    return view
+
+
+def start_upload(project_id: str, filename: str, total_size: int, media_type: str) -> dict:
+    if media_type not in MAX_UPLOAD_SIZE:
+        raise UploadError("type must be 'image' or 'video'")
+    if not isinstance(total_size, int) or total_size <= 0:
+        raise UploadError("size must be a positive integer")
+    if total_size > MAX_UPLOAD_SIZE[media_type]:
+        limit = MAX_UPLOAD_SIZE[media_type] // (1024 * 1024)
+        raise UploadError(f"File too large. Max size is {limit}MB")
+
+    session = {
+        "_id": uuid.uuid4().hex,
+        "projectId": project_id,
+        "filename": filename or "upload",
+        "mediaType": media_type,
+        "folder": f"qwenify/{project_id}/{media_type}s",
+        "totalSize": total_size,
+        "received": 0,
+        "status": "uploading",
+        "createdAt": datetime.datetime.utcnow(),
+    }
+    upload_sessions_collection.insert_one(session)
+    return describe(session)
+
+
+def get_upload(project_id: str, upload_id: str):
+    session = upload_sessions_collection.find_one(
+        {"_id": upload_id, "projectId": project_id}
+    )
+    return describe(session) if session else None
+
+
+def parse_content_range(header: str):
+    """Returns: (start, end, total) from "bytes start-end/total" """
+    match = _CONTENT_RANGE.match(header or "")
+    if not match:
+        raise UploadError("Content-Range header must be 'bytes start-end/total'")
+    start, end, total = (int(g) for g in match.groups())
+    if end < start:
+        raise UploadError("Invalid Content-Range")
+    return start, end, total
+
+
+def read_chunk(stream, length: int) -> bytes:
+    """Read exactly one chunk from the request stream"""
+    parts = []
+    remaining = length
+    while remaining > 0:
+        data = stream.read(min(remaining, 64 * 1024))
+        if not data:
+            break
+        parts.append(data)
+        remaining -= len(data)
+    return b"".join(parts)
+
+
+def upload_chunk(project_id: str, upload_id: str, content_range: str, stream):
+    """
+    Forward one chunk to the backend. The last chunk adds the media entry
+    to the project.
+    Returns: (updated session, media entry once complete, else None)
+    """
+    start, end, total = parse_content_range(content_range)
+    length = end - start + 1
+    if length > config.UPLOAD_CHUNK_SIZE:
+        raise UploadError(f"Chunks may be at most {config.UPLOAD_CHUNK_SIZE} bytes")
+
+    session = upload_sessions_collection.find_one(
+        {"_id": upload_id, "projectId": project_id}
+    )
+    if not session:
+        raise UploadError("Upload not found", status=404)
+    if session["status"] != "uploading":
+        if session.get("media"):
+            # Retry of the final chunk whose response was lost
+            return session, session["media"]
+        raise UploadError("Upload already completed", status=409, received=session["received"])
+    if total != session["totalSize"] or end >= total:
+        raise UploadError("Content-Range does not match the upload size")
+    backend = get_backend()
+    if end + 1 < total and length < backend.min_chunk_size:
+        raise UploadError(f"Chunks before the last must be at least {backend.min_chunk_size} bytes")
+    if start != session["received"]:
+        # Client is out of step (e.g. retried after a lost response)
+        raise UploadError("Unexpected offset", status=409, received=session["received"])
+
+    chunk = read_chunk(stream, length)
+    if len(chunk) != length:
+        raise UploadError("Chunk body shorter than Content-Range")
+
+    result = backend.write_chunk(session, start, chunk)
+
+    media = None
+    update = {"$set": {"received": end + 1}}
+    if result:
+        media = {
+            "type": session["mediaType"],
+            "url": result["url"],
+            "publicId": result["public_id"],
+            "name": session["filename"],
+            "uploadedAt": datetime.datetime.now().isoformat(),
+        }
+        update["$set"].update({"status": "complete", "media": media})
+    claimed = upload_sessions_collection.update_one(
+        {"_id": upload_id, "received": start}, update
+    )
+    if claimed.matched_count == 0:
+        current = upload_sessions_collection.find_one({"_id": upload_id}, {"received": 1})
+        raise UploadError("Unexpected offset", status=409, received=current["received"])
+
+    if media:
+        workspace_store.add_media(project_id, media)
+    session.update(update["$set"])
+    return session, media
@@ -0,0 +1,272 @@
+"""
+Metrics Module
+In-process metrics exposed at /metrics in Prometheus text format.
+
+Histograms and counters are kept per label set in memory (per process).
+Modules with their own bookkeeping (e.g. the LLM gateway) register a
+collector that is read at scrape time instead of duplicating counters.
+
+Instrumented:
+  - every Flask route (latency by method, route and status; streamed
+    responses are timed until the stream closes)
+  - /chat stages: retrieval, prompt assembly, TTFT, generation, total
+  - Chroma query / upsert / delete
+  - MongoDB commands (pymongo command listener)
+  - outbound calls: NVIDIA, Gemini, YouTube, NewsAPI, Cloudinary, Google
+"""
+
+import time
+import threading
+from contextlib import contextmanager
+
+from flask import Response, g, request
+from pymongo import monitoring
+
+import config
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+_registry = []
+_collectors = []
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name: str, help_text: str, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(labels.get(name, "") for name in self.labels)
+
+    def _header(self) -> list:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> list:
+        with self._lock:
+            items = list(self._values.items())
+        lines = self._header()
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self) -> list:
+        with self._lock:
+            items = [(key, (list(b), s, c)) for key, (b, s, c) in self._values.items()]
+        lines = self._header()
+        for key, (bucket_counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, bucket_counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(float(bound))}"'
+                lines.append(
+                    f"{self.name}_bucket{_format_labels(self.labels, key, le)} {cumulative}"
+                )
+            inf = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, inf)} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {total!r}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {count}")
+        return lines
+
+
+def register_collector(collector) -> None:
+    """
+    `collector()` returns [(name, kind, help, [(labels dict, value)])],
+    read at scrape time.
+    """
+    _collectors.append(collector)
+
+
+def render() -> str:
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    for collector in _collectors:
+        try:
+            families = collector()
+        except Exception as e:
+            print(f"Metrics collector failed: {e}")
+            continue
+        for name, kind, help_text, samples in families:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                names = tuple(labels)
+                values = tuple(labels[n] for n in names)
+                lines.append(f"{name}{_format_labels(names, values)} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+# --- METRICS ---
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "qwenify_http_request_duration_seconds",
+    "Flask request latency, including the full body of streamed responses",
+    ["method", "route", "status"],
+)
+
+CHAT_STAGE_SECONDS = Histogram(
+    "qwenify_chat_stage_seconds",
+    "/chat time per stage (retrieval, prompt, ttft, generation, total)",
+    ["stage"],
+)
+
+CHAT_TOKENS_PER_SECOND = Histogram(
+    "qwenify_chat_tokens_per_second",
+    "/chat streamed chunks per second after the first token",
+    buckets=(1, 5, 10, 20, 30, 50, 75, 100, 150, 200, 300),
+)
+
+CHROMA_SECONDS = Histogram(
+    "qwenify_chroma_operation_seconds",
+    "ChromaDB operation latency",
+    ["operation"],
+)
+
+MONGO_COMMAND_SECONDS = Histogram(
+    "qwenify_mongodb_command_seconds",
+    "MongoDB command latency as seen by the driver",
+    ["command"],
+)
+
+MONGO_COMMAND_FAILURES = Counter(
+    "qwenify_mongodb_command_failures_total",
+    "MongoDB commands that failed",
+    ["command"],
+)
+
+OUTBOUND_SECONDS = Histogram(
+    "qwenify_outbound_request_seconds",
+    "Latency of calls to external services",
+    ["service", "operation"],
+)
+
+OUTBOUND_ERRORS = Counter(
+    "qwenify_outbound_request_errors_total",
+    "Calls to external services that raised",
+    ["service", "operation"],
+)
+
+
+@contextmanager
+def outbound(service: str, operation: str):
+    """Time a call to an external service"""
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        OUTBOUND_ERRORS.inc(service=service, operation=operation)
+        raise
+    finally:
+        OUTBOUND_SECONDS.observe(
+            time.perf_counter() - started, service=service, operation=operation
+        )
+
+
+class MongoCommandTimer(monitoring.CommandListener):
+    """pymongo command listener feeding MONGO_COMMAND_SECONDS"""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        MONGO_COMMAND_SECONDS.observe(event.duration_micros / 1e6, command=event.command_name)
+
+    def failed(self, event):
+        MONGO_COMMAND_SECONDS.observe(event.duration_micros / 1e6, command=event.command_name)
+        MONGO_COMMAND_FAILURES.inc(command=event.command_name)
+
+
+# --- FLASK INTEGRATION ---
+
+
+def _start_timer():
+    g.metrics_started = time.perf_counter()
+
+
+def _observe_request(response):
+    started = g.pop("metrics_started", None)
+    if started is None:
+        return response
+    rule = request.url_rule.rule if request.url_rule else "unmatched"
+    labels = {"method": request.method, "route": rule, "status": str(response.status_code)}
+    # Runs once the body (including a streamed one) has been sent
+    response.call_on_close(
+        lambda: HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, **labels)
+    )
+    return response
+
+
+def metrics_endpoint():
+    if config.METRICS_TOKEN:
+        expected = f"Bearer {config.METRICS_TOKEN}"
+        if request.headers.get("Authorization") != expected:
+            return Response("Unauthorized\n", status=401, mimetype="text/plain")
+    return Response(render(), mimetype="text/plain; version=0.0.4")
+
+
+def init_metrics(app):
+    """Register request timing and the /metrics endpoint on a Flask app"""
+    app.before_request(_start_timer)
+    app.after_request(_observe_request)
+    app.add_url_rule("/metrics", "metrics", metrics_endpoint, methods=["GET"])
@@ -0,0 +1,13 @@
+"""
+One-off migration: move embedded `projects.workspace` data into the
+per-component workspace collections. Safe to re-run.
+"""
+
+from mongodb import ensure_indexes
+from workspace_store import migrate_all
+
+if __name__ == "__main__":
+    ensure_indexes()
+    print("Migrating embedded project workspaces...")
+    migrated = migrate_all()
+    print(f"Done! Migrated {migrated} project(s).")
@@ -1,9 +1,12 @@
 from pymongo import MongoClient
 import config
+import metrics
 
 # Initialize MongoDB Client
 print(f"Connecting to MongoDB...")
-mongo_client = MongoClient(config.MONGODB_URI)
+mongo_client = MongoClient(
+    config.MONGODB_URI, event_listeners=[metrics.MongoCommandTimer()]
+)
 
 # Get database and collections
 db = mongo_client["qwenify"]
@@ -12,10 +15,53 @@ users_collection = db["users"]
 chats_collection = db["chats"]
 channel_stats_collection = db["channel_stats"]
 
-# Create unique index on email for users
-users_collection.create_index("email", unique=True)
+# Workspace components, stored apart from the project document
+canvas_collection = db["project_canvas"]
+writing_collection = db["project_writing"]
+writing_revisions_collection = db["writing_revisions"]
+project_messages_collection = db["project_messages"]
+media_collection = db["project_media"]
+workspace_revisions_collection = db["workspace_revisions"]
+upload_sessions_collection = db["upload_sessions"]
 
-# Create index for channel stats queries
-channel_stats_collection.create_index([("userId", 1), ("recordedAt", -1)])
+# Media analysis: background jobs and results per (media, prompt)
+analysis_jobs_collection = db["analysis_jobs"]
+media_analyses_collection = db["media_analyses"]
+
+
+def ensure_indexes() -> None:
+    """
+    Check the connection and create indexes (no-ops when they exist).
+    Run during warm-up rather than at import, so a worker can boot while
+    MongoDB is still unreachable.
+    """
+    mongo_client.admin.command("ping")
+
+    # Create unique index on email for users
+    users_collection.create_index("email", unique=True)
+
+    # Create index for channel stats queries
+    channel_stats_collection.create_index([("userId", 1), ("recordedAt", -1)])
+
+    # Sidebar listing of standalone chats, newest first
+    chats_collection.create_index([("userId", 1), ("updatedAt", -1), ("_id", -1)])
+
+    # One canvas / writing document per project, many messages / media items
+    canvas_collection.create_index("projectId", unique=True)
+    writing_collection.create_index("projectId", unique=True)
+    writing_revisions_collection.create_index(
+        [("projectId", 1), ("revision", -1)], unique=True
+    )
+    project_messages_collection.create_index([("projectId", 1), ("timestamp", 1), ("_id", 1)])
+    media_collection.create_index([("projectId", 1), ("uploadedAt", 1)])
+    workspace_revisions_collection.create_index("projectId", unique=True)
+
+    # Abandoned resumable uploads expire after a day
+    upload_sessions_collection.create_index("createdAt", expireAfterSeconds=24 * 3600)
+
+    # Finished or abandoned analysis jobs expire after a day; results are kept
+    analysis_jobs_collection.create_index("createdAt", expireAfterSeconds=24 * 3600)
+    analysis_jobs_collection.create_index([("resultKey", 1), ("status", 1)])
+
+    print("MongoDB connected successfully!")
 
-print("MongoDB connected successfully!")
@@ -1,21 +1,41 @@
 import time
 import datetime
-import feedparser
-import requests
 import config
-from database import collection
+import metrics
+from database import get_collection
+from http_client import get_session, default_timeout
 
 def clear_existing_news():
     """Wipes old news to prevent stale data conflicts."""
     print("Clearing old news from database...")
     try:
-        collection.delete(where={"type": "news"})
+        with metrics.CHROMA_SECONDS.time(operation="delete"):
+            get_collection().delete(where={"type": "news"})
     except Exception as e:
         print(f"No existing news to clear or error: {e}")
 
+def rss_document(title, summary, date):
+    """Stored text of a Google News RSS entry"""
+    return f"[Published: {date}] Title: {title}. Summary: {summary}"
+
+
+def newsapi_document(article, pub_date):
+    """Stored text of a NewsAPI article"""
+    return f"""
+        [Published: {pub_date}]
+        SOURCE: {article['source']}
+        TITLE: {article['title']}
+        SUMMARY: {article['description']}
+        CONTENT: {article['content']}
+        """
+
+
 def fetch_and_store_news():
+    import feedparser
+
     print("Scraping Google News...")
-    feed = feedparser.parse(config.RSS_URL)
+    with metrics.outbound("google_news", "rss"):
+        feed = feedparser.parse(config.RSS_URL)
     news_data = []
     
     # Simple date string for today (since RSS pubDate parsing can be messy)
@@ -23,14 +43,15 @@ def fetch_and_store_news():
 
     # Get top 5
     for entry in feed.entries[:5]:
-        text = f"[Published: {today_str}] Title: {entry.title}. Summary: {entry.summary}"
+        text = rss_document(entry.title, entry.summary, today_str)
         # Store
         unique_id = f"news_{int(time.time())}_{feed.entries.index(entry)}"
-        collection.upsert(
-            ids=[unique_id], 
-            documents=[text],
-            metadatas=[{"type": "news", "title": entry.title, "date": today_str}]
-        )
+        with metrics.CHROMA_SECONDS.time(operation="upsert"):
+            get_collection().upsert(
+                ids=[unique_id], 
+                documents=[text],
+                metadatas=[{"type": "news", "title": entry.title, "date": today_str}]
+            )
         news_data.append(entry.title)
 
     return news_data
@@ -43,7 +64,8 @@ def fetch_newsapi_data():
     # 1. Get Local News (West Bengal)
     local_url = f"https://newsapi.org/v2/everything?q=West+Bengal+scheme&sortBy=publishedAt&apiKey={config.NEWS_API_KEY}"
     try:
-        local_resp = requests.get(local_url).json()
+        with metrics.outbound("newsapi", "everything"):
+            local_resp = get_session().get(local_url, timeout=default_timeout()).json()
         if local_resp.get("status") == "ok":
             for article in local_resp["articles"][:3]: # Get top 3 local
                 all_articles.append({
@@ -59,7 +81,8 @@ def fetch_newsapi_data():
     # 2. Get National News (India)
     national_url = f"https://newsapi.org/v2/top-headlines?country=in&category=general&apiKey={config.NEWS_API_KEY}"
     try:
-        nat_resp = requests.get(national_url).json()
+        with metrics.outbound("newsapi", "top-headlines"):
+            nat_resp = get_session().get(national_url, timeout=default_timeout()).json()
         if nat_resp.get("status") == "ok":
             for article in nat_resp["articles"][:3]: # Get top 3 national
                 all_articles.append({
@@ -78,21 +101,16 @@ def fetch_newsapi_data():
         # Format Date
         pub_date = article['publishedAt'][:10] if article['publishedAt'] else datetime.datetime.now().strftime("%Y-%m-%d")
         
-        full_text = f"""
-        [Published: {pub_date}]
-        SOURCE: {article['source']}
-        TITLE: {article['title']}
-        SUMMARY: {article['description']}
-        CONTENT: {article['content']}
-        """
+        full_text = newsapi_document(article, pub_date)
         
         unique_id = f"newsapi_{int(time.time())}_{idx}"
         
-        collection.upsert(
-            ids=[unique_id],
-            documents=[full_text],
-            metadatas=[{"type": "news", "title": article['title'], "date": pub_date}]
-        )
+        with metrics.CHROMA_SECONDS.time(operation="upsert"):
+            get_collection().upsert(
+                ids=[unique_id],
+                documents=[full_text],
+                metadatas=[{"type": "news", "title": article['title'], "date": pub_date}]
+            )
         titles.append(article['title'])
     
     return titles
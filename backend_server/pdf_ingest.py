@@ -1,10 +1,21 @@
 import os
 import datetime
-from pypdf import PdfReader
 import config
-from database import collection
+import metrics
+from database import get_collection
+
+def pdf_document(rel_path, page_number, text, date):
+    """Stored text of one PDF page"""
+    return f"""
+                            [Ingested: {date}]
+                            SOURCE: PDF Document ({rel_path}, Page {page_number})
+                            CONTENT: {text}
+                            """
+
 
 def ingest_local_pdfs():
+    from pypdf import PdfReader
+
     print(f"Scanning '{config.UPLOADS_DIR}' for PDFs...")
     processed_files = []
     
@@ -29,17 +40,14 @@ def ingest_local_pdfs():
                             rel_path = os.path.relpath(file_path, config.UPLOADS_DIR)
                             unique_id = f"pdf_{rel_path}_p{i}"
                             
-                            document_text = f"""
-                            [Ingested: {today_str}]
-                            SOURCE: PDF Document ({rel_path}, Page {i+1})
-                            CONTENT: {text}
-                            """
+                            document_text = pdf_document(rel_path, i + 1, text, today_str)
                             
-                            collection.upsert(
-                                ids=[unique_id],
-                                documents=[document_text],
-                                metadatas=[{"type": "pdf", "source": rel_path, "page": i+1, "date": today_str}]
-                            )
+                            with metrics.CHROMA_SECONDS.time(operation="upsert"):
+                                get_collection().upsert(
+                                    ids=[unique_id],
+                                    documents=[document_text],
+                                    metadatas=[{"type": "pdf", "source": rel_path, "page": i+1, "date": today_str}]
+                                )
                     processed_files.append(file)
                 except Exception as e:
                     print(f"Error processing {file}: {e}")
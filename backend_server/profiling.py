@@ -0,0 +1,240 @@
+"""
+Profiling Module
+Opt-in per-request sampling profiler with speedscope output.
+
+A request is profiled when it carries `X-Profile-Token: <PROFILE_TOKEN>` or
+is picked at random with probability PROFILE_SAMPLE_RATE. A background
+thread then samples the request thread's Python stack every
+PROFILE_INTERVAL seconds until the response is closed, so streamed
+generators (e.g. /chat) are covered to the last chunk. The request thread
+does no work per sample, which keeps overhead to the sampling itself.
+
+Profiles are written to PROFILE_DIR as speedscope files
+(https://www.speedscope.app) and listed by GET /profiles; download one with
+GET /profiles/<name>, or add ?format=collapsed for folded stacks that
+flamegraph.pl and similar tools read. Both endpoints need the same token
+header. Only the newest PROFILE_MAX_FILES profiles are kept.
+"""
+
+import os
+import sys
+import hmac
+import json
+import time
+import uuid
+import random
+import datetime
+import threading
+
+from flask import Response, g, request, jsonify, send_from_directory
+
+import config
+
+PROFILE_SUFFIX = ".speedscope.json"
+TOKEN_HEADER = "X-Profile-Token"
+EXCLUDED_PATHS = ("/profiles", "/metrics", "/healthz", "/readyz")
+
+
+class _Sampler:
+    """Samples one thread's stack from a background thread"""
+
+    def __init__(self, thread_id: int, name: str, title: str):
+        self.thread_id = thread_id
+        self.name = name
+        self.title = title
+        self._frames = []
+        self._frame_index = {}
+        self._samples = []
+        self._weights = []
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self, title: str = None) -> None:
+        if title:
+            self.title = title
+        self._stopped.set()
+
+    def _frame_id(self, code) -> int:
+        key = (code.co_name, code.co_filename, code.co_firstlineno)
+        index = self._frame_index.get(key)
+        if index is None:
+            index = self._frame_index[key] = len(self._frames)
+            self._frames.append({"name": key[0], "file": key[1], "line": key[2]})
+        return index
+
+    def _sample(self) -> list:
+        frame = sys._current_frames().get(self.thread_id)
+        stack = []
+        while frame is not None:
+            stack.append(self._frame_id(frame.f_code))
+            frame = frame.f_back
+        stack.reverse()
+        return stack
+
+    def _run(self) -> None:
+        started = last = time.perf_counter()
+        deadline = started + config.PROFILE_MAX_SECONDS
+        while not self._stopped.wait(config.PROFILE_INTERVAL):
+            now = time.perf_counter()
+            stack = self._sample()
+            if stack:
+                self._samples.append(stack)
+                self._weights.append(now - last)
+            last = now
+            if now > deadline:
+                break
+        try:
+            self._write(time.perf_counter() - started)
+        except Exception as e:
+            print(f"Failed to write profile {self.name}: {e}")
+
+    def _write(self, duration: float) -> None:
+        document = {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": self.title,
+            "exporter": "qwenify-profiler",
+            "shared": {"frames": self._frames},
+            "profiles": [
+                {
+                    "type": "sampled",
+                    "name": self.title,
+                    "unit": "seconds",
+                    "startValue": 0,
+                    "endValue": duration,
+                    "samples": self._samples,
+                    "weights": self._weights,
+                }
+            ],
+        }
+        os.makedirs(config.PROFILE_DIR, exist_ok=True)
+        path = os.path.join(config.PROFILE_DIR, self.name)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(document, f)
+        os.replace(tmp_path, path)
+        _prune()
+
+
+def _prune() -> None:
+    names = list_profiles()
+    for profile in names[config.PROFILE_MAX_FILES:]:
+        try:
+            os.remove(os.path.join(config.PROFILE_DIR, profile["name"]))
+        except OSError:
+            pass
+
+
+def list_profiles() -> list:
+    """Newest first: [{name, size, createdAt}]"""
+    if not os.path.isdir(config.PROFILE_DIR):
+        return []
+    profiles = []
+    for name in os.listdir(config.PROFILE_DIR):
+        if not name.endswith(PROFILE_SUFFIX):
+            continue
+        try:
+            stat = os.stat(os.path.join(config.PROFILE_DIR, name))
+        except OSError:
+            continue  # pruned meanwhile
+        profiles.append(
+            {
+                "name": name,
+                "size": stat.st_size,
+                "createdAt": datetime.datetime.utcfromtimestamp(stat.st_mtime).isoformat() + "Z",
+            }
+        )
+    profiles.sort(key=lambda p: p["name"], reverse=True)
+    return profiles
+
+
+def collapsed_stacks(document: dict) -> str:
+    """speedscope document -> folded stacks ("a;b;c <microseconds>" per line)"""
+    frames = document["shared"]["frames"]
+    totals = {}
+    for profile in document["profiles"]:
+        for stack, weight in zip(profile["samples"], profile["weights"]):
+            key = ";".join(frames[i]["name"] for i in stack)
+            totals[key] = totals.get(key, 0) + weight
+    return "".join(f"{stack} {int(weight * 1e6)}\n" for stack, weight in totals.items())
+
+
+# --- FLASK INTEGRATION ---
+
+
+def _has_token() -> bool:
+    supplied = request.headers.get(TOKEN_HEADER)
+    return bool(config.PROFILE_TOKEN and supplied) and hmac.compare_digest(
+        supplied, config.PROFILE_TOKEN
+    )
+
+
+def _should_profile() -> bool:
+    if request.path.startswith(EXCLUDED_PATHS):
+        return False
+    if _has_token():
+        return True
+    return config.PROFILE_SAMPLE_RATE > 0 and random.random() < config.PROFILE_SAMPLE_RATE
+
+
+def _start_profile():
+    if not _should_profile():
+        return
+    stamp = datetime.datetime.utcnow().strftime("%Y%m%dT%H%M%S")
+    slug = request.path.strip("/").replace("/", "_")[:60] or "root"
+    name = f"{stamp}-{uuid.uuid4().hex[:8]}-{request.method}-{slug}{PROFILE_SUFFIX}"
+    sampler = _Sampler(threading.get_ident(), name, f"{request.method} {request.path}")
+    sampler.start()
+    g.profile_sampler = sampler
+
+
+def _finish_profile(response):
+    sampler = g.pop("profile_sampler", None)
+    if sampler is None:
+        return response
+    title = f"{request.method} {request.path} {response.status_code}"
+    response.headers["X-Profile-Id"] = sampler.name
+    # Keep sampling while a streamed body is sent; stop once it is closed
+    response.call_on_close(lambda: sampler.stop(title))
+    return response
+
+
+def _stop_on_error(error=None):
+    # after_request does not run if the request failed before a response
+    sampler = g.pop("profile_sampler", None)
+    if sampler is not None:
+        sampler.stop()
+
+
+def profiles_index():
+    if not _has_token():
+        return jsonify({"error": "Profiling token required"}), 403
+    return jsonify({"profiles": list_profiles()})
+
+
+def profile_download(name):
+    if not _has_token():
+        return jsonify({"error": "Profiling token required"}), 403
+    if not name.endswith(PROFILE_SUFFIX):
+        return jsonify({"error": "Profile not found"}), 404
+    if request.args.get("format") == "collapsed":
+        path = os.path.join(config.PROFILE_DIR, os.path.basename(name))
+        if not os.path.isfile(path):
+            return jsonify({"error": "Profile not found"}), 404
+        with open(path, encoding="utf-8") as f:
+            document = json.load(f)
+        return Response(collapsed_stacks(document), mimetype="text/plain")
+    return send_from_directory(config.PROFILE_DIR, name, as_attachment=True)
+
+
+def init_profiling(app):
+    """Register the profiling hooks and the /profiles endpoints on a Flask app"""
+    app.before_request(_start_profile)
+    app.after_request(_finish_profile)
+    app.teardown_request(_stop_on_error)
+    app.add_url_rule("/profiles", "profiles_index", profiles_index, methods=["GET"])
+    app.add_url_rule(
+        "/profiles/<name>", "profile_download", profile_download, methods=["GET"]
+    )
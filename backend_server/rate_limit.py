@@ -0,0 +1,57 @@
+import time
+import threading
+
+
+class TokenBucketLimiter:
+    """
+    In-process token bucket limiter keyed by an arbitrary string
+    (client IP, email, user id, ...). Each key refills at `rate` tokens
+    per second up to `capacity`.
+    """
+
+    def __init__(self, rate: float, capacity: float, max_keys: int = 10000):
+        self.rate = rate
+        self.capacity = capacity
+        self.max_keys = max_keys
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def _refill(self, key: str, now: float) -> float:
+        tokens, last = self._buckets.get(key, (self.capacity, now))
+        return min(self.capacity, tokens + (now - last) * self.rate)
+
+    def consume(self, key: str, cost: float = 1.0):
+        """
+        Try to take `cost` tokens for `key`.
+        Returns: (allowed, retry_after_seconds)
+        """
+        now = time.monotonic()
+        with self._lock:
+            tokens = self._refill(key, now)
+            if tokens >= cost:
+                self._buckets[key] = (tokens - cost, now)
+                allowed, retry_after = True, 0.0
+            else:
+                self._buckets[key] = (tokens, now)
+                allowed = False
+                retry_after = (cost - tokens) / self.rate if self.rate > 0 else 60.0
+
+            if len(self._buckets) > self.max_keys:
+                self._evict_full(now)
+
+        return allowed, retry_after
+
+    def _evict_full(self, now: float):
+        """Drop buckets that have refilled completely (they carry no state)"""
+        full = [k for k in self._buckets if self._refill(k, now) >= self.capacity]
+        for k in full:
+            del self._buckets[k]
+
+
+def client_ip(request) -> str:
+    """
+    Client IP for rate limiting. X-Forwarded-For is client-controlled, so it
+    is only honoured through ProxyFix for TRUSTED_PROXY_COUNT hops (see
+    backend.py), which rewrites remote_addr.
+    """
+    return request.remote_addr or "unknown"
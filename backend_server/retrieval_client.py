@@ -0,0 +1,64 @@
+"""
+Retrieval Client
+Thin client for the shared retrieval service (retrieval_service.py).
+
+RemoteCollection mirrors the part of Chroma's Collection API the backend
+and ingest modules use (query, upsert, delete, count), so
+database.get_collection() can hand out either one.
+"""
+
+import config
+from http_client import get_session
+
+
+class RetrievalServiceError(Exception):
+    """Raised when the retrieval service is unreachable or rejects a call"""
+
+
+class RemoteCollection:
+    def __init__(self, base_url: str):
+        self.base_url = base_url.rstrip("/")
+
+    def _timeout(self):
+        return (config.HTTP_CONNECT_TIMEOUT, config.RETRIEVAL_TIMEOUT)
+
+    def _call(self, method: str, path: str, payload: dict = None) -> dict:
+        try:
+            response = get_session().request(
+                method, f"{self.base_url}{path}", json=payload, timeout=self._timeout()
+            )
+        except Exception as e:
+            raise RetrievalServiceError(f"Retrieval service unreachable: {e}") from e
+        if response.status_code != 200:
+            try:
+                message = response.json().get("error", response.text)
+            except ValueError:
+                message = response.text
+            raise RetrievalServiceError(f"Retrieval service error ({response.status_code}): {message}")
+        return response.json()
+
+    def query(self, query_texts, n_results: int = 10, where: dict = None) -> dict:
+        return self._call(
+            "POST",
+            "/query",
+            {"query_texts": list(query_texts), "n_results": n_results, "where": where},
+        )
+
+    def upsert(self, ids, documents=None, metadatas=None) -> None:
+        self._call(
+            "POST",
+            "/upsert",
+            {
+                "ids": list(ids),
+                "documents": list(documents) if documents is not None else None,
+                "metadatas": list(metadatas) if metadatas is not None else None,
+            },
+        )
+
+    def delete(self, ids=None, where: dict = None) -> None:
+        self._call(
+            "POST", "/delete", {"ids": list(ids) if ids is not None else None, "where": where}
+        )
+
+    def count(self) -> int:
+        return self._call("GET", "/count")["count"]
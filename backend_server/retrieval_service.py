@@ -0,0 +1,272 @@
+"""
+Retrieval Service
+One process owning the Chroma store and its embedding model.
+
+Every backend worker that opens Chroma itself holds its own copy of the
+index and the ONNX embedder, and concurrent workers write to the same
+SQLite-backed store. With RETRIEVAL_SERVICE_URL set, workers and the
+ingest modules use retrieval_client instead and this process does the work:
+
+  - queries arriving within RETRIEVAL_BATCH_WINDOW seconds (up to
+    RETRIEVAL_BATCH_MAX) are embedded and searched in one collection.query
+    call per `where` filter, then split back per caller
+  - upserts and deletes go through a single writer thread, which applies
+    them in arrival order and merges queued upserts into one call
+
+Run exactly one per host, on loopback:
+
+    python retrieval_service.py
+    # or: gunicorn -w 1 --threads 32 -b 127.0.0.1:5100 retrieval_service:app
+
+POST /query   {query_texts, n_results, where?} -> {ids, documents, metadatas, distances}
+POST /upsert  {ids, documents?, metadatas?}
+POST /delete  {ids?, where?}
+GET  /count, GET /healthz
+"""
+
+import json
+import time
+import queue
+import threading
+from concurrent.futures import Future
+
+from flask import Flask, request, jsonify
+
+import config
+import database
+
+RESULT_KEYS = ("ids", "documents", "metadatas", "distances")
+# Chroma rejects larger single calls on older SQLite builds
+DEFAULT_MAX_WRITE = 5000
+
+
+class _Batcher:
+    """
+    Hands submitted items to `handler` in batches: a batch closes `window`
+    seconds after its first item or at `max_items`. The handler resolves
+    each item's future.
+    """
+
+    def __init__(self, name: str, handler, window: float, max_items: int, workers: int = 1):
+        self.handler = handler
+        self.window = window
+        self.max_items = max_items
+        self._queue = queue.Queue()
+        for i in range(workers):
+            threading.Thread(target=self._run, name=f"{name}-{i}", daemon=True).start()
+
+    def submit(self, item) -> Future:
+        future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def _collect(self) -> list:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_items:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._collect()
+            try:
+                self.handler(batch)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+
+def _run_queries(batch: list) -> None:
+    collection = database.get_local_collection()
+    groups = {}
+    for item, future in batch:
+        key = json.dumps(item.get("where"), sort_keys=True)
+        groups.setdefault(key, []).append((item, future))
+
+    for members in groups.values():
+        texts, spans = [], []
+        for item, future in members:
+            spans.append((len(texts), len(item["query_texts"]), item["n_results"], future))
+            texts.extend(item["query_texts"])
+        try:
+            results = collection.query(
+                query_texts=texts,
+                n_results=max(span[2] for span in spans),
+                where=members[0][0].get("where") or None,
+            )
+        except Exception as e:
+            for *_, future in spans:
+                future.set_exception(e)
+            continue
+        for start, count, n_results, future in spans:
+            future.set_result(
+                {
+                    key: [row[:n_results] for row in results[key][start:start + count]]
+                    if results.get(key) is not None
+                    else None
+                    for key in RESULT_KEYS
+                }
+            )
+
+
+def _max_write() -> int:
+    client = database.get_client()
+    getter = getattr(client, "get_max_batch_size", None)
+    if getter:
+        return getter()
+    return getattr(client, "max_batch_size", DEFAULT_MAX_WRITE)
+
+
+def _apply_upserts(collection, members: list) -> None:
+    """Upsert several callers' items in one call, falling back per caller"""
+    ids, documents, metadatas = [], [], []
+    for item, _ in members:
+        count = len(item["ids"])
+        ids.extend(item["ids"])
+        documents.extend(item.get("documents") or [None] * count)
+        metadatas.extend(item.get("metadatas") or [None] * count)
+    try:
+        collection.upsert(ids=ids, documents=documents, metadatas=metadatas)
+    except Exception:
+        if len(members) == 1:
+            raise
+        # Don't let one bad item fail the others
+        for member in members:
+            try:
+                _apply_upserts(collection, [member])
+            except Exception as e:
+                member[1].set_exception(e)
+        return
+    for _, future in members:
+        future.set_result(None)
+
+
+def _run_writes(batch: list) -> None:
+    collection = database.get_local_collection()
+    limit = _max_write()
+    pending, pending_ids, pending_size = [], set(), 0
+
+    def flush():
+        nonlocal pending, pending_ids, pending_size
+        if pending:
+            try:
+                _apply_upserts(collection, pending)
+            except Exception as e:
+                pending[0][1].set_exception(e)
+        pending, pending_ids, pending_size = [], set(), 0
+
+    for item, future in batch:
+        if item["op"] == "delete":
+            flush()  # keep arrival order
+            try:
+                collection.delete(ids=item.get("ids"), where=item.get("where") or None)
+                future.set_result(None)
+            except Exception as e:
+                future.set_exception(e)
+            continue
+
+        ids = item["ids"]
+        # Chroma rejects duplicate ids within one call; a repeat must land after
+        if pending_ids.intersection(ids) or pending_size + len(ids) > limit:
+            flush()
+        pending.append((item, future))
+        pending_ids.update(ids)
+        pending_size += len(ids)
+    flush()
+
+
+_queries = _Batcher(
+    "retrieval-query",
+    _run_queries,
+    config.RETRIEVAL_BATCH_WINDOW,
+    config.RETRIEVAL_BATCH_MAX,
+    workers=config.RETRIEVAL_QUERY_WORKERS,
+)
+_writes = _Batcher(
+    "retrieval-write", _run_writes, config.RETRIEVAL_BATCH_WINDOW, config.RETRIEVAL_BATCH_MAX
+)
+
+
+# --- HTTP API ---
+
+app = Flask(__name__)
+
+
+def _wait(future: Future):
+    return future.result(timeout=config.RETRIEVAL_TIMEOUT)
+
+
+@app.route("/query", methods=["POST"])
+def query():
+    data = request.json or {}
+    texts = data.get("query_texts")
+    if not texts or not isinstance(texts, list):
+        return jsonify({"error": "query_texts is required"}), 400
+    item = {
+        "query_texts": texts,
+        "n_results": int(data.get("n_results") or 10),
+        "where": data.get("where"),
+    }
+    try:
+        return jsonify(_wait(_queries.submit(item)))
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/upsert", methods=["POST"])
+def upsert():
+    data = request.json or {}
+    ids = data.get("ids")
+    if not ids or not isinstance(ids, list):
+        return jsonify({"error": "ids is required"}), 400
+    for field in ("documents", "metadatas"):
+        if data.get(field) is not None and len(data[field]) != len(ids):
+            return jsonify({"error": f"{field} must match ids"}), 400
+    item = {
+        "op": "upsert",
+        "ids": ids,
+        "documents": data.get("documents"),
+        "metadatas": data.get("metadatas"),
+    }
+    try:
+        _wait(_writes.submit(item))
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    return jsonify({"status": "ok", "upserted": len(ids)})
+
+
+@app.route("/delete", methods=["POST"])
+def delete():
+    data = request.json or {}
+    if not data.get("ids") and not data.get("where"):
+        return jsonify({"error": "ids or where is required"}), 400
+    item = {"op": "delete", "ids": data.get("ids"), "where": data.get("where")}
+    try:
+        _wait(_writes.submit(item))
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    return jsonify({"status": "ok"})
+
+
+@app.route("/count", methods=["GET"])
+def count():
+    return jsonify({"count": database.get_local_collection().count()})
+
+
+@app.route("/healthz", methods=["GET"])
+def healthz():
+    return jsonify({"status": "ok"})
+
+
+if __name__ == "__main__":
+    # Load the store and embedder before taking traffic
+    database.get_local_collection().query(query_texts=["warm-up"], n_results=1)
+    app.run(host="127.0.0.1", port=config.RETRIEVAL_SERVICE_PORT, threaded=True)
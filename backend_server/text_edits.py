@@ -0,0 +1,76 @@
+"""
+Text Edits Module
+Anchored search/replace edits produced by the writing assistant.
+
+For edits to a long document the model returns only the changed passages
+instead of the whole text:
+
+    <<<<<<< SEARCH
+    exact passage from the document
+    =======
+    replacement passage
+    >>>>>>> REPLACE
+
+Each SEARCH passage must occur exactly once in the document at the time it
+is applied (blocks apply in order). An empty SEARCH appends REPLACE to the
+end, an empty REPLACE deletes the passage. Anything that does not apply
+cleanly raises EditError so the caller can fall back to a full rewrite.
+"""
+
+import re
+
+_EDIT_BLOCK = re.compile(
+    r"^<{7} SEARCH[ \t]*\n(.*?)^={7}[ \t]*\n(.*?)^>{7} REPLACE[ \t]*$",
+    re.DOTALL | re.MULTILINE,
+)
+
+INSTRUCTIONS = """
+4. You are editing the FULL DOCUMENT. Do NOT return the whole document. Return ONLY edit blocks in exactly this format, one block per change:
+<<<<<<< SEARCH
+exact passage copied from the document
+=======
+replacement passage
+>>>>>>> REPLACE
+5. The SEARCH passage must match the document character for character and occur only once; include neighbouring lines if needed to make it unique.
+6. To insert text, put an anchor line in SEARCH and repeat it in REPLACE together with the new text. To delete, leave REPLACE empty. To add to the end of the document, leave SEARCH empty.
+7. Output nothing outside the edit blocks."""
+
+
+class EditError(Exception):
+    """Raised when edit blocks are missing or do not apply to the document"""
+
+
+def _strip_block_newline(text: str) -> str:
+    # The newline before the marker line belongs to the format, not the text
+    return text[:-1] if text.endswith("\n") else text
+
+
+def parse_edits(output: str) -> list:
+    """Returns: [(search, replace)] in the order they appear"""
+    edits = [
+        (_strip_block_newline(search), _strip_block_newline(replace))
+        for search, replace in _EDIT_BLOCK.findall(output.replace("\r\n", "\n"))
+    ]
+    if not edits:
+        raise EditError("No edit blocks in model output")
+    return edits
+
+
+def apply_edits(text: str, edits: list) -> str:
+    for search, replace in edits:
+        if not search:
+            separator = "\n" if text and not text.endswith("\n") else ""
+            text = f"{text}{separator}{replace}"
+            continue
+
+        count = text.count(search)
+        if count != 1:
+            problem = "not found" if count == 0 else f"found {count} times"
+            raise EditError(f"Edit anchor {problem}: {search[:60]!r}")
+        text = text.replace(search, replace, 1)
+    return text
+
+
+def apply_output(text: str, output: str) -> str:
+    """Parse and apply model output in one step"""
+    return apply_edits(text, parse_edits(output))
@@ -0,0 +1,75 @@
+import time
+import threading
+from collections import OrderedDict
+
+
+class TTLCache:
+    """
+    Small thread-safe LRU cache where every entry carries its own expiry.
+    An optional `on_evict(key, value)` callback runs for expired or
+    displaced entries (outside the lock).
+    """
+
+    def __init__(self, maxsize: int = 1024, on_evict=None):
+        self.maxsize = maxsize
+        self.on_evict = on_evict
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        evicted = None
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                evicted = [(key, value)]
+                value = default
+            else:
+                self._data.move_to_end(key)
+        if evicted:
+            self._notify(evicted)
+        return value
+
+    def set(self, key, value, ttl: float):
+        if ttl <= 0:
+            return
+        evicted = []
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None and old[0] is not value:
+                evicted.append((key, old[0]))
+            self._data[key] = (value, time.monotonic() + ttl)
+            while len(self._data) > self.maxsize:
+                old_key, (old_value, _) = self._data.popitem(last=False)
+                evicted.append((old_key, old_value))
+        self._notify(evicted)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._data.pop(key, None)
+        return entry[0] if entry else default
+
+    def purge_expired(self):
+        """Drop expired entries; returns how many were removed"""
+        now = time.monotonic()
+        with self._lock:
+            expired = [(k, v) for k, (v, exp) in self._data.items() if exp <= now]
+            for k, _ in expired:
+                del self._data[k]
+        self._notify(expired)
+        return len(expired)
+
+    def __len__(self):
+        return len(self._data)
+
+    def _notify(self, items):
+        if not self.on_evict:
+            return
+        for key, value in items:
+            try:
+                self.on_evict(key, value)
+            except Exception as e:
+                print(f"Cache eviction callback failed for {key}: {e}")
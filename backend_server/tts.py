@@ -1,5 +1,4 @@
 import asyncio
-import edge_tts
 import io
 
 # Selected Voice: English (US) - Guy - Neural
@@ -7,6 +6,8 @@ import io
 VOICE = "en-US-GuyNeural"
 
 async def _generate_audio(text):
+    import edge_tts  # deferred: only needed once speech is requested
+
     communicate = edge_tts.Communicate(text, VOICE)
     audio_stream = io.BytesIO()
     
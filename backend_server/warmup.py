@@ -0,0 +1,113 @@
+"""
+Warm-up Module
+Deferred start-up work and the health endpoints.
+
+Importing the backend does no I/O: heavy libraries are imported and clients
+created on first use, behind accessors. Warm-up then runs those first uses
+in a background thread, so a worker starts serving immediately and a
+missing dependency degrades readiness instead of crashing the boot.
+
+Steps are registered with a name and marked required or optional. Failed
+steps are retried until they succeed, first after WARMUP_RETRY_INTERVAL
+seconds and then backing off to once a minute.
+
+  GET /healthz  liveness: the process is up and serving (always 200)
+  GET /readyz   readiness: 200 once every required step has succeeded,
+                503 before that; both list the status of each step
+
+With WARMUP_ON_START off, the steps start on the first /readyz call instead,
+so readiness still converges once a probe asks for it.
+"""
+
+import time
+import threading
+
+from flask import jsonify
+
+import config
+
+MAX_RETRY_INTERVAL = 60
+
+_steps = []
+_status = {}
+_lock = threading.Lock()
+_thread = None
+_started_at = time.time()
+
+
+def register(name: str, step, required: bool = True) -> None:
+    """Add a warm-up step (a callable that raises on failure)"""
+    with _lock:
+        _steps.append((name, step, required))
+        _status[name] = {"ready": False, "required": required, "error": None, "seconds": None}
+
+
+def _run_step(name: str, step) -> bool:
+    started = time.perf_counter()
+    try:
+        step()
+    except Exception as e:
+        print(f"Warm-up step '{name}' failed: {e}")
+        with _lock:
+            _status[name].update({"ready": False, "error": str(e)})
+        return False
+    with _lock:
+        _status[name].update(
+            {"ready": True, "error": None, "seconds": round(time.perf_counter() - started, 3)}
+        )
+    return True
+
+
+def _run() -> None:
+    pending = list(_steps)
+    delay = config.WARMUP_RETRY_INTERVAL
+    while pending:
+        pending = [
+            (name, step, required)
+            for name, step, required in pending
+            if not _run_step(name, step)
+        ]
+        if pending:
+            time.sleep(delay)
+            delay = min(delay * 2, MAX_RETRY_INTERVAL)
+    print(f"Warm-up complete in {time.time() - _started_at:.1f}s")
+
+
+def start() -> None:
+    """Run the registered steps in the background (once)"""
+    global _thread
+    with _lock:
+        if _thread is not None:
+            return
+        _thread = threading.Thread(target=_run, name="warmup", daemon=True)
+    _thread.start()
+
+
+def is_ready() -> bool:
+    with _lock:
+        return all(s["ready"] for s in _status.values() if s["required"])
+
+
+def status() -> dict:
+    with _lock:
+        return {name: dict(s) for name, s in _status.items()}
+
+
+# --- FLASK INTEGRATION ---
+
+
+def healthz():
+    return jsonify({"status": "ok", "uptime": round(time.time() - _started_at, 1)})
+
+
+def readyz():
+    start()  # no-op once started
+    ready = is_ready()
+    body = {"status": "ready" if ready else "starting", "checks": status()}
+    return jsonify(body), 200 if ready else 503
+
+
+def init_health(app):
+    """Register /healthz and /readyz on a Flask app"""
+    app.add_url_rule("/healthz", "healthz", healthz, methods=["GET"])
+    app.add_url_rule("/readyz", "readyz", readyz, methods=["GET"])
@@ -0,0 +1,247 @@
+"""
+Workspace Store Module
+Per-project workspace components (canvas, writing, chat messages, media)
+kept in their own collections instead of one growing `projects` document.
+Canvas and writing persistence live in canvas_store.py and writing_store.py.
+Projects still carrying the legacy embedded `workspace` field are migrated
+lazily on first access, or in bulk via migrate_workspace.py.
+"""
+
+from bson import ObjectId
+from pymongo import UpdateOne
+
+from mongodb import (
+    projects_collection,
+    canvas_collection,
+    writing_collection,
+    writing_revisions_collection,
+    project_messages_collection,
+    media_collection,
+    workspace_revisions_collection,
+)
+from ttl_cache import TTLCache
+
+# Projects known to exist with no legacy embedded workspace left. Entries
+# can outlive a project deleted through another worker, so writes don't
+# trust them for existence (see ensure_project).
+_migrated_projects = TTLCache(maxsize=10000)
+MIGRATED_CACHE_TTL = 24 * 3600
+
+
+def migrate_project(project_id: str, workspace: dict) -> None:
+    """
+    Copy a legacy embedded workspace into the component collections.
+    Every write is idempotent, so concurrent or repeated migrations of
+    the same project are harmless, and newer saves are never clobbered.
+    """
+    if "canvas" in workspace:
+        canvas_collection.update_one(
+            {"projectId": project_id},
+            {"$setOnInsert": {"canvas": workspace["canvas"]}},
+            upsert=True,
+        )
+
+    if "writing" in workspace:
+        writing_collection.update_one(
+            {"projectId": project_id},
+            {"$setOnInsert": {"writing": workspace["writing"]}},
+            upsert=True,
+        )
+
+    messages = workspace.get("chatHistory") or []
+    if messages:
+        project_messages_collection.bulk_write(
+            [
+                UpdateOne(
+                    {"_id": f"{project_id}-m{i}"},
+                    {"$setOnInsert": {**message, "projectId": project_id}},
+                    upsert=True,
+                )
+                for i, message in enumerate(messages)
+            ],
+            ordered=False,
+        )
+
+    media = workspace.get("media") or []
+    if media:
+        media_collection.bulk_write(
+            [
+                UpdateOne(
+                    {"_id": f"{project_id}-media{i}"},
+                    {"$setOnInsert": {**item, "projectId": project_id}},
+                    upsert=True,
+                )
+                for i, item in enumerate(media)
+            ],
+            ordered=False,
+        )
+
+    projects_collection.update_one(
+        {"_id": ObjectId(project_id)}, {"$unset": {"workspace": ""}}
+    )
+
+
+def ensure_project(project_id: str, write: bool = False) -> bool:
+    """
+    Check that a project exists, migrating its embedded workspace first if
+    it still has one. Cached per process, so steady-state reads cost
+    nothing. With `write`, existence is always confirmed in the database,
+    so a save never upserts components for a project that was deleted.
+    """
+    if not write and _migrated_projects.get(project_id):
+        return True
+
+    # Only pull the embedded workspace when there is one to migrate
+    project = projects_collection.find_one(
+        {"_id": ObjectId(project_id)},
+        {"_id": 1, "legacy": {"$ne": [{"$type": "$workspace"}, "missing"]}},
+    )
+    if not project:
+        return False
+
+    if project.get("legacy"):
+        legacy = projects_collection.find_one(
+            {"_id": ObjectId(project_id)}, {"workspace": 1}
+        )
+        if legacy and "workspace" in legacy:
+            migrate_project(project_id, legacy["workspace"])
+
+    _migrated_projects.set(project_id, True, MIGRATED_CACHE_TTL)
+    return True
+
+
+def migrate_all() -> int:
+    """Migrate every project that still has an embedded workspace"""
+    count = 0
+    for project in projects_collection.find(
+        {"workspace": {"$exists": True}}, {"workspace": 1}
+    ):
+        migrate_project(str(project["_id"]), project["workspace"])
+        count += 1
+    return count
+
+
+# --- REVISION COUNTERS ---
+
+
+def get_revision(project_id: str, component: str) -> int:
+    """Revision counter for an append-only component ("chat" or "media")"""
+    doc = workspace_revisions_collection.find_one(
+        {"projectId": project_id}, {component: 1}
+    )
+    return doc.get(component, 0) if doc else 0
+
+
+def bump_revision(project_id: str, component: str) -> None:
+    workspace_revisions_collection.update_one(
+        {"projectId": project_id}, {"$inc": {component: 1}}, upsert=True
+    )
+
+
+# --- CHAT MESSAGES ---
+
+
+def _message_id(message_id: str):
+    """Messages have ObjectIds, except migrated ones which keep string ids"""
+    return ObjectId(message_id) if ObjectId.is_valid(message_id) else message_id
+
+
+class InvalidCursor(Exception):
+    """Raised when a chat page cursor cannot be parsed"""
+
+
+def get_chat_page(project_id: str, before: str = None, limit: int = 50):
+    """
+    A page of messages older than the `before` cursor ("<timestamp>_<id>" of
+    the oldest message on the previous page), oldest first, without the
+    (potentially large) reasoning `thought` text. The id breaks ties between
+    messages saved with the same timestamp.
+    Returns: (messages, next_cursor or None when there is nothing older)
+    """
+    query = {"projectId": project_id}
+    if before:
+        timestamp, _, last_id = before.rpartition("_")
+        if not timestamp or not last_id:
+            raise InvalidCursor(before)
+        last_id = _message_id(last_id)
+        older = [
+            {"timestamp": {"$lt": timestamp}},
+            {"timestamp": timestamp, "_id": {"$lt": last_id}},
+        ]
+        if isinstance(last_id, ObjectId):
+            # Migrated string ids sort below every ObjectId, but $lt only
+            # compares within one type
+            older.append({"timestamp": timestamp, "_id": {"$type": "string"}})
+        query["$or"] = older
+
+    cursor = (
+        project_messages_collection.find(
+            query,
+            {
+                "role": 1,
+                "content": 1,
+                "timestamp": 1,
+                "hasThought": {
+                    "$gt": [{"$strLenCP": {"$ifNull": ["$thought", ""]}}, 0]
+                },
+            },
+        )
+        .sort([("timestamp", -1), ("_id", -1)])
+        .limit(limit + 1)
+    )
+    docs = list(cursor)
+
+    has_more = len(docs) > limit
+    docs = list(reversed(docs[:limit]))
+    for doc in docs:
+        doc["id"] = str(doc.pop("_id"))
+
+    next_cursor = f"{docs[0]['timestamp']}_{docs[0]['id']}" if has_more and docs else None
+    return docs, next_cursor
+
+
+def get_message_thought(project_id: str, message_id: str):
+    """Reasoning text for one message, or None if the message does not exist"""
+    doc = project_messages_collection.find_one(
+        {"_id": _message_id(message_id), "projectId": project_id}, {"thought": 1}
+    )
+    return doc.get("thought", "") if doc else None
+
+
+def add_chat_messages(project_id: str, messages: list) -> list:
+    """Insert messages in one round trip; returns their ids"""
+    result = project_messages_collection.insert_many(
+        [{**message, "projectId": project_id} for message in messages]
+    )
+    bump_revision(project_id, "chat")
+    return [str(i) for i in result.inserted_ids]
+
+
+# --- MEDIA ---
+
+
+def get_media(project_id: str) -> list:
+    return list(
+        media_collection.find(
+            {"projectId": project_id}, {"_id": 0, "projectId": 0}
+        ).sort("uploadedAt", 1)
+    )
+
+
+def add_media(project_id: str, media_entry: dict) -> None:
+    media_collection.insert_one({**media_entry, "projectId": project_id})
+    bump_revision(project_id, "media")
+
+
+def delete_workspace(project_id: str) -> None:
+    """Remove every workspace component belonging to a project"""
+    for collection in (
+        canvas_collection,
+        writing_collection,
+        writing_revisions_collection,
+        project_messages_collection,
+        media_collection,
+        workspace_revisions_collection,
+    ):
+        collection.delete_many({"projectId": project_id})
+    _migrated_projects.pop(project_id)
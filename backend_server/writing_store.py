@@ -0,0 +1,197 @@
+"""
+Writing Store Module
+Patch-based persistence and revision history for the writing area.
+
+Every save is one document in `writing_revisions`:
+  {projectId, revision, ops, length, checkpoint?, createdAt}
+
+`ops` is a list of [position, deleteCount, insertText] splices applied in
+order. Positions and lengths count UTF-16 code units, matching JavaScript
+string indices on the client. Every WRITING_CHECKPOINT_EVERY revisions the
+full text is stored as `checkpoint`, so any revision is rebuilt by
+replaying at most that many patches. The unique (projectId, revision)
+index is the optimistic-concurrency check: two saves against the same
+base cannot both insert the next revision.
+
+Content saved before revisions existed lives in `project_writing.writing`
+and is treated as revision 0.
+"""
+
+import datetime
+
+from pymongo.errors import DuplicateKeyError
+
+import config
+from mongodb import writing_collection, writing_revisions_collection
+
+
+class RevisionConflict(Exception):
+    """Raised when a patch is based on a stale writing revision"""
+
+    def __init__(self, revision: int):
+        super().__init__(f"Document is at revision {revision}")
+        self.revision = revision
+
+
+class InvalidPatch(Exception):
+    """Raised when patch operations do not fit the base document"""
+
+
+# --- UTF-16 HELPERS ---
+
+
+def _utf16_len(text: str) -> int:
+    return len(text.encode("utf-16-le")) // 2
+
+
+def apply_ops(text: str, ops: list) -> str:
+    """Apply [position, deleteCount, insertText] splices using UTF-16 offsets"""
+    buf = text.encode("utf-16-le")
+    for op in ops:
+        pos, delete_count, insert = _validate_op(op, len(buf) // 2)
+        start, end = pos * 2, (pos + delete_count) * 2
+        try:
+            encoded = insert.encode("utf-16-le")
+        except UnicodeEncodeError:
+            raise InvalidPatch("insertText contains half of a surrogate pair")
+        buf = buf[:start] + encoded + buf[end:]
+    try:
+        return buf.decode("utf-16-le")
+    except UnicodeDecodeError:
+        raise InvalidPatch("Patch splits a surrogate pair")
+
+
+def _validate_op(op, length: int):
+    try:
+        pos, delete_count, insert = op
+    except (TypeError, ValueError):
+        raise InvalidPatch("Each op must be [position, deleteCount, insertText]")
+    if not isinstance(pos, int) or not isinstance(delete_count, int):
+        raise InvalidPatch("Position and deleteCount must be integers")
+    if not isinstance(insert, str):
+        raise InvalidPatch("insertText must be a string")
+    if pos < 0 or delete_count < 0 or pos + delete_count > length:
+        raise InvalidPatch("Op is out of range for the base document")
+    return pos, delete_count, insert
+
+
+# --- REVISION LOOKUP ---
+
+
+def _legacy_text(project_id: str) -> str:
+    doc = writing_collection.find_one({"projectId": project_id}, {"writing": 1})
+    return doc.get("writing", "") if doc else ""
+
+
+def latest_revision(project_id: str) -> int:
+    doc = writing_revisions_collection.find_one(
+        {"projectId": project_id}, {"revision": 1}, sort=[("revision", -1)]
+    )
+    return doc["revision"] if doc else 0
+
+
+def get_writing(project_id: str, revision: int = None):
+    """
+    Rebuild a revision (latest by default) from the nearest checkpoint.
+    Returns: (text, revision), or (None, revision) if it does not exist.
+    """
+    if revision is None:
+        revision = latest_revision(project_id)
+    if revision == 0:
+        return _legacy_text(project_id), 0
+
+    checkpoint = writing_revisions_collection.find_one(
+        {
+            "projectId": project_id,
+            "revision": {"$lte": revision},
+            "checkpoint": {"$exists": True},
+        },
+        {"revision": 1, "checkpoint": 1},
+        sort=[("revision", -1)],
+    )
+    if checkpoint:
+        text, base = checkpoint["checkpoint"], checkpoint["revision"]
+    else:
+        text, base = _legacy_text(project_id), 0
+
+    replayed = base
+    for doc in writing_revisions_collection.find(
+        {"projectId": project_id, "revision": {"$gt": base, "$lte": revision}},
+        {"revision": 1, "ops": 1},
+    ).sort("revision", 1):
+        text = apply_ops(text, doc.get("ops", []))
+        replayed = doc["revision"]
+
+    if replayed != revision:
+        return None, revision
+    return text, revision
+
+
+def list_revisions(project_id: str, limit: int = 50) -> list:
+    """Most recent revisions (metadata only)"""
+    return list(
+        writing_revisions_collection.find(
+            {"projectId": project_id},
+            {"_id": 0, "revision": 1, "length": 1, "createdAt": 1},
+        )
+        .sort("revision", -1)
+        .limit(limit)
+    )
+
+
+# --- SAVES ---
+
+
+def _insert_revision(project_id: str, revision: int, fields: dict) -> None:
+    try:
+        writing_revisions_collection.insert_one(
+            {
+                "projectId": project_id,
+                "revision": revision,
+                "createdAt": datetime.datetime.now().isoformat(),
+                **fields,
+            }
+        )
+    except DuplicateKeyError:
+        raise RevisionConflict(latest_revision(project_id))
+
+
+def apply_patch(project_id: str, base_revision: int, ops: list, length: int = None) -> int:
+    """
+    Store ops against `base_revision` as the next revision.
+    `length`, when given, is the client's resulting length and must match.
+    Returns the new revision.
+    """
+    base_text, _ = get_writing(project_id, base_revision)
+    if base_text is None:
+        raise RevisionConflict(latest_revision(project_id))
+
+    # Apply against the real base text, not just its length: a stored op
+    # that cannot be replayed would break every later read
+    text = apply_ops(base_text, ops)
+    new_length = _utf16_len(text)
+    if length is not None and length != new_length:
+        raise InvalidPatch("Resulting length does not match")
+
+    new_revision = base_revision + 1
+    fields = {"ops": ops, "length": new_length}
+    if new_revision % config.WRITING_CHECKPOINT_EVERY == 0:
+        fields["checkpoint"] = text
+    _insert_revision(project_id, new_revision, fields)
+    return new_revision
+
+
+def save_full(project_id: str, text: str) -> int:
+    """Store a full document as a new checkpoint revision (full-save fallback)"""
+    while True:
+        new_revision = latest_revision(project_id) + 1
+        try:
+            _insert_revision(
+                project_id,
+                new_revision,
+                {"ops": [], "length": _utf16_len(text), "checkpoint": text},
+            )
+            return new_revision
+        except RevisionConflict:
+            continue
+
@@ -7,20 +7,30 @@ Handles YouTube Data API integration for fetching channel statistics,
 import io
 import base64
 import datetime
-from googleapiclient.discovery import build
-from googleapiclient.errors import HttpError
-import matplotlib
-matplotlib.use('Agg')  # Use non-interactive backend
-import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
-import numpy as np
 
 import config
+import metrics
 from mongodb import users_collection, channel_stats_collection
 
 
+def _pyplot():
+    """matplotlib is slow to import, so it is loaded on first use"""
+    import matplotlib
+    matplotlib.use('Agg')  # Use non-interactive backend
+    import matplotlib.pyplot as plt
+    import matplotlib.dates as mdates
+    return plt, mdates
+
+
+def warm_up():
+    """Import matplotlib (and build its font cache) ahead of the first graph"""
+    _pyplot()
+
+
 def get_youtube_service():
     """Initialize YouTube Data API service"""
+    from googleapiclient.discovery import build
+
     if not config.YOUTUBE_API_KEY:
         raise ValueError("YouTube API key not configured")
     return build('youtube', 'v3', developerKey=config.YOUTUBE_API_KEY)
@@ -31,6 +41,8 @@ def get_channel_stats(channel_id: str) -> dict:
     Fetch real-time channel statistics from YouTube API
     Returns: {subscribers, views, videoCount, subscriberHidden, title, thumbnail}
     """
+    from googleapiclient.errors import HttpError
+
     try:
         youtube = get_youtube_service()
         
@@ -38,7 +50,8 @@ def get_channel_stats(channel_id: str) -> dict:
             part='statistics,snippet',
             id=channel_id
         )
-        response = request.execute()
+        with metrics.outbound("youtube", "channels.list"):
+            response = request.execute()
         
         if not response.get('items'):
             return None
@@ -190,6 +203,8 @@ def generate_growth_graph(user_id: str) -> str:
     subscribers = [h['subscribers'] for h in history]
     views = [h['views'] for h in history]
     
+    plt, mdates = _pyplot()
+
     # Create figure with dark theme
     plt.style.use('dark_background')
     fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(10, 6), facecolor='#0a0a0a')
@@ -28,6 +28,7 @@ import { Link, useNavigate } from "react-router-dom";
 import { useAuth } from "../../context/AuthContext";
 
 const API_BASE_URL = import.meta.env.VITE_API_BASE_URL;
+const HISTORY_PAGE_SIZE = 50;
 
 // Helper to convert LaTeX delimiters to Markdown delimiters
 const preprocessLaTeX = (content) => {
@@ -54,9 +55,12 @@ function AIChat({ hideSidebar = false, projectId = null }) {
   const [loading, setLoading] = useState(false);
   const [newsLoading, setNewsLoading] = useState(false);
   const [historyLoading, setHistoryLoading] = useState(false);
+  const [olderCursor, setOlderCursor] = useState(null);
+  const [olderLoading, setOlderLoading] = useState(false);
 
   // Standalone chat session state
   const [chatSessions, setChatSessions] = useState([]);
+  const [sessionsCursor, setSessionsCursor] = useState(null);
   const [currentChatId, setCurrentChatId] = useState(null);
   const [editingChatId, setEditingChatId] = useState(null);
   const [editingTitle, setEditingTitle] = useState("");
@@ -64,8 +68,14 @@ function AIChat({ hideSidebar = false, projectId = null }) {
 
   const messagesEndRef = useRef(null);
   const containerRef = useRef(null);
+  const skipScrollRef = useRef(false);
 
   const scrollToBottom = () => {
+    // Prepending older messages should keep the reader where they are
+    if (skipScrollRef.current) {
+      skipScrollRef.current = false;
+      return;
+    }
     messagesEndRef.current?.scrollIntoView({ behavior: "smooth" });
   };
 
@@ -111,13 +121,16 @@ function AIChat({ hideSidebar = false, projectId = null }) {
     }
   }, [projectId, isAuthenticated, hideSidebar]);
 
-  const fetchRecentChatSessions = async () => {
+  // Pass a cursor to append the next page; without one the list is reloaded
+  const fetchRecentChatSessions = async (cursor = null) => {
     try {
-      const response = await fetch(`${API_BASE_URL}/chats`, {
+      const params = cursor ? `?${new URLSearchParams({ before: cursor })}` : "";
+      const response = await fetch(`${API_BASE_URL}/chats${params}`, {
         headers: { "Authorization": `Bearer ${token}` }
       });
       const data = await response.json();
-      setChatSessions(data);
+      setChatSessions((prev) => (cursor ? [...prev, ...data.chats] : data.chats));
+      setSessionsCursor(data.nextCursor);
     } catch (e) {
       console.error("Error fetching sessions:", e);
     }
@@ -133,7 +146,7 @@ function AIChat({ hideSidebar = false, projectId = null }) {
     setHistoryLoading(true);
     try {
       const url = projectId
-        ? `${API_BASE_URL}/projects/${projectId}/workspace/chat`
+        ? `${API_BASE_URL}/projects/${projectId}/workspace/chat?limit=${HISTORY_PAGE_SIZE}`
         : `${API_BASE_URL}/chats/${currentChatId}`;
 
       const response = await fetch(url, {
@@ -142,6 +155,7 @@ function AIChat({ hideSidebar = false, projectId = null }) {
       const data = await response.json();
 
       const history = projectId ? data.chatHistory : data.messages;
+      setOlderCursor(projectId ? data.nextCursor : null);
       if (history && history.length > 0) {
         setMessages(history);
       } else {
@@ -155,6 +169,37 @@ function AIChat({ hideSidebar = false, projectId = null }) {
     }
   };
 
+  const loadOlderMessages = async () => {
+    if (!projectId || !olderCursor) return;
+
+    setOlderLoading(true);
+    try {
+      const params = new URLSearchParams({ before: olderCursor, limit: HISTORY_PAGE_SIZE });
+      const response = await fetch(
+        `${API_BASE_URL}/projects/${projectId}/workspace/chat?${params}`,
+        { headers: { "Authorization": `Bearer ${token}` } }
+      );
+      const data = await response.json();
+      skipScrollRef.current = true;
+      setMessages((prev) => [...data.chatHistory, ...prev]);
+      setOlderCursor(data.nextCursor);
+    } catch (error) {
+      console.error("Error loading older messages:", error);
+    } finally {
+      setOlderLoading(false);
+    }
+  };
+
+  // Reasoning text is not part of the history page; fetch it when expanded
+  const fetchThought = async (messageId) => {
+    const response = await fetch(
+      `${API_BASE_URL}/projects/${projectId}/workspace/chat/${messageId}/thought`,
+      { headers: { "Authorization": `Bearer ${token}` } }
+    );
+    const data = await response.json();
+    return data.thought || "";
+  };
+
   const startNewStandaloneChat = () => {
     setCurrentChatId(null);
     setMessages([DEFAULT_MESSAGE]);
@@ -200,62 +245,50 @@ function AIChat({ hideSidebar = false, projectId = null }) {
     }
   };
 
-  const saveChatMessage = async (message, existingChatId = null) => {
-    const targetChatId = existingChatId || currentChatId;
+  // Standalone chats need a session before the turn can be saved
+  const ensureChatSession = async (firstMessage) => {
+    if (projectId || !isAuthenticated) return null;
+    if (currentChatId) return currentChatId;
 
-    // 1. If inside a project
-    if (projectId) {
-      try {
-        await fetch(`${API_BASE_URL}/projects/${projectId}/workspace/chat`, {
-          method: "POST",
-          headers: {
-            "Content-Type": "application/json",
-            "Authorization": `Bearer ${token}`
-          },
-          body: JSON.stringify(message),
-        });
-      } catch (error) {
-        console.error("Error saving project chat message:", error);
-      }
+    try {
+      const createRes = await fetch(`${API_BASE_URL}/chats`, {
+        method: "POST",
+        headers: {
+          "Content-Type": "application/json",
+          "Authorization": `Bearer ${token}`
+        },
+        body: JSON.stringify({ title: firstMessage.content.substring(0, 30) })
+      });
+      const newChat = await createRes.json();
+      setCurrentChatId(newChat._id);
+      return newChat._id;
+    } catch (e) {
+      console.error("Error creating chat session:", e);
       return null;
     }
+  };
 
-    // 2. If standalone chat
-    if (!isAuthenticated) return null;
+  // Persist a whole turn (user + AI message) in a single request
+  const saveChatTurn = async (turnMessages, chatId) => {
+    const url = projectId
+      ? `${API_BASE_URL}/projects/${projectId}/workspace/chat`
+      : chatId
+        ? `${API_BASE_URL}/chats/${chatId}/messages`
+        : null;
+    if (!url) return;
 
     try {
-      let chatId = targetChatId;
-
-      // Create new session if none exists
-      if (!chatId) {
-        const createRes = await fetch(`${API_BASE_URL}/chats`, {
-          method: "POST",
-          headers: {
-            "Content-Type": "application/json",
-            "Authorization": `Bearer ${token}`
-          },
-          body: JSON.stringify({ title: message.content.substring(0, 30) })
-        });
-        const newChat = await createRes.json();
-        chatId = newChat._id;
-        setCurrentChatId(chatId);
-        fetchRecentChatSessions(); // Refresh list
-      }
-
-      // Add message to session
-      await fetch(`${API_BASE_URL}/chats/${chatId}/message`, {
+      await fetch(url, {
         method: "POST",
         headers: {
           "Content-Type": "application/json",
           "Authorization": `Bearer ${token}`
         },
-        body: JSON.stringify(message),
+        body: JSON.stringify({ messages: turnMessages }),
       });
-
-      return chatId;
-    } catch (e) {
-      console.error("Error saving standalone chat message:", e);
-      return null;
+      if (!projectId) fetchRecentChatSessions(); // Refresh titles and order
+    } catch (error) {
+      console.error("Error saving chat turn:", error);
     }
   };
 
@@ -278,10 +311,18 @@ function AIChat({ hideSidebar = false, projectId = null }) {
     try {
       const response = await fetch(`${import.meta.env.VITE_API_BASE_URL}/tts`, {
         method: "POST",
-        headers: { "Content-Type": "application/json" },
+        headers: {
+          "Content-Type": "application/json",
+          "Authorization": `Bearer ${token}`
+        },
         body: JSON.stringify({ text }),
       });
 
+      if (!response.ok) {
+        const data = await response.json();
+        throw new Error(data.error || "Failed to generate audio");
+      }
+
       const blob = await response.blob();
       const url = window.URL.createObjectURL(blob);
       const audio = new Audio(url);
@@ -300,9 +341,11 @@ function AIChat({ hideSidebar = false, projectId = null }) {
     setInput("");
     setLoading(true);
 
-    // Save user message and get chatId if it's new
-    const savedChatId = await saveChatMessage(userMsg);
-    const activeChatId = savedChatId || currentChatId;
+    // Make sure a standalone session exists; the turn is saved once the reply is done
+    const activeChatId = await ensureChatSession(userMsg);
+    const turnMessages = [userMsg];
+    // Only turns the server accepted are saved
+    let admitted = false;
 
     // Create a placeholder for AI response
     const aiMsgId = Date.now();
@@ -322,11 +365,21 @@ function AIChat({ hideSidebar = false, projectId = null }) {
         `${API_BASE_URL}/chat`,
         {
           method: "POST",
-          headers: { "Content-Type": "application/json" },
+          headers: {
+            "Content-Type": "application/json",
+            "Authorization": `Bearer ${token}`
+          },
           body: JSON.stringify({ message: input, history: historyPayload }),
         },
       );
 
+      // Rate limited or busy: show why instead of an empty reply
+      if (!response.ok) {
+        const data = await response.json().catch(() => ({}));
+        throw new Error(data.error || "Failed to get a response");
+      }
+      admitted = true;
+
       const reader = response.body.getReader();
       const decoder = new TextDecoder();
 
@@ -374,16 +427,23 @@ function AIChat({ hideSidebar = false, projectId = null }) {
         }
       }
 
-      // Save AI response to project history
       if (accumulatedContent) {
-        saveChatMessage({
+        turnMessages.push({
           role: "ai",
           content: accumulatedContent,
           thought: accumulatedThought
-        }, activeChatId);
+        });
       }
     } catch (e) {
       console.error(e);
+      setMessages((prev) =>
+        prev.map((msg) =>
+          msg.id === aiMsgId && !msg.content ? { ...msg, content: e.message } : msg,
+        ),
+      );
+    }
+    if (admitted) {
+      saveChatTurn(turnMessages, activeChatId);
     }
     setLoading(false);
   };
@@ -502,6 +562,15 @@ function AIChat({ hideSidebar = false, projectId = null }) {
                 </motion.div>
               ))}
             </AnimatePresence>
+
+            {sessionsCursor && (
+              <button
+                onClick={() => fetchRecentChatSessions(sessionsCursor)}
+                className="w-full text-xs text-slate-500 hover:text-slate-300 py-2 transition-colors"
+              >
+                Show older chats
+              </button>
+            )}
           </div>
 
           <div className="p-4 border-t border-white/5 space-y-3">
@@ -536,6 +605,15 @@ function AIChat({ hideSidebar = false, projectId = null }) {
         {/* Messages */}
         <div className="flex-1 overflow-y-auto p-4 md:p-8 scrollbar-thin scrollbar-thumb-white/10 scrollbar-track-transparent">
           <div className="min-h-full flex flex-col justify-end space-y-8">
+            {projectId && olderCursor && (
+              <button
+                onClick={loadOlderMessages}
+                disabled={olderLoading}
+                className="self-center text-xs text-slate-400 hover:text-white bg-white/5 hover:bg-white/10 border border-white/10 px-4 py-1.5 rounded-full transition-colors disabled:opacity-50"
+              >
+                {olderLoading ? "Loading..." : "Load earlier messages"}
+              </button>
+            )}
             <AnimatePresence initial={false}>
               {messages.map((msg, idx) => (
                 <motion.div
@@ -560,7 +638,11 @@ function AIChat({ hideSidebar = false, projectId = null }) {
                     className={`flex flex-col max-w-[85%] md:max-w-[75%] ${msg.role === "user" ? "items-end" : "items-start"}`}
                   >
                     {/* Thinking Box (Only for AI) */}
-                    {msg.thought && <ThoughtBox text={msg.thought} />}
+                    {msg.thought ? (
+                      <ThoughtBox text={msg.thought} />
+                    ) : msg.hasThought && msg.id ? (
+                      <ThoughtBox loadThought={() => fetchThought(msg.id)} />
+                    ) : null}
 
                     {/* Final Answer */}
                     {msg.content && (
@@ -680,8 +762,25 @@ function AIChat({ hideSidebar = false, projectId = null }) {
 }
 
 // Separate Component for the Collapsible Thought Process
-const ThoughtBox = ({ text }) => {
-  const [open, setOpen] = useState(true);
+const ThoughtBox = ({ text, loadThought }) => {
+  // Lazily loaded thoughts start collapsed and are fetched on first open
+  const [open, setOpen] = useState(!loadThought);
+  // Streamed thoughts keep growing through `text`; only lazy ones are loaded
+  const [loadedText, setLoadedText] = useState(undefined);
+
+  const toggle = async () => {
+    if (!open && text === undefined && loadedText === undefined && loadThought) {
+      setLoadedText("Loading...");
+      try {
+        setLoadedText(await loadThought());
+      } catch (e) {
+        setLoadedText(undefined);
+        console.error("Error loading reasoning:", e);
+        return;
+      }
+    }
+    setOpen(!open);
+  };
 
   return (
     <motion.div
@@ -690,7 +789,7 @@ const ThoughtBox = ({ text }) => {
       className="mb-2 w-full max-w-2xl"
     >
       <button
-        onClick={() => setOpen(!open)}
+        onClick={toggle}
         className="flex items-center gap-2 text-xs font-bold text-emerald-500 hover:text-emerald-400 transition-colors uppercase tracking-wider mb-2 bg-emerald-500/10 px-3 py-1.5 rounded-full w-fit border border-emerald-500/20"
       >
         <Zap size={12} className={open ? "fill-current" : ""} />
@@ -706,7 +805,7 @@ const ThoughtBox = ({ text }) => {
             className="overflow-hidden"
           >
             <div className="bg-black/40 border-l-2 border-emerald-500/50 p-4 rounded-r-lg text-sm text-slate-400 font-mono text-xs leading-relaxed shadow-inner">
-              {text}
+              {text ?? loadedText}
             </div>
           </motion.div>
         )}
@@ -3,6 +3,7 @@ import { Excalidraw, WelcomeScreen, convertToExcalidrawElements } from "@excalid
 import { Save, Check, Loader2, Maximize2, Minimize2, Wand2, X, Send, Sparkles } from "lucide-react";
 import { parseMermaidToExcalidraw } from "@excalidraw/mermaid-to-excalidraw";
 import "@excalidraw/excalidraw/index.css";
+import { readGenerationStream } from "../../lib/sse";
 
 const API_BASE_URL = import.meta.env.VITE_API_BASE_URL;
 
@@ -16,11 +17,17 @@ export default function Canvas({ projectId, token }) {
     const saveTimeoutRef = useRef(null);
     const containerRef = useRef(null);
 
+    // Delta autosave bookkeeping: server revision and last-saved element versions
+    const revisionRef = useRef(0);
+    const savedVersionsRef = useRef(new Map());
+    const savedAppStateRef = useRef("");
+
     // AI Drawing states
     const [isAISidebarOpen, setIsAISidebarOpen] = useState(false);
     const [aiPrompt, setAiPrompt] = useState("");
     const [isGenerating, setIsGenerating] = useState(false);
     const [aiError, setAiError] = useState("");
+    const [aiPreview, setAiPreview] = useState("");
 
     // Handle fullscreen changes
     useEffect(() => {
@@ -64,6 +71,10 @@ export default function Canvas({ projectId, token }) {
             });
             const data = await response.json();
 
+            revisionRef.current = data.revision || 0;
+            savedVersionsRef.current = new Map();
+            savedAppStateRef.current = "";
+
             if (data.canvas) {
                 // Check if it's the old image format (base64)
                 if (typeof data.canvas === 'string' && data.canvas.startsWith('data:image')) {
@@ -78,6 +89,11 @@ export default function Canvas({ projectId, token }) {
                             ? JSON.parse(data.canvas)
                             : data.canvas;
 
+                        (parsedData.elements || []).forEach(el => {
+                            savedVersionsRef.current.set(el.id, el.version);
+                        });
+                        savedAppStateRef.current = JSON.stringify(parsedData.appState || {});
+
                         setInitialData(parsedData);
                         if (excalidrawAPI) {
                             excalidrawAPI.updateScene(parsedData);
@@ -102,6 +118,64 @@ export default function Canvas({ projectId, token }) {
         }
     };
 
+    const pickAppState = (appState) => ({
+        viewBackgroundColor: appState.viewBackgroundColor,
+        currentItemFontFamily: appState.currentItemFontFamily,
+        currentItemFontSize: appState.currentItemFontSize,
+        // Add other needed appState properties
+    });
+
+    // Send only elements whose version changed since the last save
+    const patchCanvas = async (elements, appState) => {
+        const changed = elements.filter(
+            el => savedVersionsRef.current.get(el.id) !== el.version
+        );
+        const appStateJson = JSON.stringify(appState);
+        const appStateChanged = appStateJson !== savedAppStateRef.current;
+
+        if (changed.length === 0 && !appStateChanged) return true;
+
+        const response = await fetch(`${API_BASE_URL}/projects/${projectId}/workspace/canvas`, {
+            method: "PATCH",
+            headers: {
+                "Content-Type": "application/json",
+                "Authorization": `Bearer ${token}`
+            },
+            body: JSON.stringify({
+                baseRevision: revisionRef.current,
+                elements: changed,
+                ...(appStateChanged ? { appState } : {})
+            })
+        });
+
+        if (response.status === 409) return false;
+        if (!response.ok) throw new Error("Failed to save canvas");
+
+        const data = await response.json();
+        revisionRef.current = data.revision;
+        changed.forEach(el => savedVersionsRef.current.set(el.id, el.version));
+        savedAppStateRef.current = appStateJson;
+        return true;
+    };
+
+    // Another tab saved in between: adopt the server's revision and versions, then retry
+    const resyncCanvas = async () => {
+        const response = await fetch(`${API_BASE_URL}/projects/${projectId}/workspace/canvas`, {
+            headers: {
+                'Authorization': `Bearer ${token}`
+            }
+        });
+        const data = await response.json();
+        revisionRef.current = data.revision || 0;
+        savedVersionsRef.current = new Map();
+        if (data.canvas) {
+            const parsedData = JSON.parse(data.canvas);
+            (parsedData.elements || []).forEach(el => {
+                savedVersionsRef.current.set(el.id, el.version);
+            });
+        }
+    };
+
     const saveCanvas = async (elements, appState) => {
         if (!projectId) return;
 
@@ -109,24 +183,13 @@ export default function Canvas({ projectId, token }) {
         setSaved(false);
 
         try {
-            const canvasData = JSON.stringify({
-                elements,
-                appState: {
-                    viewBackgroundColor: appState.viewBackgroundColor,
-                    currentItemFontFamily: appState.currentItemFontFamily,
-                    currentItemFontSize: appState.currentItemFontSize,
-                    // Add other needed appState properties
+            const pickedAppState = pickAppState(appState);
+            if (!(await patchCanvas(elements, pickedAppState))) {
+                await resyncCanvas();
+                if (!(await patchCanvas(elements, pickedAppState))) {
+                    throw new Error("Canvas changed elsewhere, please reload");
                 }
-            });
-
-            await fetch(`${API_BASE_URL}/projects/${projectId}/workspace/canvas`, {
-                method: "PUT",
-                headers: {
-                    "Content-Type": "application/json",
-                    "Authorization": `Bearer ${token}`
-                },
-                body: JSON.stringify({ canvas: canvasData })
-            });
+            }
 
             setSaving(false);
             setSaved(true);
@@ -156,6 +219,7 @@ export default function Canvas({ projectId, token }) {
 
         setIsGenerating(true);
         setAiError("");
+        setAiPreview("");
 
         try {
             // 1. Get Mermaid code from backend
@@ -163,16 +227,19 @@ export default function Canvas({ projectId, token }) {
                 method: "POST",
                 headers: {
                     "Content-Type": "application/json",
+                    "Authorization": `Bearer ${token}`
                 },
-                body: JSON.stringify({ prompt: aiPrompt })
+                body: JSON.stringify({ prompt: aiPrompt, stream: true })
             });
 
-            const data = await response.json();
-
-            if (data.error) {
-                throw new Error(data.error);
+            if (!response.ok) {
+                const data = await response.json();
+                throw new Error(data.error || "Failed to generate drawing");
             }
 
+            // Mermaid code previews as it streams; the validated result is rendered
+            const data = await readGenerationStream(response, setAiPreview);
+
             // 2. Parse Mermaid to Excalidraw skeleton
             const { elements: skeletonElements } = await parseMermaidToExcalidraw(data.mermaid);
 
@@ -206,6 +273,7 @@ export default function Canvas({ projectId, token }) {
             setAiError(error.message || "Failed to generate drawing. Please try a different prompt.");
         } finally {
             setIsGenerating(false);
+            setAiPreview("");
         }
     };
 
@@ -315,6 +383,12 @@ export default function Canvas({ projectId, token }) {
                         </div>
                     )}
 
+                    {isGenerating && aiPreview && (
+                        <pre className="mb-4 p-3 max-h-48 overflow-y-auto bg-white/5 border border-white/10 rounded-lg text-gray-300 text-xs whitespace-pre-wrap">
+                            {aiPreview}
+                        </pre>
+                    )}
+
                     {/* Generate Button */}
                     <button
                         onClick={generateDrawing}
@@ -1,5 +1,6 @@
 import { useState, useRef, useEffect } from "react";
 import { Upload, Type, Scissors, Download, Play, Pause, Loader, Video, Maximize2, Minimize2, Wand2, X, Send, Sparkles } from "lucide-react";
+import { uploadInChunks } from "../../lib/chunkedUpload";
 
 const API_BASE_URL = import.meta.env.VITE_API_BASE_URL;
 
@@ -26,6 +27,7 @@ export default function VideoEditor({ projectId, token }) {
     const [isAnalyzing, setIsAnalyzing] = useState(false);
     const [aiAnalysis, setAiAnalysis] = useState("");
     const [aiError, setAiError] = useState("");
+    const [analysisStage, setAnalysisStage] = useState(null);
 
     const videoRef = useRef(null);
     const fileInputRef = useRef(null);
@@ -98,25 +100,13 @@ export default function VideoEditor({ projectId, token }) {
     const uploadToCloudinary = async (file) => {
         setUploading(true);
         try {
-            const formData = new FormData();
-            formData.append("file", file);
-            formData.append("type", "video");
-
-            const response = await fetch(`${API_BASE_URL}/projects/${projectId}/workspace/upload`, {
-                method: "POST",
-                body: formData,
-            });
-
-            if (response.ok) {
-                const data = await response.json();
-                setProjectVideos([...projectVideos, data]);
-                setCurrentVideoUrl(data.url);
-            } else {
-                const error = await response.json();
-                alert(error.error || "Upload failed");
-            }
+            // Chunked so a dropped connection resumes instead of restarting
+            const data = await uploadInChunks(projectId, file, "video");
+            setProjectVideos([...projectVideos, data]);
+            setCurrentVideoUrl(data.url);
         } catch (error) {
             console.error("Upload error:", error);
+            alert(error.message || "Upload failed");
         } finally {
             setUploading(false);
         }
@@ -190,6 +180,7 @@ export default function VideoEditor({ projectId, token }) {
         setIsAnalyzing(true);
         setAiError("");
         setAiAnalysis("");
+        setAnalysisStage(null);
 
         try {
             const response = await fetch(`${API_BASE_URL}/analyze-media`, {
@@ -201,19 +192,44 @@ export default function VideoEditor({ projectId, token }) {
                 body: JSON.stringify({
                     mediaUrl: currentVideoUrl,
                     mediaType: "video",
-                    prompt: aiPrompt
+                    prompt: aiPrompt,
+                    mode: "async"
                 })
             });
 
             const data = await response.json();
             if (data.error) throw new Error(data.error);
 
-            setAiAnalysis(data.analysis);
+            if (response.status === 202) {
+                // Long analyses run as a background job; follow its progress
+                setAiAnalysis(await watchAnalysisJob(data.jobId));
+            } else {
+                setAiAnalysis(data.analysis);
+            }
         } catch (error) {
             console.error("Error analyzing video:", error);
             setAiError(error.message || "Failed to analyze video.");
         } finally {
             setIsAnalyzing(false);
+            setAnalysisStage(null);
+        }
+    };
+
+    // Poll the job with backoff (1s doubling to 8s) until it finishes
+    const watchAnalysisJob = async (jobId) => {
+        let delay = 1000;
+        while (true) {
+            await new Promise((resolve) => setTimeout(resolve, delay));
+            const response = await fetch(`${API_BASE_URL}/analyze-media/jobs/${jobId}`, {
+                headers: { "Authorization": `Bearer ${token}` }
+            });
+            const job = await response.json();
+            if (!response.ok) throw new Error(job.error || "Failed to follow analysis job");
+
+            if (job.status === "complete") return job.analysis;
+            if (job.status === "failed") throw new Error(job.error);
+            setAnalysisStage(job.stage || job.status);
+            delay = Math.min(delay * 2, 8000);
         }
     };
 
@@ -504,7 +520,7 @@ export default function VideoEditor({ projectId, token }) {
                         {isAnalyzing ? (
                             <>
                                 <Loader size={18} className="animate-spin" />
-                                <span>Analyzing Video...</span>
+                                <span>{analysisStage ? `Analyzing Video (${analysisStage})...` : "Analyzing Video..."}</span>
                             </>
                         ) : (
                             <>
@@ -20,6 +20,7 @@ import {
   Maximize2,
   Minimize2,
 } from "lucide-react";
+import { readGenerationStream } from "../../lib/sse";
 import ReactMarkdown from "react-markdown";
 import remarkGfm from "remark-gfm";
 import remarkMath from "remark-math";
@@ -29,6 +30,36 @@ import "katex/dist/katex.min.css";
 
 const API_BASE_URL = import.meta.env.VITE_API_BASE_URL;
 
+const isHighSurrogate = (code) => code >= 0xd800 && code <= 0xdbff;
+const isLowSurrogate = (code) => code >= 0xdc00 && code <= 0xdfff;
+
+// Single splice turning `before` into `after`: [position, deleteCount, insertText]
+// Boundaries never split a surrogate pair, so the insert is always valid text.
+const diffToOps = (before, after) => {
+  let start = 0;
+  const minLen = Math.min(before.length, after.length);
+  while (start < minLen && before[start] === after[start]) start++;
+  if (start > 0 && isHighSurrogate(before.charCodeAt(start - 1))) start--;
+
+  let endBefore = before.length;
+  let endAfter = after.length;
+  while (
+    endBefore > start &&
+    endAfter > start &&
+    before[endBefore - 1] === after[endAfter - 1]
+  ) {
+    endBefore--;
+    endAfter--;
+  }
+  if (endBefore < before.length && isLowSurrogate(before.charCodeAt(endBefore))) {
+    endBefore++;
+    endAfter++;
+  }
+
+  if (start === endBefore && start === endAfter) return [];
+  return [[start, endBefore - start, after.slice(start, endAfter)]];
+};
+
 // Helper to convert LaTeX delimiters to Markdown delimiters
 const preprocessLaTeX = (content) => {
   if (typeof content !== "string") return content;
@@ -51,11 +82,16 @@ export default function WritingArea({ projectId, token }) {
   const [aiPrompt, setAiPrompt] = useState("");
   const [isGenerating, setIsGenerating] = useState(false);
   const [aiError, setAiError] = useState("");
+  const [aiPreview, setAiPreview] = useState("");
   const [selectedContext, setSelectedContext] = useState("");
   const [isFullscreen, setIsFullscreen] = useState(false);
   const textareaRef = useRef(null);
   const containerRef = useRef(null);
 
+  // Last content acknowledged by the server, and its revision
+  const savedContentRef = useRef("");
+  const revisionRef = useRef(0);
+
   // Handle fullscreen changes
   useEffect(() => {
     const handleFullscreenChange = () => {
@@ -94,6 +130,8 @@ export default function WritingArea({ projectId, token }) {
           },
         );
         const data = await response.json();
+        savedContentRef.current = data.writing || "";
+        revisionRef.current = data.revision || 0;
         setContent(data.writing || "");
       } catch (error) {
         console.error("Error loading content:", error);
@@ -109,17 +147,44 @@ export default function WritingArea({ projectId, token }) {
   useEffect(() => {
     if (!projectId || loading) return;
 
+    const url = `${API_BASE_URL}/projects/${projectId}/workspace/writing`;
+
     const saveContent = async () => {
+      const ops = diffToOps(savedContentRef.current, content);
+      if (ops.length === 0) return;
+
       setSaving(true);
       try {
-        await fetch(`${API_BASE_URL}/projects/${projectId}/workspace/writing`, {
-          method: "PUT",
+        // Send only the edit; fall back to a full save on conflict or bad patch
+        let response = await fetch(url, {
+          method: "PATCH",
           headers: {
             "Content-Type": "application/json",
             Authorization: `Bearer ${token}`,
           },
-          body: JSON.stringify({ writing: content }),
+          body: JSON.stringify({
+            baseRevision: revisionRef.current,
+            ops,
+            length: content.length,
+          }),
         });
+
+        if (response.status === 409 || response.status === 422) {
+          response = await fetch(url, {
+            method: "PUT",
+            headers: {
+              "Content-Type": "application/json",
+              Authorization: `Bearer ${token}`,
+            },
+            body: JSON.stringify({ writing: content }),
+          });
+        }
+
+        if (!response.ok) throw new Error("Failed to save content");
+
+        const data = await response.json();
+        revisionRef.current = data.revision;
+        savedContentRef.current = content;
         setSaved(true);
         setTimeout(() => setSaved(false), 2000);
       } catch (error) {
@@ -206,9 +271,10 @@ export default function WritingArea({ projectId, token }) {
 
     setIsGenerating(true);
     setAiError("");
+    setAiPreview("");
 
     try {
-      const payload = { prompt: aiPrompt };
+      const payload = { prompt: aiPrompt, stream: true };
       let mode = "generate"; // generate, edit-selection, edit-full
 
       if (selectedContext) {
@@ -223,17 +289,18 @@ export default function WritingArea({ projectId, token }) {
         method: "POST",
         headers: {
           "Content-Type": "application/json",
+          Authorization: `Bearer ${token}`,
         },
         body: JSON.stringify(payload),
       });
 
-      const data = await response.json();
-
-      if (data.error) {
-        throw new Error(data.error);
+      if (!response.ok) {
+        const data = await response.json();
+        throw new Error(data.error || "Failed to generate text");
       }
 
-      const generatedText = data.text;
+      // Tokens preview as they arrive; the final result is applied below
+      const { text: generatedText } = await readGenerationStream(response, setAiPreview);
       const textarea = textareaRef.current;
 
       if (mode === "edit-selection" && textarea) {
@@ -267,6 +334,7 @@ export default function WritingArea({ projectId, token }) {
       setAiError(error.message || "Failed to generate text");
     } finally {
       setIsGenerating(false);
+      setAiPreview("");
     }
   };
 
@@ -568,6 +636,12 @@ export default function WritingArea({ projectId, token }) {
             </div>
           )}
 
+          {isGenerating && aiPreview && (
+            <div className="mb-4 p-3 max-h-48 overflow-y-auto bg-white/5 border border-white/10 rounded-lg text-gray-300 text-xs whitespace-pre-wrap">
+              {aiPreview}
+            </div>
+          )}
+
           {/* Generate Button */}
           <button
             onClick={generateWriting}
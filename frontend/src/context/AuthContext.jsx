@@ -82,14 +82,14 @@ export const AuthProvider = ({ children }) => {
         }
     };
 
-    const googleLogin = async (credential) => {
+    const googleLogin = async (credential, expiresIn) => {
         try {
             const response = await fetch(`${API_BASE_URL}/auth/google`, {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json'
                 },
-                body: JSON.stringify({ token: credential })
+                body: JSON.stringify({ token: credential, expiresIn })
             });
 
             const data = await response.json();
@@ -0,0 +1,93 @@
+const API_BASE_URL = import.meta.env.VITE_API_BASE_URL;
+
+const MAX_CHUNK_RETRIES = 3;
+const RESUME_KEY_PREFIX = "qwenify-upload:";
+
+// Identifies the same file across page reloads so an interrupted upload resumes
+const resumeKey = (projectId, file) =>
+    `${RESUME_KEY_PREFIX}${projectId}:${file.name}:${file.size}:${file.lastModified}`;
+
+const sleep = (ms) => new Promise((resolve) => setTimeout(resolve, ms));
+
+async function openSession(projectId, file, type) {
+    const key = resumeKey(projectId, file);
+    const saved = localStorage.getItem(key);
+    if (saved) {
+        const response = await fetch(`${API_BASE_URL}/projects/${projectId}/workspace/uploads/${saved}`);
+        if (response.ok) {
+            const session = await response.json();
+            if (session.status === "uploading") return session;
+        }
+        localStorage.removeItem(key);
+    }
+
+    const response = await fetch(`${API_BASE_URL}/projects/${projectId}/workspace/uploads`, {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify({ filename: file.name, size: file.size, type }),
+    });
+    const data = await response.json();
+    if (!response.ok) throw new Error(data.error || "Upload failed");
+    localStorage.setItem(key, data.uploadId);
+    return data;
+}
+
+/**
+ * Upload a file to the project's media in resumable chunks.
+ * Resolves to the new media entry ({type, url, publicId, name, uploadedAt}).
+ */
+export async function uploadInChunks(projectId, file, type, onProgress) {
+    const session = await openSession(projectId, file, type);
+    const url = `${API_BASE_URL}/projects/${projectId}/workspace/uploads/${session.uploadId}`;
+    let offset = session.received;
+    let failures = 0;
+
+    while (true) {
+        const end = Math.min(offset + session.chunkSize, file.size);
+        onProgress?.(offset / file.size);
+
+        let response;
+        try {
+            response = await fetch(url, {
+                method: "PUT",
+                headers: {
+                    "Content-Type": "application/octet-stream",
+                    "Content-Range": `bytes ${offset}-${end - 1}/${file.size}`,
+                },
+                body: file.slice(offset, end),
+            });
+        } catch (error) {
+            // Network drop: back off and retry from the server's offset
+            if (++failures > MAX_CHUNK_RETRIES) throw error;
+            await sleep(1000 * failures);
+            const status = await fetch(url).then((r) => r.json()).catch(() => null);
+            if (status?.media) {
+                // The last chunk landed; only its response was lost
+                localStorage.removeItem(resumeKey(projectId, file));
+                onProgress?.(1);
+                return status.media;
+            }
+            if (status?.received !== undefined) offset = status.received;
+            continue;
+        }
+
+        const data = await response.json();
+        if (response.status === 201) {
+            localStorage.removeItem(resumeKey(projectId, file));
+            onProgress?.(1);
+            return data;
+        }
+        if (response.status === 202) {
+            offset = data.received;
+            failures = 0;
+        } else if (response.status === 409 && data.received !== undefined && data.received < file.size) {
+            // Out of step with the server (e.g. a lost response); continue from its offset
+            offset = data.received;
+        } else if (response.status >= 500 && ++failures <= MAX_CHUNK_RETRIES) {
+            await sleep(1000 * failures);
+        } else {
+            localStorage.removeItem(resumeKey(projectId, file));
+            throw new Error(data.error || "Upload failed");
+        }
+    }
+}
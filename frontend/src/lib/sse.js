@@ -0,0 +1,54 @@
+/**
+ * Read a server-sent event stream from a fetch response, calling
+ * onEvent(data) for each JSON event until [DONE] or the stream ends.
+ */
+export async function readEventStream(response, onEvent) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = "";
+
+    while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+
+        buffer += decoder.decode(value, { stream: true });
+        const events = buffer.split("\n\n");
+        buffer = events.pop();
+
+        for (const event of events) {
+            if (!event.startsWith("data: ")) continue;
+            const jsonStr = event.replace("data: ", "");
+            if (jsonStr === "[DONE]") return;
+            onEvent(JSON.parse(jsonStr));
+        }
+    }
+}
+
+/**
+ * Consume a generation stream: previews answer tokens via onPreview and
+ * resolves to the final "result" event (throws on an "error" event).
+ */
+export async function readGenerationStream(response, onPreview) {
+    let preview = "";
+    let result = null;
+    let error = null;
+
+    await readEventStream(response, (data) => {
+        if (data.type === "answer") {
+            preview += data.content;
+            onPreview?.(preview);
+        } else if (data.type === "reset") {
+            // Server fell back to another attempt; drop the partial preview
+            preview = "";
+            onPreview?.(preview);
+        } else if (data.type === "result") {
+            result = data;
+        } else if (data.type === "error") {
+            error = data.content;
+        }
+    });
+
+    if (error) throw new Error(error);
+    if (!result) throw new Error("Generation ended without a result");
+    return result;
+}
@@ -33,7 +33,7 @@ const Auth = () => {
             setLoading(true);
             setError('');
             try {
-                const result = await googleLogin(tokenResponse.access_token);
+                const result = await googleLogin(tokenResponse.access_token, tokenResponse.expires_in);
                 if (result.success) {
                     const pendingMsg = localStorage.getItem("pending_chat_message");
                     if (pendingMsg) {
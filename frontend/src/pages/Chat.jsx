@@ -1,12 +1,25 @@
+import { useEffect } from "react";
+import { useNavigate } from "react-router-dom";
 import Header from "../components/Header";
 import AIChat from "../components/tools/AIChat";
+import { useAuth } from "../context/AuthContext";
 
 function Chat() {
+  const { isAuthenticated, loading: authLoading } = useAuth();
+  const navigate = useNavigate();
+
+  // Redirect if not authenticated
+  useEffect(() => {
+    if (!authLoading && !isAuthenticated) {
+      navigate("/auth");
+    }
+  }, [authLoading, isAuthenticated, navigate]);
+
   return (
     <div className="h-screen bg-black overflow-hidden flex flex-col">
       <Header />
       <div className="flex-1 overflow-hidden mt-20">
-        <AIChat />
+        {isAuthenticated && <AIChat />}
       </div>
     </div>
   );